@@ -0,0 +1,40 @@
+"""Add round to quizsession
+
+Revision ID: 0d4a7c2e9f15
+Revises: 8f2b6d4e1a97
+Create Date: 2026-10-19 19:21:56.271844
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '0d4a7c2e9f15'
+down_revision = '8f2b6d4e1a97'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('quizsession', sa.Column('round', sa.Integer(), server_default='1', nullable=False))
+    # Repeated joins used to create duplicate sessions, number them as rounds
+    op.execute(
+        """
+        UPDATE quizsession SET round = numbered.round
+        FROM (
+            SELECT id, row_number() OVER (PARTITION BY quiz_id, user_id ORDER BY id) AS round
+            FROM quizsession
+        ) AS numbered
+        WHERE quizsession.id = numbered.id AND numbered.round > 1
+        """
+    )
+    op.create_unique_constraint(
+        'uq_quizsession_quiz_id_user_id_round', 'quizsession', ['quiz_id', 'user_id', 'round']
+    )
+
+
+def downgrade():
+    op.drop_constraint('uq_quizsession_quiz_id_user_id_round', 'quizsession', type_='unique')
+    op.drop_column('quizsession', 'round')
@@ -0,0 +1,44 @@
+"""Add groups
+
+Revision ID: 4b8e2f6a1c37
+Revises: 0d4a7c2e9f15
+Create Date: 2026-10-19 21:02:37.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '4b8e2f6a1c37'
+down_revision = '0d4a7c2e9f15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('group',
+    sa.Column('name', sqlmodel.sql.sqltypes.AutoString(length=255), nullable=False),
+    sa.Column('id', sa.Uuid(), nullable=False),
+    sa.Column('owner_id', sa.Uuid(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['owner_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_group_owner_id'), 'group', ['owner_id'], unique=False)
+    op.create_table('groupmember',
+    sa.Column('group_id', sa.Uuid(), nullable=False),
+    sa.Column('user_id', sa.Uuid(), nullable=False),
+    sa.ForeignKeyConstraint(['group_id'], ['group.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('group_id', 'user_id')
+    )
+    op.create_index(op.f('ix_groupmember_user_id'), 'groupmember', ['user_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_groupmember_user_id'), table_name='groupmember')
+    op.drop_table('groupmember')
+    op.drop_index(op.f('ix_group_owner_id'), table_name='group')
+    op.drop_table('group')
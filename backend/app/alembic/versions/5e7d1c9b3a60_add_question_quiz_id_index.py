@@ -0,0 +1,25 @@
+"""Add question quiz_id index
+
+Revision ID: 5e7d1c9b3a60
+Revises: c3f0a8e1d2b4
+Create Date: 2026-10-19 18:02:41.630517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '5e7d1c9b3a60'
+down_revision = 'c3f0a8e1d2b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(op.f('ix_question_quiz_id'), 'question', ['quiz_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_question_quiz_id'), table_name='question')
@@ -0,0 +1,34 @@
+"""Add achieved_at to quizsession
+
+Revision ID: 7c1d9e3b5a28
+Revises: 4b8e2f6a1c37
+Create Date: 2026-10-19 22:14:09.603511
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '7c1d9e3b5a28'
+down_revision = '4b8e2f6a1c37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing scores count as reached now, in whole seconds like new ones
+    op.add_column(
+        'quizsession',
+        sa.Column(
+            'achieved_at',
+            sa.DateTime(timezone=True),
+            server_default=sa.text("date_trunc('second', now())"),
+            nullable=False,
+        ),
+    )
+
+
+def downgrade():
+    op.drop_column('quizsession', 'achieved_at')
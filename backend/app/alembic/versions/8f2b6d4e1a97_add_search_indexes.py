@@ -0,0 +1,48 @@
+"""Add full-text and trigram search indexes
+
+Revision ID: 8f2b6d4e1a97
+Revises: 5e7d1c9b3a60
+Create Date: 2026-10-19 18:40:27.904153
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '8f2b6d4e1a97'
+down_revision = '5e7d1c9b3a60'
+branch_labels = None
+depends_on = None
+
+# Searchable text column of each table. The "simple" configuration does not
+# stem, which suits vocabulary in any language.
+SEARCHABLE = (("quiz", "name"), ("question", "text"), ("answer", "text"))
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for table, column in SEARCHABLE:
+        # Generated columns are not mapped by the models, see app/alembic/env.py
+        op.execute(
+            f'ALTER TABLE "{table}" ADD COLUMN search_vector tsvector '
+            f"GENERATED ALWAYS AS (to_tsvector('simple', \"{column}\")) STORED"
+        )
+        op.create_index(
+            f'ix_{table}_search_vector', table, ['search_vector'], postgresql_using='gin'
+        )
+        op.create_index(
+            f'ix_{table}_{column}_trgm',
+            table,
+            [column],
+            postgresql_using='gin',
+            postgresql_ops={column: 'gin_trgm_ops'},
+        )
+
+
+def downgrade():
+    for table, column in SEARCHABLE:
+        op.drop_index(f'ix_{table}_{column}_trgm', table_name=table)
+        op.drop_index(f'ix_{table}_search_vector', table_name=table)
+        op.drop_column(table, 'search_vector')
@@ -0,0 +1,25 @@
+"""Add version to quiz
+
+Revision ID: b97b4486ba20
+Revises: 32516f9cf87d
+Create Date: 2026-10-19 16:40:12.518304
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'b97b4486ba20'
+down_revision = '32516f9cf87d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('quiz', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    op.drop_column('quiz', 'version')
@@ -0,0 +1,25 @@
+"""Add item owner_id index
+
+Revision ID: c3f0a8e1d2b4
+Revises: b97b4486ba20
+Create Date: 2026-10-19 17:25:03.114207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f0a8e1d2b4'
+down_revision = 'b97b4486ba20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_item_owner_id_id', 'item', ['owner_id', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_item_owner_id_id', table_name='item')
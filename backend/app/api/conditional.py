@@ -0,0 +1,30 @@
+from fastapi import Request, Response
+
+
+def make_etag(*parts: object) -> str:
+    return '"' + "-".join(str(part) for part in parts) + '"'
+
+
+def _opaque_tag(etag: str) -> str:
+    etag = etag.strip()
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+def etag_matches(request: Request, *etags: str) -> bool:
+    """
+    Whether `If-None-Match` names one of the current `etags`.
+
+    Uses the weak comparison required for `If-None-Match`, so tags weakened
+    by the compression middleware still match.
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    requested = {_opaque_tag(tag) for tag in header.split(",")}
+    return any(_opaque_tag(etag) in requested for etag in etags)
+
+
+def not_modified(etag: str, headers: dict[str, str] | None = None) -> Response:
+    return Response(status_code=304, headers={**(headers or {}), "ETag": etag})
@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from app.api.routes import items, login, users, utils, quizzes, quizsessions, leaderboards
+from app.api.routes import items, login, users, utils, quizzes, quizsessions, leaderboards, diagnostics, search, groups
 
 api_router = APIRouter()
 api_router.include_router(login.router, tags=["login"])
@@ -10,4 +10,6 @@ api_router.include_router(items.router, prefix="/items", tags=["items"])
 api_router.include_router(quizzes.router, prefix="/quizzes", tags=["quizzes"])
 api_router.include_router(quizsessions.router, prefix="/quiz-sessions", tags=["quiz-sessions"])
 api_router.include_router(leaderboards.router, prefix="/leaderboards", tags=["leaderboards"])
-
+api_router.include_router(groups.router, prefix="/groups", tags=["groups"])
+api_router.include_router(search.router, prefix="/search", tags=["search"])
+api_router.include_router(diagnostics.router, prefix="/diagnostics", tags=["diagnostics"])
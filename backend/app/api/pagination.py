@@ -0,0 +1,84 @@
+"""
+Keyset pagination on primary keys.
+
+Pages are ordered by id and continue from an opaque cursor holding the last
+id of the previous page, so deep pages cost the same as the first one.
+`skip` is still accepted for older clients.
+"""
+
+import base64
+import binascii
+import uuid
+from collections.abc import Sequence
+from typing import Any, TypeVar
+
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlmodel import Session, SQLModel, func, select
+from sqlmodel.sql.expression import SelectOfScalar
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+
+def encode_cursor(last_id: uuid.UUID) -> str:
+    return base64.urlsafe_b64encode(last_id.bytes).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str | None) -> uuid.UUID | None:
+    if cursor is None:
+        return None
+    try:
+        return uuid.UUID(
+            bytes=base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        )
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def paginate(
+    statement: SelectOfScalar[T],
+    id_column: Any,
+    *,
+    after: uuid.UUID | None,
+    skip: int,
+    limit: int,
+) -> SelectOfScalar[T]:
+    """
+    Restrict `statement` to one page, plus one row to tell whether there is
+    a next page; see `split_page`.
+    """
+    statement = statement.order_by(id_column)
+    if after is not None:
+        statement = statement.where(id_column > after)
+    elif skip:
+        statement = statement.offset(skip)
+    return statement.limit(limit + 1)
+
+
+def split_page(rows: Sequence[T], limit: int) -> tuple[list[T], str | None]:
+    """The rows of a page and the cursor of the next one, if any"""
+    page = list(rows[:limit])
+    next_cursor = encode_cursor(page[-1].id) if len(rows) > limit else None  # type: ignore[attr-defined]
+    return page, next_cursor
+
+
+def estimated_count(session: Session, model: type[SQLModel]) -> int:
+    """
+    Row count of a whole table from the planner statistics.
+
+    Small tables, and tables that were never analyzed, are counted exactly:
+    the estimate is too coarse there and `count(*)` is cheap anyway.
+    """
+    table = model.__table__  # type: ignore[attr-defined]
+    estimate = session.execute(  # type: ignore[call-overload]
+        text(
+            "SELECT reltuples::bigint FROM pg_class "
+            "WHERE relname = :name AND relkind = 'r' AND pg_table_is_visible(oid)"
+        ),
+        {"name": table.name},
+    ).scalar()
+    if estimate is not None and estimate >= settings.PAGINATION_EXACT_COUNT_THRESHOLD:
+        return int(estimate)
+    return session.exec(select(func.count()).select_from(model)).one()
@@ -0,0 +1,192 @@
+import uuid
+from urllib.parse import parse_qs
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from pyinstrument import Profiler
+from pyinstrument.renderers import SpeedscopeRenderer
+from sqlmodel import Session
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.api.deps import get_current_user
+from app.core.config import settings
+from app.core.db import engine
+from app.core.redis import redis_client
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_STORE_HEADER = b"x-profile-store"
+PROFILE_QUERY = b"profile"
+STREAM_MEDIA_TYPE = b"text/event-stream"
+
+REPORT_MEDIA_TYPES = {
+    "text": "text/plain; charset=utf-8",
+    "html": "text/html; charset=utf-8",
+    "speedscope": "application/json",
+}
+
+
+def profile_key(profile_id: str) -> str:
+    return f"profile:{profile_id}"
+
+
+def _is_superuser(token: str) -> bool:
+    with Session(engine) as session:
+        try:
+            user = get_current_user(session, token)
+        except HTTPException:
+            return False
+        return user.is_superuser
+
+
+def _is_stream(message: Message) -> bool:
+    content_type = dict(message.get("headers", [])).get(b"content-type")
+    return (content_type or b"").startswith(STREAM_MEDIA_TYPE)
+
+
+def _render(profiler: Profiler, report_format: str) -> str:
+    if report_format == "html":
+        return profiler.output_html()
+    if report_format == "speedscope":
+        return profiler.output(renderer=SpeedscopeRenderer())
+    return profiler.output_text(unicode=True, color=False, show_all=False)
+
+
+class ProfilerMiddleware:
+    """
+    Run a request under a sampling profiler when asked to.
+
+    A request is profiled when it carries an ``X-Profile`` header or a
+    ``profile`` query parameter whose value is the report format (``text``,
+    ``html`` or ``speedscope``), and only if its bearer token belongs to an
+    active superuser. The report replaces the response body, unless
+    ``X-Profile-Store``/``profile_store`` is set: then the normal response is
+    returned with an ``X-Profile-Id`` header and the report is kept in Redis
+    for download from ``/utils/profiles/{profile_id}``. Streaming responses
+    never finish, so they are passed through without an inline report, and
+    only profiled until they start when the report is stored.
+
+    Requests without the flag only pay for a scan of the raw headers and
+    query string; the query is only parsed when it mentions ``profile``.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        query_string: bytes = scope["query_string"]
+        query: dict[str, list[str]] = {}
+        if PROFILE_QUERY in query_string:
+            query = parse_qs(query_string.decode("latin-1"), keep_blank_values=True)
+        flagged = "profile" in query
+        if not flagged:
+            for name, _ in scope["headers"]:
+                if name == PROFILE_HEADER:
+                    flagged = True
+                    break
+        if not flagged:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        report_format = (
+            headers.get(PROFILE_HEADER, b"").decode("latin-1")
+            or query.get("profile", [""])[0]
+        ).lower()
+        if report_format not in REPORT_MEDIA_TYPES:
+            report_format = "text"
+        store = bool(
+            headers.get(PROFILE_STORE_HEADER) or query.get("profile_store", [""])[0]
+        )
+
+        scheme, _, token = headers.get(b"authorization", b"").decode().partition(" ")
+        if scheme.lower() != "bearer" or not await run_in_threadpool(
+            _is_superuser, token
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        if store:
+            await self._profile_and_store(scope, receive, send, report_format)
+        else:
+            await self._profile_inline(scope, receive, send, report_format)
+
+    async def _profile_inline(
+        self, scope: Scope, receive: Receive, send: Send, report_format: str
+    ) -> None:
+        status = 500
+        streaming = False
+        profiler = Profiler(
+            interval=settings.PROFILING_INTERVAL_SECONDS, async_mode="enabled"
+        )
+
+        async def discard(message: Message) -> None:
+            nonlocal status, streaming
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                streaming = _is_stream(message)
+                if streaming:
+                    profiler.stop()
+            if streaming:
+                await send(message)
+
+        profiler.start()
+        try:
+            await self.app(scope, receive, discard)
+        finally:
+            if profiler.is_running:
+                profiler.stop()
+        if streaming:
+            return
+
+        body = (await run_in_threadpool(_render, profiler, report_format)).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", REPORT_MEDIA_TYPES[report_format].encode()),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"x-profile-status", str(status).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    async def _profile_and_store(
+        self, scope: Scope, receive: Receive, send: Send, report_format: str
+    ) -> None:
+        profile_id = uuid.uuid4().hex
+        profiler = Profiler(
+            interval=settings.PROFILING_INTERVAL_SECONDS, async_mode="enabled"
+        )
+
+        async def store() -> None:
+            profiler.stop()
+            report = await run_in_threadpool(_render, profiler, report_format)
+            key = profile_key(profile_id)
+            async with redis_client.pipeline() as pipe:
+                pipe.hset(key, mapping={"format": report_format, "report": report})
+                pipe.expire(key, settings.PROFILING_REPORT_TTL_SECONDS)
+                await pipe.execute()
+
+        async def send_with_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"x-profile-id", profile_id.encode()),
+                ]
+                # A stream never finishes, so it is profiled until it starts
+                if _is_stream(message):
+                    await store()
+            await send(message)
+
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            if profiler.is_running:
+                await store()
@@ -0,0 +1,381 @@
+import asyncio
+import gc
+import json
+import os
+import resource
+import socket
+import time
+import tracemalloc
+import uuid
+from typing import Any, Literal
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+
+from app.api.deps import get_current_active_superuser
+from app.broadcast import broadcaster
+from app.core.config import settings
+from app.core.redis import redis_client
+
+router = APIRouter(dependencies=[Depends(get_current_active_superuser)])
+
+WORKERS_KEY = "diagnostics:workers"
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+# Tracemalloc commands go to every worker, which push their replies to a
+# list named in the command
+COMMANDS_CHANNEL = "diagnostics:commands"
+SNAPSHOT_SEQ_KEY = "diagnostics:snapshot_seq"
+
+# Snapshots are kept per worker and capped, so the diagnostics themselves
+# cannot become the leak they are meant to find. They hold live tracemalloc
+# state, so every worker takes its own under the shared ID and compares
+# only its own.
+MAX_SNAPSHOTS = 5
+_snapshots: dict[int, tracemalloc.Snapshot] = {}
+# Kept referenced, the event loop only holds tasks weakly
+_tasks: list[asyncio.Task[None]] = []
+
+GroupBy = Literal["lineno", "filename", "traceback"]
+
+
+class WorkerMemory(BaseModel):
+    worker: str
+    rss_bytes: int
+    max_rss_bytes: int
+    gc_counts: tuple[int, int, int]
+    gc_collections: list[int]
+    tracing: bool
+    traced_bytes: int
+    traced_peak_bytes: int
+    snapshots: list[int]
+    reported_at: float
+
+
+class BroadcastStats(BaseModel):
+    worker: str
+    subscribers: int
+    delta_subscribers: int
+    buffered_frames: int
+    waiters: int
+    frames_dropped: int
+    clients_evicted: int
+
+
+class AllocationSite(BaseModel):
+    location: list[str]
+    size_bytes: int
+    count: int
+    size_diff_bytes: int = 0
+    count_diff: int = 0
+
+
+class WorkerReply(BaseModel):
+    worker: str
+    status_code: int = 200
+    detail: str | None = None
+    traced_bytes: int | None = None
+    sites: list[AllocationSite] = []
+
+
+class SnapshotCreated(BaseModel):
+    id: int
+    workers: list[WorkerReply]
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def _worker_memory() -> WorkerMemory:
+    traced, peak = tracemalloc.get_traced_memory()
+    return WorkerMemory(
+        worker=WORKER_ID,
+        rss_bytes=_rss_bytes(),
+        # ru_maxrss is reported in kilobytes on Linux
+        max_rss_bytes=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        gc_counts=gc.get_count(),
+        gc_collections=[stats["collections"] for stats in gc.get_stats()],
+        tracing=tracemalloc.is_tracing(),
+        traced_bytes=traced,
+        traced_peak_bytes=peak,
+        snapshots=list(_snapshots),
+        reported_at=time.time(),
+    )
+
+
+def _take_snapshot() -> tracemalloc.Snapshot:
+    if not tracemalloc.is_tracing():
+        raise HTTPException(status_code=409, detail="Tracemalloc is not running")
+    return tracemalloc.take_snapshot().filter_traces(
+        (
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        )
+    )
+
+
+def _get_snapshot(snapshot_id: int) -> tracemalloc.Snapshot:
+    snapshot = _snapshots.get(snapshot_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail=f"Snapshot {snapshot_id} not found")
+    return snapshot
+
+
+def _sites(
+    stats: list[tracemalloc.Statistic] | list[tracemalloc.StatisticDiff],
+) -> list[AllocationSite]:
+    return [
+        AllocationSite(
+            location=stat.traceback.format(),
+            size_bytes=stat.size,
+            count=stat.count,
+            size_diff_bytes=getattr(stat, "size_diff", 0),
+            count_diff=getattr(stat, "count_diff", 0),
+        )
+        for stat in stats
+    ]
+
+
+def _start(frames: int) -> WorkerReply:
+    if tracemalloc.is_tracing():
+        raise HTTPException(status_code=409, detail="Tracemalloc is already running")
+    tracemalloc.start(frames)
+    return WorkerReply(worker=WORKER_ID, detail="Tracemalloc started")
+
+
+def _stop() -> WorkerReply:
+    tracemalloc.stop()
+    _snapshots.clear()
+    return WorkerReply(worker=WORKER_ID, detail="Tracemalloc stopped")
+
+
+def _snapshot(snapshot_id: int) -> WorkerReply:
+    snapshot = _take_snapshot()
+    _snapshots[snapshot_id] = snapshot
+    while len(_snapshots) > MAX_SNAPSHOTS:
+        del _snapshots[min(_snapshots)]
+    return WorkerReply(
+        worker=WORKER_ID, traced_bytes=sum(t.size for t in snapshot.traces)
+    )
+
+
+def _top(snapshot_id: int | None, group_by: GroupBy, limit: int) -> WorkerReply:
+    snapshot = (
+        _get_snapshot(snapshot_id) if snapshot_id is not None else _take_snapshot()
+    )
+    return WorkerReply(
+        worker=WORKER_ID, sites=_sites(snapshot.statistics(group_by)[:limit])
+    )
+
+
+def _diff(
+    from_id: int, to_id: int | None, group_by: GroupBy, limit: int
+) -> WorkerReply:
+    old = _get_snapshot(from_id)
+    new = _get_snapshot(to_id) if to_id is not None else _take_snapshot()
+    return WorkerReply(
+        worker=WORKER_ID, sites=_sites(new.compare_to(old, group_by)[:limit])
+    )
+
+
+COMMANDS = {
+    "start": _start,
+    "stop": _stop,
+    "snapshot": _snapshot,
+    "top": _top,
+    "diff": _diff,
+}
+
+
+def _run_command(command: dict[str, Any]) -> WorkerReply:
+    try:
+        return COMMANDS[command["op"]](**command["args"])
+    except HTTPException as e:
+        return WorkerReply(worker=WORKER_ID, status_code=e.status_code, detail=e.detail)
+
+
+async def _listen_for_commands(subscribed: asyncio.Event) -> None:
+    """Run the tracemalloc commands sent to all workers"""
+    while True:
+        try:
+            async with redis_client.pubsub() as pubsub:
+                await pubsub.subscribe(COMMANDS_CHANNEL)
+                subscribed.set()
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    command = json.loads(message["data"])
+                    # Snapshots and comparisons are CPU bound
+                    reply = await run_in_threadpool(_run_command, command)
+                    async with redis_client.pipeline() as pipe:
+                        pipe.rpush(command["reply_to"], reply.model_dump_json())
+                        pipe.expire(
+                            command["reply_to"],
+                            2 * settings.DIAGNOSTICS_COMMAND_TIMEOUT_SECONDS,
+                        )
+                        await pipe.execute()
+        except Exception as e:
+            print(f"Diagnostics command error: {e}")
+            await asyncio.sleep(1)
+
+
+async def _send_command(op: str, **args: Any) -> list[WorkerReply]:
+    """
+    Run a command on every worker and collect their replies.
+
+    Fails with the shared error when every worker failed alike, and with a
+    503 when none replied in time.
+    """
+    reply_to = f"diagnostics:replies:{uuid.uuid4().hex}"
+    command = json.dumps({"op": op, "args": args, "reply_to": reply_to})
+    # Each listening worker counts as one receiver
+    workers = await redis_client.publish(COMMANDS_CHANNEL, command)
+    deadline = time.monotonic() + settings.DIAGNOSTICS_COMMAND_TIMEOUT_SECONDS
+    replies: list[WorkerReply] = []
+    while len(replies) < workers and (remaining := deadline - time.monotonic()) > 0:
+        popped = await redis_client.blpop([reply_to], timeout=remaining)
+        if popped is None:
+            break
+        replies.append(WorkerReply.model_validate_json(popped[1]))
+    await redis_client.delete(reply_to)
+    if not replies:
+        raise HTTPException(status_code=503, detail="No worker replied")
+    failures = {(r.status_code, r.detail) for r in replies if r.status_code != 200}
+    if len(failures) == 1 and all(r.status_code != 200 for r in replies):
+        status_code, detail = failures.pop()
+        raise HTTPException(status_code=status_code, detail=detail)
+    return sorted(replies, key=lambda r: r.worker)
+
+
+async def _report_worker_memory() -> None:
+    """Publish this worker's memory stats so any worker can list all of them"""
+    while True:
+        try:
+            await redis_client.hset(
+                WORKERS_KEY, WORKER_ID, _worker_memory().model_dump_json()
+            )
+        except Exception as e:
+            print(f"Diagnostics report error: {e}")
+        await asyncio.sleep(settings.DIAGNOSTICS_REPORT_INTERVAL_SECONDS)
+
+
+@router.on_event("startup")
+async def startup_event():
+    if not _tasks:
+        subscribed = asyncio.Event()
+        _tasks.append(asyncio.create_task(_report_worker_memory()))
+        _tasks.append(asyncio.create_task(_listen_for_commands(subscribed)))
+        # Commands sent before the subscription would miss this worker
+        try:
+            await asyncio.wait_for(subscribed.wait(), timeout=5)
+        except asyncio.TimeoutError:
+            print("Diagnostics commands are not subscribed yet")
+
+
+@router.on_event("shutdown")
+async def shutdown_event():
+    for task in _tasks:
+        task.cancel()
+    for task in _tasks:
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    _tasks.clear()
+
+
+@router.get("/memory", response_model=WorkerMemory)
+def read_memory() -> WorkerMemory:
+    """
+    Memory usage of the worker that serves this request.
+    """
+    return _worker_memory()
+
+
+@router.get("/memory/workers", response_model=list[WorkerMemory])
+async def read_workers_memory() -> list[WorkerMemory]:
+    """
+    Latest memory report of every live worker.
+    """
+    reports = await redis_client.hgetall(WORKERS_KEY)
+    stale_before = time.time() - 3 * settings.DIAGNOSTICS_REPORT_INTERVAL_SECONDS
+    workers = [WorkerMemory.model_validate(json.loads(r)) for r in reports.values()]
+    stale = [w.worker for w in workers if w.reported_at < stale_before]
+    if stale:
+        await redis_client.hdel(WORKERS_KEY, *stale)
+    return [w for w in workers if w.reported_at >= stale_before]
+
+
+@router.get("/broadcast", response_model=BroadcastStats)
+def read_broadcast_stats() -> BroadcastStats:
+    """
+    Leaderboard stream clients of this worker, with the frames dropped for
+    slow clients and the clients disconnected for lagging since it started.
+    """
+    return BroadcastStats(worker=WORKER_ID, **broadcaster.stats())
+
+
+@router.post("/memory/tracemalloc/start", response_model=list[WorkerReply])
+async def start_tracemalloc(frames: int = 1) -> list[WorkerReply]:
+    """
+    Start tracing allocations on every worker, keeping `frames` frames per
+    traceback.
+    """
+    return await _send_command("start", frames=frames)
+
+
+@router.post("/memory/tracemalloc/stop", response_model=list[WorkerReply])
+async def stop_tracemalloc() -> list[WorkerReply]:
+    """
+    Stop tracing allocations on every worker and drop all snapshots.
+    """
+    return await _send_command("stop")
+
+
+@router.post("/memory/snapshots", response_model=SnapshotCreated)
+async def create_snapshot() -> SnapshotCreated:
+    """
+    Take a snapshot on every worker to diff against later ones.
+
+    Each worker keeps its own snapshot under the returned ID.
+    """
+    snapshot_id = await redis_client.incr(SNAPSHOT_SEQ_KEY)
+    workers = await _send_command("snapshot", snapshot_id=snapshot_id)
+    return SnapshotCreated(id=snapshot_id, workers=workers)
+
+
+@router.get("/memory/top", response_model=list[WorkerReply])
+async def read_top_allocations(
+    snapshot_id: int | None = None, group_by: GroupBy = "lineno", limit: int = 20
+) -> list[WorkerReply]:
+    """
+    Top allocation sites of every worker, in a stored snapshot or a fresh
+    one.
+    """
+    return await _send_command(
+        "top", snapshot_id=snapshot_id, group_by=group_by, limit=limit
+    )
+
+
+@router.get("/memory/diff", response_model=list[WorkerReply])
+async def read_allocations_diff(
+    from_id: int,
+    to_id: int | None = None,
+    group_by: GroupBy = "lineno",
+    limit: int = 20,
+) -> list[WorkerReply]:
+    """
+    Allocation sites of every worker that grew the most between two
+    snapshots.
+
+    Without `to_id` the comparison is against a fresh snapshot.
+    """
+    return await _send_command(
+        "diff", from_id=from_id, to_id=to_id, group_by=group_by, limit=limit
+    )
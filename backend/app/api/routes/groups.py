@@ -0,0 +1,113 @@
+import uuid
+from typing import Any
+
+from fastapi import APIRouter, HTTPException
+
+from app import crud
+from app.api.deps import CurrentUser, SessionDep
+from app.models import (
+    Group,
+    GroupCreate,
+    GroupMembersUpdate,
+    GroupPublic,
+    Message,
+    User,
+)
+
+router = APIRouter()
+
+
+def _get_owned_group(
+    session: SessionDep, current_user: User, group_id: uuid.UUID
+) -> Group:
+    group = session.get(Group, group_id)
+    if not group:
+        raise HTTPException(status_code=404, detail="Group not found")
+    if not current_user.is_superuser and group.owner_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return group
+
+
+@router.post("/", response_model=GroupPublic)
+def create_group(
+    *, session: SessionDep, current_user: CurrentUser, group_in: GroupCreate
+) -> Any:
+    """
+    Create a group owned by the current user, such as a class.
+    """
+    group = crud.create_group(
+        session=session, owner_id=current_user.id, group_in=group_in
+    )
+    return crud.get_group_public(session=session, group=group)
+
+
+@router.get("/{group_id}", response_model=GroupPublic)
+def read_group(
+    session: SessionDep, current_user: CurrentUser, group_id: uuid.UUID
+) -> Any:
+    """
+    Get a group and its members; visible to its owner and members.
+    """
+    group = session.get(Group, group_id)
+    if not group:
+        raise HTTPException(status_code=404, detail="Group not found")
+    if (
+        not current_user.is_superuser
+        and group.owner_id != current_user.id
+        and not crud.is_group_member(
+            session=session, group_id=group_id, user_id=current_user.id
+        )
+    ):
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return crud.get_group_public(session=session, group=group)
+
+
+@router.post("/{group_id}/members", response_model=GroupPublic)
+def add_group_members(
+    *,
+    session: SessionDep,
+    current_user: CurrentUser,
+    group_id: uuid.UUID,
+    members_in: GroupMembersUpdate,
+) -> Any:
+    """
+    Add users to a group. Unknown users and current members are skipped.
+    """
+    group = _get_owned_group(session, current_user, group_id)
+    group = crud.add_group_members(
+        session=session, group=group, user_ids=members_in.user_ids
+    )
+    return crud.get_group_public(session=session, group=group)
+
+
+@router.delete("/{group_id}/members/{user_id}", response_model=GroupPublic)
+def remove_group_member(
+    session: SessionDep,
+    current_user: CurrentUser,
+    group_id: uuid.UUID,
+    user_id: uuid.UUID,
+) -> Any:
+    """
+    Remove a user from a group; members may also leave on their own.
+    """
+    if user_id == current_user.id:
+        group = session.get(Group, group_id)
+        if not group:
+            raise HTTPException(status_code=404, detail="Group not found")
+    else:
+        group = _get_owned_group(session, current_user, group_id)
+    group = crud.remove_group_member(session=session, group=group, user_id=user_id)
+    return crud.get_group_public(session=session, group=group)
+
+
+@router.delete("/{group_id}")
+def delete_group(
+    session: SessionDep, current_user: CurrentUser, group_id: uuid.UUID
+) -> Message:
+    """
+    Delete a group.
+    """
+    group = _get_owned_group(session, current_user, group_id)
+    session.delete(group)
+    session.commit()
+    return Message(message="Group deleted successfully")
@@ -5,6 +5,7 @@ from fastapi import APIRouter, HTTPException
 from sqlmodel import func, select
 
 from app.api.deps import CurrentUser, SessionDep
+from app.api.pagination import decode_cursor, estimated_count, paginate, split_page
 from app.models import Item, ItemCreate, ItemPublic, ItemsPublic, ItemUpdate, Message
 
 router = APIRouter()
@@ -12,33 +13,38 @@ router = APIRouter()
 
 @router.get("/", response_model=ItemsPublic)
 def read_items(
-    session: SessionDep, current_user: CurrentUser, skip: int = 0, limit: int = 100
+    session: SessionDep,
+    current_user: CurrentUser,
+    cursor: str | None = None,
+    skip: int = 0,
+    limit: int = 100,
+    with_count: bool = True,
 ) -> Any:
     """
     Retrieve items.
     """
+    after = decode_cursor(cursor)
+    want_count = with_count and after is None and not skip
 
+    count = None
     if current_user.is_superuser:
-        count_statement = select(func.count()).select_from(Item)
-        count = session.exec(count_statement).one()
-        statement = select(Item).offset(skip).limit(limit)
-        items = session.exec(statement).all()
+        if want_count:
+            count = estimated_count(session, Item)
+        statement = select(Item)
     else:
-        count_statement = (
-            select(func.count())
-            .select_from(Item)
-            .where(Item.owner_id == current_user.id)
-        )
-        count = session.exec(count_statement).one()
-        statement = (
-            select(Item)
-            .where(Item.owner_id == current_user.id)
-            .offset(skip)
-            .limit(limit)
-        )
-        items = session.exec(statement).all()
-
-    return ItemsPublic(data=items, count=count)
+        if want_count:
+            count_statement = (
+                select(func.count())
+                .select_from(Item)
+                .where(Item.owner_id == current_user.id)
+            )
+            count = session.exec(count_statement).one()
+        statement = select(Item).where(Item.owner_id == current_user.id)
+
+    statement = paginate(statement, Item.id, after=after, skip=skip, limit=limit)
+    items, next_cursor = split_page(session.exec(statement).all(), limit)
+
+    return ItemsPublic(data=items, count=count, next_cursor=next_cursor)
 
 
 @router.get("/{id}", response_model=ItemPublic)
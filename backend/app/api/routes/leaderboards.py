@@ -1,146 +1,304 @@
 import asyncio
-import json
 import uuid
 
-import redis.asyncio as redis
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Header, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from app import crud
+from app.api.conditional import etag_matches, make_etag, not_modified
 from app.api.deps import CurrentUser, SessionDep
+from app.broadcast import LEADERBOARD_TOP_N, StreamMode, broadcaster, ranked
 from app.core.config import settings
+from app.idempotency import run_idempotent
+from app.leaderboard import (
+    Window,
+    get_seq,
+    players_below,
+    read_global,
+    read_group,
+    read_histogram,
+    read_window,
+    record_score,
+)
+from app.models import MAX_SCORE, Group, Leaderboard, User
 
 router = APIRouter()
 
-# Initialize Redis
-redis_client = redis.from_url(
-    settings.REDIS_URL,
-    db=settings.REDIS_DB,
-    socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
-    decode_responses=True
-)
 
-LEADERBOARD_STREAM = "quiz_leaderboard_events"
-LEADERBOARD_GROUP = "quiz_leaderboard_group"
+class LeaderboardUpdate(BaseModel):
+    score: int = Field(ge=0, le=MAX_SCORE)
 
 
-class LeaderboardUpdate(BaseModel):
-    score: int
+class RankedScore(BaseModel):
+    rank: int
+    user_id: str
+    score: float
+
+
+class LeaderboardChanges(BaseModel):
+    quiz_id: uuid.UUID
+    seq: int
+    window: Window
+    period: str
+    leaderboard: list[RankedScore]
+
+
+class ScoreBucket(BaseModel):
+    min_score: int
+    count: int
+
+
+class ScoreDistribution(BaseModel):
+    quiz_id: uuid.UUID
+    players: int
+    bucket_width: int
+    buckets: list[ScoreBucket]
+    score: float | None = None
+    # Share of players who scored less than `score`
+    percentile: float | None = None
 
 
-async def setup_stream():
-    """Create the Redis Stream and Consumer Group if they don't exist"""
-    try:
-        await redis_client.xgroup_create(LEADERBOARD_STREAM, LEADERBOARD_GROUP, "0", mkstream=True)
-    except redis.ResponseError as e:
-        if "BUSYGROUP" not in str(e):
-            raise e
+def _ranked_rows(scores: list[tuple[str, int]], start: int = 0) -> list[Leaderboard]:
+    """Rows like the database leaderboard's, ranked in the order Redis keeps"""
+    return [
+        Leaderboard(rank=start + i + 1, user_id=user_id, score=score)
+        for i, (user_id, score) in enumerate(scores)
+    ]
+
+
+def _group_version(session: SessionDep, user: User, group_id: uuid.UUID) -> int:
+    """The version of a group the user may see the rankings of"""
+    group = session.get(Group, group_id)
+    if not group:
+        raise HTTPException(status_code=404, detail="Group not found")
+    if (
+        not user.is_superuser
+        and group.owner_id != user.id
+        and not crud.is_group_member(
+            session=session, group_id=group_id, user_id=user.id
+        )
+    ):
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return group.version
 
 
 @router.on_event("startup")
 async def startup_event():
-    await setup_stream()
+    broadcaster.start()
+
+
+@router.on_event("shutdown")
+async def shutdown_event():
+    await broadcaster.stop()
 
 
 @router.post("/{quiz_id}/score")
-async def post_leaderboard(quiz_id: str, leaderboard_in: LeaderboardUpdate, current_user: CurrentUser):
-    score = leaderboard_in.score
-    current_score = await redis_client.zscore(
-        f"leaderboard:{quiz_id}",
-        str(current_user.id)
+async def post_leaderboard(
+    quiz_id: str,
+    leaderboard_in: LeaderboardUpdate,
+    current_user: CurrentUser,
+    idempotency_key: str | None = Header(default=None, max_length=255),
+):
+    async def submit() -> None:
+        await record_score(quiz_id, current_user.id, leaderboard_in.score)
+
+    return await run_idempotent(
+        idempotency_key,
+        scope=f"score:{current_user.id}",
+        payload={"quiz_id": quiz_id, "score": leaderboard_in.score},
+        call=submit,
     )
 
-    if current_score is None or score > current_score:
-        await redis_client.zadd(
-            f"leaderboard:{quiz_id}",
-            {str(current_user.id): score}
-        )
-        # Publish an event to the Redis stream
-        await redis_client.xadd(
-            LEADERBOARD_STREAM,
-            {"quiz_id": quiz_id, "user_id": str(current_user.id), "score": score}
-        )
+
+@router.get("/global", response_model=list[Leaderboard])
+async def get_global_leaderboard(
+        request: Request,
+        response: Response,
+        skip: int = Query(default=0, ge=0),
+        limit: int = Query(default=100, ge=1, le=1000),
+):
+    """
+    Get the global leaderboard: the sum of each player's best scores over
+    all quizzes.
+    """
+    seq, scores = await read_global(skip, limit)
+    etag = make_etag(seq, skip, limit)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    return _ranked_rows(scores, skip)
 
 
 @router.get("/{quiz_id}")
-async def get_leaderboard(*, session: SessionDep, quiz_id: uuid.UUID):
-    """Get the current leaderboard for a quiz"""
-    return crud.get_leaderboard(session=session, quiz_id=quiz_id)
+async def get_leaderboard(
+        *,
+        session: SessionDep,
+        quiz_id: uuid.UUID,
+        request: Request,
+        response: Response,
+        window: Window = "all",
+):
+    """
+    Get the current leaderboard for a quiz
 
+    `window=day` and `window=week` rank the best scores of the current UTC
+    day and ISO week; the weekly board may lag by up to a minute.
+    """
+    if window != "all":
+        board = await read_window(quiz_id, window)
+        etag = make_etag(board.seq, window, board.period)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        response.headers["ETag"] = etag
+        return _ranked_rows(board.scores)
 
-@router.get("/all/stream", include_in_schema=False)
-async def stream_all_leaderboards(request: Request):
-    """Stream all leaderboard updates using Server-Sent Events"""
+    # Read the sequence before the rows: a change racing with this request
+    # then yields a newer tag next time instead of a stale 304
+    etag = make_etag(await get_seq(quiz_id))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    return await run_in_threadpool(crud.get_leaderboard, session=session, quiz_id=quiz_id)
 
-    async def event_generator():
-        # Start reading from the Redis stream
-        while True:
-            if await request.is_disconnected():
-                break
-
-            try:
-                events = await redis_client.xreadgroup(
-                    groupname=LEADERBOARD_GROUP,
-                    consumername="leaderboard_consumer",
-                    streams={LEADERBOARD_STREAM: ">"},
-                    count=10,
-                    block=5000  # Block for up to 5 seconds
+
+@router.get("/{quiz_id}/groups/{group_id}", response_model=list[Leaderboard])
+async def get_group_leaderboard(
+        *,
+        session: SessionDep,
+        current_user: CurrentUser,
+        quiz_id: uuid.UUID,
+        group_id: uuid.UUID,
+        request: Request,
+        response: Response,
+):
+    """
+    Get the leaderboard of a quiz among the members of a group, such as a
+    class; visible to the group's owner and members.
+    """
+    version = await run_in_threadpool(_group_version, session, current_user, group_id)
+
+    async def member_ids() -> list[uuid.UUID]:
+        return await run_in_threadpool(
+            crud.get_group_member_ids, session=session, group_id=group_id
+        )
+
+    board = await read_group(quiz_id, group_id, version, member_ids)
+    etag = make_etag(board.seq, "group", group_id, version)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    return _ranked_rows(board.scores)
+
+
+@router.get("/{quiz_id}/distribution", response_model=ScoreDistribution)
+async def get_score_distribution(
+        quiz_id: uuid.UUID,
+        request: Request,
+        response: Response,
+        score: float | None = None,
+):
+    """
+    Get how the best scores of a quiz are distributed, and with `score` the
+    percentage of players who scored less, such as a player's own score.
+
+    Answered from a histogram kept as scores are recorded, so it costs the
+    same for any number of players.
+    """
+    histogram = await read_histogram(quiz_id)
+    etag = make_etag(histogram.seq, "distribution", score)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+
+    players = sum(histogram.buckets.values())
+    distribution = ScoreDistribution(
+        quiz_id=quiz_id,
+        players=players,
+        bucket_width=settings.LEADERBOARD_HISTOGRAM_BUCKET_WIDTH,
+        buckets=[
+            ScoreBucket(min_score=bucket, count=count)
+            for bucket, count in histogram.buckets.items()
+        ],
+    )
+    if score is not None:
+        below = players_below(histogram.buckets, score)
+        distribution.score = score
+        distribution.percentile = round(100 * below / players, 2) if players else 0.0
+    return distribution
+
+
+@router.get(
+    "/{quiz_id}/changes",
+    response_model=LeaderboardChanges,
+    responses={204: {"description": "No change before the timeout"}},
+)
+async def get_leaderboard_changes(
+    quiz_id: uuid.UUID,
+    since: int | None = None,
+    timeout: float = Query(
+        default=settings.LONG_POLL_TIMEOUT_SECONDS,
+        gt=0,
+        le=settings.LONG_POLL_TIMEOUT_SECONDS,
+    ),
+    window: Window = "all",
+):
+    """
+    Long-poll alternative to the SSE stream.
+
+    Returns the top scores as soon as the quiz's sequence differs from
+    `since`, waiting up to `timeout` seconds for a change; poll again with
+    the returned `seq`. Waiting requests are woken by the shared stream
+    reader, so they do not poll Redis.
+    `window` selects the all-time, daily or weekly board.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    key = str(quiz_id)
+    while True:
+        waiter = broadcaster.waiter(key)
+        try:
+            board = await read_window(quiz_id, window, LEADERBOARD_TOP_N)
+            if board.seq != since:
+                return LeaderboardChanges(
+                    quiz_id=quiz_id,
+                    seq=board.seq,
+                    window=window,
+                    period=board.period,
+                    leaderboard=ranked(board.scores),
                 )
+            await asyncio.wait_for(waiter, deadline - loop.time())
+        except asyncio.TimeoutError:
+            return Response(status_code=204)
+        finally:
+            broadcaster.discard_waiter(key, waiter)
+
 
-                if events:
-                    for stream, messages in events:
-                        for message_id, message in messages:
-                            quiz_id = message["quiz_id"]
-                            leaderboard = await redis_client.zrevrange(
-                                f"leaderboard:{quiz_id}",
-                                0,
-                                9,
-                                withscores=True
-                            )
-
-                            data = {
-                                "quiz_id": quiz_id,
-                                "leaderboard": [
-                                    {"rank": i + 1, "user_id": user_id, "score": score}
-                                    for i, (user_id, score) in enumerate(leaderboard)
-                                ]
-                            }
-                            yield f"data: {json.dumps(data)}\n\n"
-
-                    # Acknowledge messages after processing
-                    await redis_client.xack(LEADERBOARD_STREAM, LEADERBOARD_GROUP,
-                                            *[message_id for _, messages in events for message_id, _ in messages])
-
-                else:
-                    # If no new events, periodically fetch all leaderboards
-                    keys = await redis_client.keys("leaderboard:*")
-                    for key in keys:
-                        quiz_id = key.split(":")[1]
-                        leaderboard = await redis_client.zrevrange(
-                            key,
-                            0,
-                            9,
-                            withscores=True
-                        )
-
-                        data = {
-                            "quiz_id": quiz_id,
-                            "leaderboard": [
-                                {"rank": i + 1, "user_id": user_id, "score": score}
-                                for i, (user_id, score) in enumerate(leaderboard)
-                            ]
-                        }
-                        yield f"data: {json.dumps(data)}\n\n"
-
-                await asyncio.sleep(0.5)  # Sleep to reduce load on Redis
-
-            except redis.ResponseError as e:
-                print(f"Redis error: {e}")
-                yield f"data: {json.dumps({'error': 'Redis error - ' + str(e)})}\n\n"
-            except Exception as e:
-                print(f"Error in SSE stream: {e}")
-                yield f"data: {json.dumps({'error': 'Error - ' + str(e)})}\n\n"
+@router.get("/all/stream", include_in_schema=False)
+async def stream_all_leaderboards(
+    mode: StreamMode = "full",
+    last_event_id: str | None = Header(default=None, max_length=64),
+):
+    """
+    Stream all leaderboard updates using Server-Sent Events
+
+    With `mode=delta` each quiz starts with a snapshot, followed by numbered
+    frames holding only the entries that changed. A client reconnecting with
+    `Last-Event-ID` only receives the boards that changed since that event.
+    Idle streams get a comment every `SSE_HEARTBEAT_SECONDS`.
+    """
+
+    async def event_generator():
+        subscription = broadcaster.subscribe(mode, last_event_id)
+        try:
+            while True:
+                frame = await subscription.next(settings.SSE_HEARTBEAT_SECONDS)
+                if subscription.closed:
+                    break
+                yield frame if frame is not None else ": keep-alive\n\n"
+        finally:
+            broadcaster.unsubscribe(subscription)
 
     return StreamingResponse(
         event_generator(),
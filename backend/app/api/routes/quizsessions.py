@@ -1,27 +1,22 @@
+from collections import defaultdict
+from typing import Any
 from uuid import UUID
 
-import redis.asyncio as redis
-from fastapi import APIRouter
-from pydantic import BaseModel
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
 
 from app import crud
-from app.api.deps import SessionDep
-from app.core.config import settings
-from app.models import QuizSession
+from app.api.deps import CurrentUser, SessionDep
+from app.idempotency import run_idempotent
+from app.leaderboard import record_score, record_scores
+from app.models import MAX_SCORE, QuizSession, ScoreBatch, ScoreBatchResults
 
 router = APIRouter()
 
-# Initialize Redis
-redis_client = redis.from_url(
-    settings.REDIS_URL,
-    db=settings.REDIS_DB,
-    socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
-    decode_responses=True
-)
-
 
 class QuizSessionUpdate(BaseModel):
-    score: int
+    score: int = Field(ge=0, le=MAX_SCORE)
 
 
 @router.patch("/{session_id}/score", response_model=QuizSession)
@@ -29,26 +24,73 @@ async def update_score(
         *,
         session: SessionDep,
         session_id: UUID,
-        quiz_session_in: QuizSessionUpdate
-) -> QuizSession:
+        quiz_session_in: QuizSessionUpdate,
+        idempotency_key: str | None = Header(default=None, max_length=255),
+) -> Any:
     """Update a quiz session score"""
-    quiz_session = crud.update_quiz_score(
-        session=session,
-        session_id=session_id,
-        score=quiz_session_in.score
-    )
 
-    # Check current score in Redis
-    current_score = await redis_client.zscore(
-        f"leaderboard:{quiz_session.quiz_id}",
-        str(quiz_session.user_id)
+    async def update() -> QuizSession:
+        quiz_session = await run_in_threadpool(
+            crud.update_quiz_score,
+            session=session,
+            session_id=session_id,
+            score=quiz_session_in.score
+        )
+        if not quiz_session:
+            raise HTTPException(status_code=404, detail="Quiz session not found")
+
+        # Keep the best score in Redis; the database row changed either way
+        await record_score(
+            quiz_session.quiz_id,
+            quiz_session.user_id,
+            quiz_session_in.score,
+            always_bump=True,
+            achieved_at=quiz_session.achieved_at,
+        )
+        return quiz_session
+
+    return await run_idempotent(
+        idempotency_key,
+        scope=f"session-score:{session_id}",
+        payload=quiz_session_in,
+        call=update,
     )
 
-    # Update the leaderboard in Redis if the new score is higher
-    if current_score is None or quiz_session_in.score > current_score:
-        await redis_client.zadd(
-            f"leaderboard:{quiz_session.quiz_id}",
-            {str(quiz_session.user_id): quiz_session_in.score}
+
+@router.post("/batch", response_model=ScoreBatchResults)
+async def submit_scores(
+        *,
+        session: SessionDep,
+        current_user: CurrentUser,
+        batch_in: ScoreBatch,
+        idempotency_key: str | None = Header(default=None, max_length=255),
+) -> Any:
+    """
+    Submit the results of offline play in one request.
+
+    Each entry gives a score or the picked answers of one session; the
+    response reports the outcome of every entry.
+    """
+
+    async def submit() -> ScoreBatchResults:
+        results = await run_in_threadpool(
+            crud.apply_score_batch, session=session, user=current_user, entries=batch_in.entries
         )
+        best: dict[UUID, dict[UUID, int]] = defaultdict(dict)
+        achieved_at = None
+        for result in results:
+            if result.status == "updated":
+                scores = best[result.quiz_id]
+                scores[result.user_id] = max(result.score, scores.get(result.user_id, result.score))
+                achieved_at = max(result.achieved_at, achieved_at or result.achieved_at)
+        if best:
+            # The scores the batch changed were all stored at this time
+            await record_scores(best, achieved_at)
+        return ScoreBatchResults(results=results)
 
-    return quiz_session
+    return await run_idempotent(
+        idempotency_key,
+        scope=f"score-batch:{current_user.id}",
+        payload=batch_in,
+        call=submit,
+    )
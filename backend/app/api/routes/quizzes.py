@@ -1,92 +1,241 @@
 from typing import Any
 from uuid import UUID
 
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from fastapi import APIRouter, Header, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+from sqlmodel import Session
 
-from app import crud
+from app import crud, lobby, quiz_cache
+from app.api.conditional import etag_matches, make_etag, not_modified
 from app.api.deps import SessionDep, CurrentUser
+from app.api.pagination import decode_cursor, estimated_count, split_page
+from app.core.compression import Encoding, negotiate_encoding
+from app.core.serialization import RawJSONResponse
+from app.idempotency import run_idempotent
+from app.leaderboard import bump_seq
 from app.models import Quiz, Leaderboard, QuizzesPublic, Question, Answer, QuizPublic, QuestionPublic, \
-    AnswerPublic, QuizSession
+    AnswerPublic, QuizSession, QuizSummariesPublic
 
 router = APIRouter()
 
 
-@router.get("/", response_model=QuizzesPublic)
-def read_quizzes(session: SessionDep, skip: int = 0, limit: int = 100) -> Any:
-    """
-    Retrieve quizzes.
-    """
-    quizzes = crud.get_quizzes(session=session, skip=skip, limit=limit)
-
-    # Explicitly access relationships to ensure they're loaded
-    for quiz in quizzes:
-        _ = quiz.questions
-        for question in quiz.questions:
-            _ = question.answers
-
-    return QuizzesPublic(
-        data=[
-            QuizPublic(
-                id=quiz.id,
-                name=quiz.name,
-                questions=[
-                    QuestionPublic(
-                        id=question.id,
-                        text=question.text,
-                        quiz_id=question.quiz_id,
-                        answers=[
-                            AnswerPublic(
-                                id=answer.id,
-                                text=answer.text,
-                                is_correct=answer.is_correct,
-                                question_id=answer.question_id
-                            )
-                            for answer in question.answers
-                        ]
-                    )
-                    for question in quiz.questions
-                ]
-            )
-            for quiz in quizzes
-        ],
-        count=len(quizzes)
-    )
+QUIZ_FIELDS = frozenset(QuizPublic.model_fields)
 
 
-@router.get("/{quiz_id}", response_model=QuizPublic)
-def read_quiz(quiz_id: UUID, session: SessionDep) -> Any:
+def _parse_fields(fields: str | None) -> set[str] | None:
     """
-    Retrieve a specific quiz by ID.
-    """
-    quiz = crud.get_quiz(session=session, quiz_id=quiz_id)
+    The fields selected by a `fields=name,version` parameter, None for all.
 
-    if not quiz:
-        raise HTTPException(status_code=404, detail="Quiz not found")
+    The id is always included.
+    """
+    if fields is None:
+        return None
+    selected = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = selected - QUIZ_FIELDS
+    if unknown:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+        )
+    return selected | {"id"}
+
+
+def _quiz_public(quiz: Quiz, with_questions: bool = True) -> QuizPublic:
+    """
+    Public view of a quiz loaded from the database.
 
-    return QuizPublic(
+    The rows are trusted, so the models are constructed without running
+    validation a second time. Without `with_questions` the questions are
+    left empty and never loaded.
+    """
+    if not with_questions:
+        return QuizPublic.model_construct(
+            id=quiz.id, name=quiz.name, version=quiz.version, questions=[]
+        )
+    return QuizPublic.model_construct(
         id=quiz.id,
         name=quiz.name,
+        version=quiz.version,
         questions=[
-            QuestionPublic(
+            QuestionPublic.model_construct(
                 id=question.id,
                 text=question.text,
                 quiz_id=question.quiz_id,
                 answers=[
-                    AnswerPublic(
+                    AnswerPublic.model_construct(
                         id=answer.id,
                         text=answer.text,
                         is_correct=answer.is_correct,
-                        question_id=answer.question_id
+                        question_id=answer.question_id,
                     )
                     for answer in question.answers
-                ]
+                ],
             )
             for question in quiz.questions
-        ]
+        ],
     )
 
 
+@router.get("/", response_model=QuizzesPublic)
+def read_quizzes(
+    session: SessionDep,
+    cursor: str | None = None,
+    skip: int = 0,
+    limit: int = 100,
+    with_count: bool = True,
+    fields: str | None = None,
+) -> Any:
+    """
+    Retrieve quizzes.
+
+    `fields` selects a comma separated subset of the quiz fields; questions
+    and answers are only loaded when `questions` is selected.
+    """
+    selected = _parse_fields(fields)
+    with_questions = selected is None or "questions" in selected
+    after = decode_cursor(cursor)
+    rows = crud.get_quizzes(
+        session=session,
+        after=after,
+        skip=skip,
+        limit=limit + 1,
+        with_questions=with_questions,
+    )
+    quizzes, next_cursor = split_page(rows, limit)
+    count = None
+    if with_count and after is None and not skip:
+        count = estimated_count(session, Quiz)
+    payload = QuizzesPublic.model_construct(
+        data=[_quiz_public(quiz, with_questions) for quiz in quizzes],
+        count=count,
+        next_cursor=next_cursor,
+    )
+    if selected is None:
+        return RawJSONResponse(payload.model_dump_json())
+    include = {"data": {"__all__": selected}, "count": True, "next_cursor": True}
+    return RawJSONResponse(payload.model_dump_json(include=include))
+
+
+@router.get("/summary", response_model=QuizSummariesPublic)
+def read_quiz_summaries(
+    session: SessionDep,
+    cursor: str | None = None,
+    skip: int = 0,
+    limit: int = 100,
+    with_count: bool = True,
+) -> Any:
+    """
+    Retrieve the quiz catalog: names, versions and question counts only.
+    """
+    after = decode_cursor(cursor)
+    rows = crud.get_quiz_summaries(session=session, after=after, skip=skip, limit=limit + 1)
+    summaries, next_cursor = split_page(rows, limit)
+    count = None
+    if with_count and after is None and not skip:
+        count = estimated_count(session, Quiz)
+    payload = QuizSummariesPublic.model_construct(
+        data=summaries, count=count, next_cursor=next_cursor
+    )
+    return RawJSONResponse(payload.model_dump_json())
+
+
+def _load_quiz_bodies(
+    session: Session, quiz_id: UUID
+) -> tuple[int, dict[Encoding, bytes]] | None:
+    quiz = crud.get_quiz(session=session, quiz_id=quiz_id)
+    if not quiz:
+        return None
+    body = _quiz_public(quiz).model_dump_json().encode()
+    return quiz.version, quiz_cache.encode(body)
+
+
+def _load_quiz_fields(
+    session: Session, quiz_id: UUID, selected: set[str]
+) -> tuple[int, bytes] | None:
+    with_questions = "questions" in selected
+    quiz = crud.get_quiz(session=session, quiz_id=quiz_id, with_questions=with_questions)
+    if not quiz:
+        return None
+    body = _quiz_public(quiz, with_questions).model_dump_json(include=selected)
+    return quiz.version, body.encode()
+
+
+def _fields_etag(version: int, selected: set[str]) -> str:
+    return make_etag(version, *sorted(selected))
+
+
+async def _read_quiz_fields(
+    session: Session, quiz_id: UUID, request: Request, selected: set[str]
+) -> Response:
+    """Sparse quiz reads are cheap to build and are not cached"""
+    if "if-none-match" in request.headers:
+        version = await quiz_cache.version(quiz_id)
+        if version is not None and etag_matches(request, _fields_etag(version, selected)):
+            return not_modified(_fields_etag(version, selected))
+
+    loaded = await run_in_threadpool(_load_quiz_fields, session, quiz_id, selected)
+    if not loaded:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+    version, body = loaded
+    etag = _fields_etag(version, selected)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    return RawJSONResponse(body, headers={"ETag": etag})
+
+
+def _quiz_etag(version: int, encoding: Encoding) -> str:
+    # Each encoding is a different representation and gets its own strong tag
+    return make_etag(version) if encoding == "identity" else make_etag(version, encoding)
+
+
+def _quiz_response(version: int, body: bytes, encoding: Encoding) -> Response:
+    headers = {"Vary": "Accept-Encoding", "ETag": _quiz_etag(version, encoding)}
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return RawJSONResponse(body, headers=headers)
+
+
+@router.get("/{quiz_id}", response_model=QuizPublic)
+async def read_quiz(
+    quiz_id: UUID, session: SessionDep, request: Request, fields: str | None = None
+) -> Any:
+    """
+    Retrieve a specific quiz by ID.
+    """
+    selected = _parse_fields(fields)
+    if selected is not None:
+        return await _read_quiz_fields(session, quiz_id, request, selected)
+
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    if "if-none-match" in request.headers:
+        version = await quiz_cache.version(quiz_id)
+        # Small quizzes are served uncompressed whatever the client accepts
+        if version is not None and etag_matches(
+            request, _quiz_etag(version, encoding), _quiz_etag(version, "identity")
+        ):
+            return not_modified(
+                _quiz_etag(version, encoding), headers={"Vary": "Accept-Encoding"}
+            )
+
+    version, served_encoding, body = await quiz_cache.get(quiz_id, encoding)
+    if quiz_cache.deleted(version):
+        raise HTTPException(status_code=404, detail="Quiz not found")
+    if version is not None and body is not None:
+        return _quiz_response(version, body, served_encoding)
+
+    loaded = await run_in_threadpool(_load_quiz_bodies, session, quiz_id)
+    if not loaded:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+    version, bodies = loaded
+    await quiz_cache.store(quiz_id, version, bodies)
+    served_encoding = encoding if encoding in bodies else "identity"
+    if etag_matches(request, _quiz_etag(version, served_encoding)):
+        return not_modified(
+            _quiz_etag(version, served_encoding), headers={"Vary": "Accept-Encoding"}
+        )
+    return _quiz_response(version, bodies[served_encoding], served_encoding)
+
+
 class QuizCreate(BaseModel):
     name: str
     questions: list[dict]
@@ -106,7 +255,7 @@ def create_quiz(
 
 
 @router.patch("/{quiz_id}", response_model=Quiz)
-def update_quiz(
+async def update_quiz(
         *, session: SessionDep, quiz_id: UUID, quiz_in: QuizCreate, current_user: CurrentUser
 ) -> Any:
     """
@@ -114,14 +263,17 @@ def update_quiz(
     """
     if not current_user.is_superuser:
         raise HTTPException(status_code=403, detail="Not enough permissions")
-    quiz = crud.update_quiz(session=session, quiz_id=quiz_id, name=quiz_in.name, questions=quiz_in.questions)
+    quiz = await run_in_threadpool(
+        crud.update_quiz, session=session, quiz_id=quiz_id, name=quiz_in.name, questions=quiz_in.questions
+    )
     if not quiz:
         raise HTTPException(status_code=404, detail="Quiz not found")
+    await quiz_cache.bump(quiz.id, quiz.version)
     return quiz
 
 
 @router.delete("/{quiz_id}", response_model=None)
-def delete_quiz(
+async def delete_quiz(
         *, session: SessionDep, quiz_id: UUID, current_user: CurrentUser
 ) -> None:
     """
@@ -129,7 +281,8 @@ def delete_quiz(
     """
     if not current_user.is_superuser:
         raise HTTPException(status_code=403, detail="Not enough permissions")
-    crud.delete_quiz(session=session, quiz_id=quiz_id)
+    await run_in_threadpool(crud.delete_quiz, session=session, quiz_id=quiz_id)
+    await quiz_cache.drop(quiz_id)
 
 
 class QuestionCreate(BaseModel):
@@ -137,8 +290,14 @@ class QuestionCreate(BaseModel):
     answers: list[dict]
 
 
+async def _bump_cached_version(session: Session, quiz_id: UUID) -> None:
+    version = await run_in_threadpool(crud.get_quiz_version, session=session, quiz_id=quiz_id)
+    if version is not None:
+        await quiz_cache.bump(quiz_id, version)
+
+
 @router.post("/{quiz_id}/questions", response_model=Question)
-def create_question(
+async def create_question(
         *, session: SessionDep, quiz_id: UUID, question_in: QuestionCreate, current_user: CurrentUser
 ) -> Any:
     """
@@ -146,7 +305,10 @@ def create_question(
     """
     if not current_user.is_superuser:
         raise HTTPException(status_code=403, detail="Not enough permissions")
-    question = crud.create_question(session=session, quiz_id=quiz_id, question_data=question_in.dict())
+    question = await run_in_threadpool(
+        crud.create_question, session=session, quiz_id=quiz_id, question_data=question_in.dict()
+    )
+    await _bump_cached_version(session, quiz_id)
     return question
 
 
@@ -157,10 +319,11 @@ class AnswerCreate(BaseModel):
 
 class QuizSessionCreate(BaseModel):
     quiz_id: UUID
+    round: int = Field(default=1, ge=1)
 
 
 @router.post("/questions/{question_id}/answers", response_model=Answer)
-def create_answer(
+async def create_answer(
         *, session: SessionDep, question_id: UUID, answer_in: AnswerCreate, current_user: CurrentUser
 ) -> Any:
     """
@@ -168,23 +331,53 @@ def create_answer(
     """
     if not current_user.is_superuser:
         raise HTTPException(status_code=403, detail="Not enough permissions")
-    answer = crud.create_answer(session=session, question_id=question_id, answer_data=answer_in.dict())
+    answer = await run_in_threadpool(
+        crud.create_answer, session=session, question_id=question_id, answer_data=answer_in.dict()
+    )
+    quiz_id = await run_in_threadpool(lambda: answer.question.quiz_id)
+    await _bump_cached_version(session, quiz_id)
     return answer
 
 
 @router.post("/join", response_model=QuizSession)
-def join_quiz(
-        *, session: SessionDep, quiz_session_in: QuizSessionCreate, current_user: CurrentUser
+async def join_quiz(
+        *,
+        session: SessionDep,
+        quiz_session_in: QuizSessionCreate,
+        current_user: CurrentUser,
+        idempotency_key: str | None = Header(default=None, max_length=255),
 ) -> Any:
     """
     Join a quiz session.
+
+    Joining the same round again returns the existing session.
     """
-    # Initiate a new quiz session
-    quiz_session = crud.join_quiz_session(session=session, quiz_id=quiz_session_in.quiz_id, user_id=current_user.id)
-    session.add(quiz_session)
-    session.commit()
-    session.refresh(quiz_session)
-    return quiz_session
+
+    async def join() -> QuizSession:
+        if not await lobby.admit(quiz_session_in.quiz_id):
+            raise HTTPException(
+                status_code=429,
+                detail="Too many players are joining this quiz, retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        quiz_session, created = await run_in_threadpool(
+            crud.join_quiz_session,
+            session=session,
+            quiz_id=quiz_session_in.quiz_id,
+            user_id=current_user.id,
+            round=quiz_session_in.round,
+        )
+        if created:
+            # The new player shows up on the leaderboard with a score of zero
+            await bump_seq(quiz_session.quiz_id)
+        return quiz_session
+
+    return await run_idempotent(
+        idempotency_key,
+        scope=f"join:{current_user.id}",
+        payload=quiz_session_in,
+        call=join,
+    )
 
 
 @router.get("/{quiz_id}/leaderboard", response_model=list[Leaderboard])
@@ -0,0 +1,30 @@
+from typing import Any
+
+from fastapi import APIRouter, Query
+
+from app import crud
+from app.api.deps import SessionDep
+from app.models import SearchResults
+
+router = APIRouter()
+
+
+@router.get("/", response_model=SearchResults)
+def search(
+    session: SessionDep,
+    q: str = Query(min_length=2, max_length=255),
+    kind: crud.SearchKind | None = None,
+    skip: int = Query(default=0, ge=0),
+    limit: int = Query(default=20, ge=1, le=50),
+) -> Any:
+    """
+    Search quiz names, questions and answers.
+
+    `q` accepts web search syntax: quoted phrases, `or` and `-word`. Words
+    are matched exactly first, then by trigram similarity to catch typos.
+    Only the best `SEARCH_CANDIDATE_LIMIT` hits are served; `has_more` is
+    false on the page that reaches them. `headline` is the text as
+    escaped HTML with the matched words in `<mark>` tags.
+    """
+    hits = crud.search(session=session, query=q, kind=kind, skip=skip, limit=limit + 1)
+    return SearchResults(data=hits[:limit], has_more=len(hits) > limit)
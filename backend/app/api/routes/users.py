@@ -2,7 +2,7 @@ import uuid
 from typing import Any
 
 from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import col, delete, func, select
+from sqlmodel import col, delete, select
 
 from app import crud
 from app.api.deps import (
@@ -10,6 +10,7 @@ from app.api.deps import (
     SessionDep,
     get_current_active_superuser,
 )
+from app.api.pagination import decode_cursor, estimated_count, paginate, split_page
 from app.core.config import settings
 from app.core.security import get_password_hash, verify_password
 from app.models import (
@@ -34,18 +35,25 @@ router = APIRouter()
     dependencies=[Depends(get_current_active_superuser)],
     response_model=UsersPublic,
 )
-def read_users(session: SessionDep, skip: int = 0, limit: int = 100) -> Any:
+def read_users(
+    session: SessionDep,
+    cursor: str | None = None,
+    skip: int = 0,
+    limit: int = 100,
+    with_count: bool = True,
+) -> Any:
     """
     Retrieve users.
     """
+    after = decode_cursor(cursor)
+    count = None
+    if with_count and after is None and not skip:
+        count = estimated_count(session, User)
 
-    count_statement = select(func.count()).select_from(User)
-    count = session.exec(count_statement).one()
-
-    statement = select(User).offset(skip).limit(limit)
-    users = session.exec(statement).all()
+    statement = paginate(select(User), User.id, after=after, skip=skip, limit=limit)
+    users, next_cursor = split_page(session.exec(statement).all(), limit)
 
-    return UsersPublic(data=users, count=count)
+    return UsersPublic(data=users, count=count, next_cursor=next_cursor)
 
 
 @router.post(
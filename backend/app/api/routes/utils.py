@@ -1,7 +1,9 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Response
 from pydantic.networks import EmailStr
 
 from app.api.deps import get_current_active_superuser
+from app.api.profiling import REPORT_MEDIA_TYPES, profile_key
+from app.core.redis import redis_client
 from app.models import Message
 from app.utils import generate_test_email, send_email
 
@@ -29,3 +31,19 @@ def test_email(email_to: EmailStr) -> Message:
 @router.get("/health-check/")
 async def health_check() -> bool:
     return True
+
+
+@router.get(
+    "/profiles/{profile_id}",
+    dependencies=[Depends(get_current_active_superuser)],
+)
+async def read_profile(profile_id: str) -> Response:
+    """
+    Download a request profile stored by the profiler middleware.
+    """
+    profile = await redis_client.hgetall(profile_key(profile_id))
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return Response(
+        content=profile["report"], media_type=REPORT_MEDIA_TYPES[profile["format"]]
+    )
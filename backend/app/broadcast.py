@@ -0,0 +1,446 @@
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any, Literal
+
+from app.core.config import settings
+from app.core.redis import redis_client
+from app.core.serialization import dumps
+from app.leaderboard import LEADERBOARD_STREAM, decode_boards, leaderboard_key
+
+LEADERBOARD_TOP_N = 10
+# Longest wait for new stream entries before housekeeping runs
+STREAM_BLOCK_MS = 5000
+# Stream entries read, and boards loaded, per round trip
+STREAM_BATCH_SIZE = 1000
+# Delta clients get a full snapshot of a quiz every this many frames
+KEYFRAME_INTERVAL = 50
+
+StreamMode = Literal["full", "delta"]
+Board = list[tuple[str, float]]
+StreamId = tuple[int, int]
+BoardListener = Callable[[str, Board], Awaitable[None]]
+
+
+def sse_frame(data: dict, event_id: StreamId | None = None) -> str:
+    if event_id is None:
+        return f"data: {dumps(data)}\n\n"
+    return f"id: {format_stream_id(event_id)}\ndata: {dumps(data)}\n\n"
+
+
+def parse_stream_id(value: str | None) -> StreamId | None:
+    """Parse a Redis stream entry ID such as `1700000000000-0`"""
+    milliseconds, _, sequence = (value or "").partition("-")
+    if not (milliseconds.isdigit() and sequence.isdigit()):
+        return None
+    return int(milliseconds), int(sequence)
+
+
+def format_stream_id(stream_id: StreamId) -> str:
+    return f"{stream_id[0]}-{stream_id[1]}"
+
+
+class Subscription:
+    """
+    Frames waiting to be written to one SSE client.
+
+    Frames are keyed by quiz and a newer one replaces the frame still
+    waiting, so a slow client skips boards it has not read yet instead of
+    queueing them: the buffer never holds more than one frame per quiz.
+    """
+
+    def __init__(self, mode: StreamMode) -> None:
+        self.mode = mode
+        self.closed = False
+        self._frames: dict[str, str] = {}
+        self._ready = asyncio.Event()
+        # Monotonic time since which frames have been waiting without the
+        # buffer draining, None while the client keeps up
+        self._behind_since: float | None = None
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def pending(self, key: str) -> bool:
+        return key in self._frames
+
+    def put(self, key: str, frame: str, now: float) -> bool:
+        """Queue a frame, returning whether it replaced an unsent one"""
+        replaced = self._frames.pop(key, None) is not None
+        # Appended last, so frames stay in the order they were published
+        self._frames[key] = frame
+        if self._behind_since is None:
+            self._behind_since = now
+        self._ready.set()
+        return replaced
+
+    def lagging(self, now: float) -> bool:
+        return (
+            self._behind_since is not None
+            and now - self._behind_since > settings.SSE_CLIENT_MAX_LAG_SECONDS
+        )
+
+    def pop(self) -> str | None:
+        if not self._frames:
+            return None
+        key = next(iter(self._frames))
+        frame = self._frames.pop(key)
+        if not self._frames:
+            self._behind_since = None
+            self._ready.clear()
+        return frame
+
+    def close(self) -> None:
+        self.closed = True
+        self._frames.clear()
+        self._ready.set()
+
+    async def next(self, timeout: float) -> str | None:
+        """The next frame, or None when `timeout` passes or it is closed"""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        return self.pop()
+
+
+def ranked(board: Board) -> list[dict[str, Any]]:
+    return [
+        {"rank": i + 1, "user_id": user_id, "score": score}
+        for i, (user_id, score) in enumerate(board)
+    ]
+
+
+def leaderboard_delta(old: Board, new: Board) -> list[dict[str, Any]]:
+    """
+    Entries that changed between two top-N boards.
+
+    Only players who left, entered or changed score are listed; the others
+    keep their place relative to each other, so a client rebuilds the board
+    by dropping the listed players and inserting the entered and changed
+    ones at their rank, in rank order.
+    """
+    before = dict(old)
+    after = dict(new)
+    changes: list[dict[str, Any]] = [
+        {"op": "remove", "user_id": user_id}
+        for user_id in before
+        if user_id not in after
+    ]
+    for i, (user_id, score) in enumerate(new):
+        previous = before.get(user_id)
+        if previous != score:
+            op = "insert" if previous is None else "move"
+            changes.append(
+                {"op": op, "user_id": user_id, "rank": i + 1, "score": score}
+            )
+    return changes
+
+
+class LeaderboardBroadcaster:
+    """
+    Fan leaderboard updates out to every SSE client of this process.
+
+    A single task reads the Redis stream and builds each frame once; the
+    same serialized string is then handed to all subscriber buffers, so Redis
+    reads and JSON encoding no longer grow with the number of clients.
+
+    Updates are coalesced per quiz: a quiz is broadcast at most once every
+    `LEADERBOARD_BROADCAST_INTERVAL_MS`, with the top-N read when the frame
+    is sent, so a burst of scores costs one read and one frame.
+
+    Clients in "delta" mode get a snapshot of every board when they
+    subscribe, then only the entries that changed, each frame numbered per
+    quiz. Every `KEYFRAME_INTERVAL` frames a snapshot is sent again so a
+    client that missed a frame can resynchronise.
+
+    Each client has its own `Subscription` buffer, so a slow client only
+    skips frames and never holds up the others; a client that stays behind
+    for `SSE_CLIENT_MAX_LAG_SECONDS` is disconnected.
+
+    Every board frame carries the stream position it was read at as its SSE
+    `id`. A client reconnecting with `Last-Event-ID` only gets the boards
+    that changed after it, served from memory; the full load of every board
+    happens once, when the broadcaster starts or recovers from an error.
+    """
+
+    def __init__(self) -> None:
+        self._subscribers: set[Subscription] = set()
+        self._delta_subscribers: set[Subscription] = set()
+        self._listeners: list[BoardListener] = []
+        # Long-poll requests parked until their quiz is broadcast again
+        self._waiters: dict[str, set[asyncio.Future[None]]] = {}
+        self.frames_dropped = 0
+        self.clients_evicted = 0
+        # Last broadcast board per quiz, with the stream position it was read
+        # at and its frame number for delta clients
+        self._boards: dict[str, Board] = {}
+        self._board_ids: dict[str, StreamId] = {}
+        self._seqs: dict[str, int] = {}
+        # Serialized frames of the current boards, built on first use
+        self._frames: dict[tuple[str, StreamMode], str] = {}
+        # Stream position read up to, and the position the boards were
+        # loaded at; clients resuming from before it get every board
+        self._position: StreamId = (0, 0)
+        self._loaded_at: StreamId | None = None
+        self._task: asyncio.Task[None] | None = None
+        # Monotonic time of the last broadcast, and of the next one due, per quiz
+        self._sent_at: dict[str, float] = {}
+        self._due_at: dict[str, float] = {}
+
+    def subscribe(
+        self, mode: StreamMode = "full", last_event_id: str | None = None
+    ) -> Subscription:
+        """
+        Register a client, queueing the boards it has not seen yet.
+
+        Without a usable `last_event_id` that is every board; boards are
+        queued in stream order so the client's last event ID only grows.
+        """
+        subscription = Subscription(mode)
+        now = time.monotonic()
+        since = parse_stream_id(last_event_id)
+        if since is None or self._loaded_at is None or since < self._loaded_at:
+            since = (-1, -1)
+        changed = sorted(
+            (stream_id, quiz_id)
+            for quiz_id, stream_id in self._board_ids.items()
+            if stream_id > since
+        )
+        for _, quiz_id in changed:
+            subscription.put(quiz_id, self._board_frame(quiz_id, mode), now)
+        if mode == "delta":
+            self._delta_subscribers.add(subscription)
+        else:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscribers.discard(subscription)
+        self._delta_subscribers.discard(subscription)
+
+    def add_listener(self, listener: BoardListener) -> None:
+        """Call `listener` with every board that changed, after the clients"""
+        self._listeners.append(listener)
+
+    def waiter(self, quiz_id: str) -> asyncio.Future[None]:
+        """
+        A future resolved the next time `quiz_id` is broadcast.
+
+        Take it before checking the current state, so an update in between
+        is not missed, and pass it to `discard_waiter` when done.
+        """
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(quiz_id, set()).add(future)
+        return future
+
+    def discard_waiter(self, quiz_id: str, future: asyncio.Future[None]) -> None:
+        waiters = self._waiters.get(quiz_id)
+        if waiters is not None:
+            waiters.discard(future)
+            if not waiters:
+                del self._waiters[quiz_id]
+
+    def stats(self) -> dict[str, int]:
+        subscriptions = self._subscribers | self._delta_subscribers
+        return {
+            "subscribers": len(self._subscribers),
+            "delta_subscribers": len(self._delta_subscribers),
+            "buffered_frames": sum(len(s) for s in subscriptions),
+            "waiters": sum(len(w) for w in self._waiters.values()),
+            "frames_dropped": self.frames_dropped,
+            "clients_evicted": self.clients_evicted,
+        }
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _deliver(self, subscription: Subscription, key: str, frame: str) -> None:
+        now = time.monotonic()
+        if subscription.lagging(now):
+            self.unsubscribe(subscription)
+            subscription.close()
+            self.clients_evicted += 1
+        elif subscription.put(key, frame, now):
+            self.frames_dropped += 1
+
+    def _publish(self, key: str, frame: str) -> None:
+        for subscription in list(self._subscribers | self._delta_subscribers):
+            self._deliver(subscription, key, frame)
+
+    def _board_frame(self, quiz_id: str, mode: StreamMode) -> str:
+        """The whole current board, as a full frame or a delta snapshot"""
+        frame = self._frames.get((quiz_id, mode))
+        if frame is None:
+            data: dict[str, Any] = {"quiz_id": quiz_id}
+            if mode == "delta":
+                data = {"type": "snapshot", **data, "seq": self._seqs[quiz_id]}
+            data["leaderboard"] = ranked(self._boards[quiz_id])
+            frame = sse_frame(data, self._board_ids[quiz_id])
+            self._frames[quiz_id, mode] = frame
+        return frame
+
+    async def _publish_boards(self, quiz_ids: list[str], *, always: bool) -> None:
+        for start in range(0, len(quiz_ids), STREAM_BATCH_SIZE):
+            batch = quiz_ids[start : start + STREAM_BATCH_SIZE]
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for quiz_id in batch:
+                    pipe.zrevrange(
+                        leaderboard_key(quiz_id),
+                        0,
+                        LEADERBOARD_TOP_N - 1,
+                        withscores=True,
+                    )
+                boards = await decode_boards(await pipe.execute())
+            for quiz_id, board in zip(batch, boards, strict=True):
+                changed = self._boards.get(quiz_id) != board
+                self._publish_board(quiz_id, board, always=always)
+                if changed:
+                    for listener in self._listeners:
+                        await listener(quiz_id, board)
+
+    def _publish_board(self, quiz_id: str, board: Board, *, always: bool) -> None:
+        """
+        Record the latest board of a quiz, wake its long-poll waiters and send
+        it to the subscribers.
+
+        Full clients get every board published with `always`; delta clients
+        only get boards that changed.
+        """
+        for future in self._waiters.pop(quiz_id, ()):
+            if not future.done():
+                future.set_result(None)
+
+        previous = self._boards.get(quiz_id)
+        if previous != board:
+            self._boards[quiz_id] = board
+            self._seqs[quiz_id] = self._seqs.get(quiz_id, 0) + 1
+            self._board_ids[quiz_id] = self._position
+            self._frames.pop((quiz_id, "full"), None)
+            self._frames.pop((quiz_id, "delta"), None)
+        elif not always:
+            return
+
+        if self._subscribers:
+            frame = self._board_frame(quiz_id, "full")
+            for subscription in list(self._subscribers):
+                self._deliver(subscription, quiz_id, frame)
+        if previous == board or not self._delta_subscribers:
+            return
+        if previous is None or self._seqs[quiz_id] % KEYFRAME_INTERVAL == 0:
+            delta_frame = self._board_frame(quiz_id, "delta")
+        else:
+            delta_frame = sse_frame(
+                {
+                    "type": "delta",
+                    "quiz_id": quiz_id,
+                    "seq": self._seqs[quiz_id],
+                    "changes": leaderboard_delta(previous, board),
+                },
+                self._position,
+            )
+        for subscription in list(self._delta_subscribers):
+            # A client still holding an unsent frame of this quiz would miss
+            # a change if it were replaced by the delta: send a snapshot
+            if subscription.pending(quiz_id):
+                self._deliver(
+                    subscription, quiz_id, self._board_frame(quiz_id, "delta")
+                )
+            else:
+                self._deliver(subscription, quiz_id, delta_frame)
+
+    def _schedule(self, quiz_id: str, now: float) -> None:
+        if quiz_id not in self._due_at:
+            interval = settings.LEADERBOARD_BROADCAST_INTERVAL_MS / 1000
+            self._due_at[quiz_id] = max(self._sent_at.get(quiz_id, 0.0) + interval, now)
+
+    async def _flush(self, now: float) -> None:
+        due = [quiz_id for quiz_id, due_at in self._due_at.items() if due_at <= now]
+        for quiz_id in due:
+            del self._due_at[quiz_id]
+            self._sent_at[quiz_id] = now
+        await self._publish_boards(due, always=True)
+
+    def _prune(self, now: float) -> None:
+        # Quizzes quiet for a whole interval need no throttling
+        interval = settings.LEADERBOARD_BROADCAST_INTERVAL_MS / 1000
+        self._sent_at = {
+            quiz_id: sent_at
+            for quiz_id, sent_at in self._sent_at.items()
+            if now - sent_at < interval
+        }
+
+    def _block_ms(self, now: float) -> int:
+        if not self._due_at:
+            return STREAM_BLOCK_MS
+        wait = min(self._due_at.values()) - now
+        # XREAD treats 0 as "block forever"
+        return max(min(int(wait * 1000), STREAM_BLOCK_MS), 1)
+
+    async def _load(self) -> str:
+        """
+        Load every board and return the stream ID to read on from.
+
+        The position is taken before the boards are read, so a score
+        recorded meanwhile is read again from the stream rather than lost.
+        """
+        latest = await redis_client.xrevrange(LEADERBOARD_STREAM, count=1)
+        last_id = latest[0][0] if latest else "0-0"
+        self._position = max(self._position, parse_stream_id(last_id) or (0, 0))
+        self._loaded_at = self._position
+        quiz_ids = []
+        async for key in redis_client.scan_iter(
+            match="leaderboard:*", count=STREAM_BATCH_SIZE
+        ):
+            quiz_id = key.split(":", 1)[1]
+            if ":" not in quiz_id:
+                quiz_ids.append(quiz_id)
+        await self._publish_boards(quiz_ids, always=False)
+        return last_id
+
+    async def _run(self) -> None:
+        # Every process reads the whole stream, so clients get the same
+        # updates whichever replica they are connected to.
+        last_id: str | None = None
+        pruned_at = time.monotonic()
+        while True:
+            try:
+                if last_id is None:
+                    last_id = await self._load()
+                events = await redis_client.xread(
+                    {LEADERBOARD_STREAM: last_id},
+                    count=STREAM_BATCH_SIZE,
+                    block=self._block_ms(time.monotonic()),
+                )
+                now = time.monotonic()
+                for _, messages in events or ():
+                    for message_id, message in messages:
+                        self._schedule(message["quiz_id"], now)
+                        last_id = message_id
+                self._position = parse_stream_id(last_id) or self._position
+                await self._flush(now)
+
+                if now - pruned_at >= STREAM_BLOCK_MS / 1000:
+                    pruned_at = now
+                    self._prune(now)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error in leaderboard broadcaster: {e}")
+                self._publish("error", sse_frame({"error": "Error - " + str(e)}))
+                # Events may have been trimmed meanwhile, start over
+                last_id = None
+                await asyncio.sleep(1)
+
+
+broadcaster = LeaderboardBroadcaster()
@@ -0,0 +1,122 @@
+import gzip
+from typing import Literal
+
+from fastapi.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is an optional extra
+    brotli = None
+
+Encoding = Literal["br", "gzip", "identity"]
+
+# Bodies above this size are compressed off the event loop
+THREADPOOL_MIN_SIZE = 256 * 1024
+
+
+def negotiate_encoding(accept_encoding: str | None) -> Encoding:
+    """Pick the best encoding the client accepts, brotli over gzip"""
+    if not accept_encoding:
+        return "identity"
+    accepted = set()
+    for part in accept_encoding.split(","):
+        coding, *params = part.split(";")
+        quality = 1.0
+        for param in params:
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(coding.strip().lower())
+    if brotli is not None and ("br" in accepted or "*" in accepted):
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return "identity"
+
+
+def compress(body: bytes, encoding: Encoding, *, cached: bool = False) -> bytes:
+    """
+    Compress `body` for the given encoding.
+
+    Payloads that are `cached` are compressed once and served many times,
+    so they get stronger, slower settings than per-request compression.
+    """
+    if encoding == "br":
+        quality = 9 if cached else settings.COMPRESSION_BROTLI_QUALITY
+        return brotli.compress(body, quality=quality)
+    if encoding == "gzip":
+        level = 9 if cached else settings.COMPRESSION_GZIP_LEVEL
+        return gzip.compress(body, compresslevel=level, mtime=0)
+    return body
+
+
+def available_encodings() -> tuple[Encoding, ...]:
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+class CompressionMiddleware:
+    """
+    Compress complete responses above `COMPRESSION_MIN_SIZE` bytes.
+
+    Streaming responses (SSE) and responses that already carry a
+    Content-Encoding, such as precompressed cache hits, are passed through.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding == "identity":
+            await self.app(scope, receive, send)
+            return
+
+        start: Message | None = None
+
+        async def compressing_send(message: Message) -> None:
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if start is None or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            response_start, start = start, None
+            headers = MutableHeaders(raw=response_start["headers"])
+            body = message.get("body", b"")
+            if (
+                message.get("more_body", False)
+                or "content-encoding" in headers
+                or len(body) < settings.COMPRESSION_MIN_SIZE
+            ):
+                await send(response_start)
+                await send(message)
+                return
+
+            if len(body) >= THREADPOOL_MIN_SIZE:
+                compressed = await run_in_threadpool(compress, body, encoding)
+            else:
+                compressed = compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                # The bytes differ from the uncompressed representation
+                headers["ETag"] = f"W/{etag}"
+            headers.add_vary_header("Accept-Encoding")
+            await send(response_start)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, compressing_send)
@@ -54,6 +54,43 @@ class Settings(BaseSettings):
     REDIS_URL: str = "redis://127.0.0.1:6379"
     REDIS_DB: int = 1
     REDIS_SOCKET_TIMEOUT: int = 10
+    PROFILING_ENABLED: bool = True
+    PROFILING_INTERVAL_SECONDS: float = 0.001
+    PROFILING_REPORT_TTL_SECONDS: int = 60 * 60
+    DIAGNOSTICS_REPORT_INTERVAL_SECONDS: int = 30
+    # How long tracemalloc commands wait for every worker to reply
+    DIAGNOSTICS_COMMAND_TIMEOUT_SECONDS: int = 10
+    COMPRESSION_MIN_SIZE: int = 1024
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+    QUIZ_CACHE_TTL_SECONDS: int = 60 * 60 * 24
+    # Tables with fewer estimated rows get an exact count(*) in list responses
+    PAGINATION_EXACT_COUNT_THRESHOLD: int = 10_000
+    # Matches taken from each search index before ranking
+    SEARCH_CANDIDATE_LIMIT: int = 200
+    IDEMPOTENCY_TTL_SECONDS: int = 60 * 60 * 24
+    # Joins admitted per quiz and second, 0 to admit everyone
+    LOBBY_ADMISSIONS_PER_SECOND: int = 500
+    # Shortest gap between two leaderboard broadcasts of the same quiz
+    LEADERBOARD_BROADCAST_INTERVAL_MS: int = 200
+    # Leaderboard events older than this are trimmed from the Redis stream
+    LEADERBOARD_STREAM_RETENTION_SECONDS: int = 60 * 60
+    # SSE clients that stay behind this long are disconnected
+    SSE_CLIENT_MAX_LAG_SECONDS: int = 30
+    # Idle SSE streams get a comment this often to keep proxies from closing them
+    SSE_HEARTBEAT_SECONDS: int = 15
+    # Longest a leaderboard long-poll request waits for a change
+    LONG_POLL_TIMEOUT_SECONDS: int = 25
+    # How long a weekly leaderboard, built from the daily ones, is reused
+    LEADERBOARD_WEEK_CACHE_SECONDS: int = 60
+    # How long a group's ranking on a quiz is reused
+    LEADERBOARD_GROUP_CACHE_SECONDS: int = 5
+    # Points per bucket of the score histograms behind percentiles
+    LEADERBOARD_HISTOGRAM_BUCKET_WIDTH: int = 1
+    # Players on leaderboards by UUID, or by a compact integer ID; run
+    # app.migrate_leaderboards after changing it. The SQL leaderboard always
+    # breaks exact ties by UUID, so with IDs such ties may rank differently
+    LEADERBOARD_MEMBER_ENCODING: Literal["uuid", "id"] = "uuid"
     POSTGRES_PORT: int = 5432
     POSTGRES_USER: str
     POSTGRES_PASSWORD: str = ""
@@ -0,0 +1,17 @@
+import redis.asyncio as redis
+
+from app.core.config import settings
+
+redis_client = redis.from_url(
+    settings.REDIS_URL,
+    db=settings.REDIS_DB,
+    socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+    decode_responses=True,
+)
+
+# For values that are not text, e.g. precompressed response bodies
+binary_redis_client = redis.from_url(
+    settings.REDIS_URL,
+    db=settings.REDIS_DB,
+    socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+)
@@ -0,0 +1,37 @@
+import json
+from typing import Any
+
+from fastapi.datastructures import Default
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is an optional extra
+    orjson = None  # type: ignore[assignment]
+
+
+def dumps(content: Any) -> str:
+    """Compact JSON text, encoded with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(content).decode()
+    return json.dumps(content, separators=(",", ":"))
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson, only usable when it is installed"""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+class RawJSONResponse(Response):
+    """Already serialized JSON bytes, e.g. from `model_dump_json`"""
+
+    media_type = "application/json"
+
+
+# Without orjson keep FastAPI's own default rather than forcing JSONResponse,
+# newer FastAPI versions serialize response models straight to bytes then.
+default_response_class: Any = (
+    FastJSONResponse if orjson is not None else Default(JSONResponse)
+)
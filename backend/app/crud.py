@@ -1,11 +1,16 @@
 import uuid
-from typing import Any, Type, Sequence
+from typing import Any, Literal, Type, Sequence
 
+from sqlalchemy import ColumnElement, FromClause, Select, literal, literal_column, union_all
+from sqlalchemy.dialects.postgresql import TSVECTOR, insert
 from sqlalchemy.orm import lazyload
-from sqlmodel import Session, select, func
+from sqlmodel import Session, col, select, func, update
 
+from app.core.config import settings
 from app.core.security import get_password_hash, verify_password
-from app.models import User, UserCreate, UserUpdate, Quiz, QuizSession, Leaderboard, Question, Answer, UserPublic
+from app.models import User, UserCreate, UserUpdate, Quiz, QuizSession, Leaderboard, Question, Answer, UserPublic, \
+    QuizSummary, ScoreBatchEntry, ScoreBatchResult, SearchHit, Group, GroupCreate, GroupMember, GroupPublic, \
+    achieved_now
 
 
 def create_user(*, session: Session, user_create: UserCreate) -> User:
@@ -47,28 +52,69 @@ def authenticate(*, session: Session, email: str, password: str) -> User | None:
     return db_user
 
 
-def get_quizzes(*, session: Session, skip: int = 0, limit: int = 100) -> Sequence[Quiz]:
-    statement = (
-        select(Quiz)
-        .options(
+def get_quizzes(
+    *,
+    session: Session,
+    after: uuid.UUID | None = None,
+    skip: int = 0,
+    limit: int = 100,
+    with_questions: bool = True,
+) -> Sequence[Quiz]:
+    """Quizzes ordered by id, starting after the id `after` when given"""
+    statement = select(Quiz).order_by(Quiz.id).limit(limit)
+    if with_questions:
+        statement = statement.options(
             lazyload(Quiz.questions).subqueryload(Question.answers)
         )
-        .offset(skip)
+    if after is not None:
+        statement = statement.where(Quiz.id > after)
+    else:
+        statement = statement.offset(skip)
+    return session.exec(statement).all()
+
+
+def get_quiz_summaries(
+    *, session: Session, after: uuid.UUID | None = None, skip: int = 0, limit: int = 100
+) -> Sequence[QuizSummary]:
+    """Quizzes with their question counts, without loading questions or answers"""
+    question_count = (
+        select(func.count(Question.id))
+        .where(Question.quiz_id == Quiz.id)
+        .correlate(Quiz)
+        .scalar_subquery()
+    )
+    statement = (
+        select(Quiz.id, Quiz.name, Quiz.version, question_count.label("question_count"))
+        .order_by(Quiz.id)
         .limit(limit)
     )
-    return session.exec(statement).all()
+    if after is not None:
+        statement = statement.where(Quiz.id > after)
+    else:
+        statement = statement.offset(skip)
+    return [
+        QuizSummary.model_construct(**row._mapping)
+        for row in session.exec(statement).all()
+    ]
 
 
-def get_quiz(*, session: Session, quiz_id: uuid.UUID) -> Quiz:
-    statement = select(Quiz).where(Quiz.id == quiz_id).options(lazyload(Quiz.questions).subqueryload(Question.answers))
+def get_quiz(*, session: Session, quiz_id: uuid.UUID, with_questions: bool = True) -> Quiz:
+    statement = select(Quiz).where(Quiz.id == quiz_id)
+    if with_questions:
+        statement = statement.options(lazyload(Quiz.questions).subqueryload(Question.answers))
     return session.exec(statement).first()
 
 
+def get_quiz_version(*, session: Session, quiz_id: uuid.UUID) -> int | None:
+    return session.exec(select(Quiz.version).where(Quiz.id == quiz_id)).first()
+
+
 def create_quiz(*, session: Session, name: str, questions: list[dict]) -> Quiz:
     db_quiz = Quiz(name=name)
     session.add(db_quiz)
-    session.commit()
+    session.flush()
     _add_questions_and_answers(session, db_quiz.id, questions)
+    session.commit()
     session.refresh(db_quiz)
     return db_quiz
 
@@ -77,16 +123,19 @@ def update_quiz(*, session: Session, quiz_id: uuid.UUID, name: str, questions: l
     db_quiz = session.get(Quiz, quiz_id)
     if db_quiz:
         db_quiz.name = name
+        db_quiz.version += 1
 
         # Clear existing questions and answers
         for question in db_quiz.questions:
             session.delete(question)
 
-        # Commit deletions first
-        session.commit()
+        # Flush deletions first
+        session.flush()
 
-        # Add updated questions and answers
+        # Add updated questions and answers, committed with the new version
+        # so no reader can cache a half-written quiz under it
         _add_questions_and_answers(session, db_quiz.id, questions)
+        session.commit()
         session.refresh(db_quiz)
 
     return db_quiz
@@ -104,8 +153,8 @@ def _add_questions_and_answers(session: Session, quiz_id: uuid.UUID, questions:
         question = Question(quiz_id=quiz_id, text=question_data["text"])
         session.add(question)
 
-        # Committing the question to obtain its ID before adding answers
-        session.commit()
+        # Flushing the question to obtain its ID before adding answers
+        session.flush()
         for answer_data in question_data["answers"]:
             answer = Answer(
                 question_id=question.id,
@@ -114,14 +163,19 @@ def _add_questions_and_answers(session: Session, quiz_id: uuid.UUID, questions:
             )
             session.add(answer)
 
-    # Commit all answers at once after loop for efficiency
-    session.commit()
+    # Flush all answers at once after loop for efficiency; the caller commits
+    session.flush()
+
+
+def _bump_quiz_version(session: Session, quiz_id: uuid.UUID) -> None:
+    statement = update(Quiz).where(Quiz.id == quiz_id).values(version=Quiz.version + 1)
+    session.exec(statement)  # type: ignore
 
 
 def create_question(*, session: Session, quiz_id: uuid.UUID, question_data: dict) -> Question:
     question = Question(quiz_id=quiz_id, text=question_data["text"])
     session.add(question)
-    session.commit()
+    session.flush()
     for answer_data in question_data["answers"]:
         answer = Answer(
             question_id=question.id,
@@ -129,6 +183,8 @@ def create_question(*, session: Session, quiz_id: uuid.UUID, question_data: dict
             is_correct=answer_data["is_correct"],
         )
         session.add(answer)
+    # The new version is committed with the question and its answers
+    _bump_quiz_version(session, quiz_id)
     session.commit()
     session.refresh(question)
     return question
@@ -141,6 +197,9 @@ def create_answer(*, session: Session, question_id: uuid.UUID, answer_data: dict
         is_correct=answer_data["is_correct"],
     )
     session.add(answer)
+    quiz_id = session.exec(select(Question.quiz_id).where(Question.id == question_id)).first()
+    if quiz_id:
+        _bump_quiz_version(session, quiz_id)
     session.commit()
     session.refresh(answer)
     return answer
@@ -149,22 +208,116 @@ def create_answer(*, session: Session, question_id: uuid.UUID, answer_data: dict
 def update_quiz_score(*, session: Session, session_id: uuid.UUID, score: int) -> QuizSession | None:
     db_session = session.get(QuizSession, session_id)
     if db_session:
-        db_session.score = score
+        if db_session.score != score:
+            db_session.score = score
+            db_session.achieved_at = achieved_now()
         session.add(db_session)
         session.commit()
         session.refresh(db_session)
     return db_session
 
 
+def apply_score_batch(
+    *, session: Session, user: User, entries: list[ScoreBatchEntry]
+) -> list[ScoreBatchResult]:
+    """
+    Apply many offline results in one transaction, in order.
+
+    Unknown sessions, sessions of other players and answers from another
+    quiz are reported and skipped. Answers score one point per question
+    answered correctly.
+    """
+    session_ids = {entry.session_id for entry in entries}
+    quiz_sessions = {
+        quiz_session.id: quiz_session
+        for quiz_session in session.exec(
+            select(QuizSession).where(col(QuizSession.id).in_(session_ids))
+        ).all()
+    }
+    answer_ids = {answer_id for entry in entries for answer_id in entry.answers or ()}
+    answers = {}
+    if answer_ids:
+        statement = (
+            select(Answer.id, Answer.is_correct, Answer.question_id, Question.quiz_id)
+            .join(Question)
+            .where(col(Answer.id).in_(answer_ids))
+        )
+        answers = {row.id: row for row in session.exec(statement).all()}
+
+    results = []
+    now = achieved_now()
+    for entry in entries:
+        quiz_session = quiz_sessions.get(entry.session_id)
+        if quiz_session is None or (quiz_session.user_id != user.id and not user.is_superuser):
+            results.append(ScoreBatchResult(session_id=entry.session_id, status="not_found"))
+            continue
+        if quiz_session.quiz_id != entry.quiz_id:
+            results.append(
+                ScoreBatchResult(
+                    session_id=entry.session_id,
+                    status="invalid",
+                    detail="The session belongs to another quiz",
+                )
+            )
+            continue
+        score = entry.score
+        if entry.answers is not None:
+            picked = [answers.get(answer_id) for answer_id in entry.answers]
+            if any(answer is None or answer.quiz_id != entry.quiz_id for answer in picked):
+                results.append(
+                    ScoreBatchResult(
+                        session_id=entry.session_id,
+                        status="invalid",
+                        detail="The answers do not belong to the quiz",
+                    )
+                )
+                continue
+            score = len({answer.question_id for answer in picked if answer.is_correct})
+        if quiz_session.score != score:
+            quiz_session.score = score
+            quiz_session.achieved_at = now
+            session.add(quiz_session)
+        results.append(
+            ScoreBatchResult(
+                session_id=entry.session_id,
+                status="updated",
+                quiz_id=quiz_session.quiz_id,
+                user_id=quiz_session.user_id,
+                score=score,
+                achieved_at=quiz_session.achieved_at,
+            )
+        )
+    session.commit()
+    return results
+
+
 def get_leaderboard(*, session: Session, quiz_id: uuid.UUID) -> list[Leaderboard]:
-    statement = (
+    """
+    The best score of each player of a quiz over all rounds, ranked like the
+    Redis board: equal scores by who reached them first, then by user id
+    descending like ZREVRANGE. With compact member IDs Redis breaks those
+    last ties by member ID instead, so exact ties may rank differently there.
+    """
+    best = (
         select(
             QuizSession.user_id,
             QuizSession.score,
-            func.rank().over(order_by=QuizSession.score.desc()).label("rank")
+            QuizSession.achieved_at,
+            func.row_number()
+            .over(
+                partition_by=QuizSession.user_id,
+                order_by=(col(QuizSession.score).desc(), col(QuizSession.achieved_at)),
+            )
+            .label("best"),
         )
         .where(QuizSession.quiz_id == quiz_id)
-        .order_by(QuizSession.score.desc())
+        .subquery("best")
+    )
+    order = (best.c.score.desc(), best.c.achieved_at, best.c.user_id.desc())
+    statement = (
+        select(best.c.user_id, best.c.score, func.row_number().over(order_by=order).label("rank"))
+        .where(best.c.best == 1)
+        .order_by(*order)
     )
     results = session.exec(statement).all()
 
@@ -176,9 +329,195 @@ def get_leaderboard(*, session: Session, quiz_id: uuid.UUID) -> list[Leaderboard
     return leaderboard
 
 
-def join_quiz_session(*, session: Session, quiz_id: uuid.UUID, user_id: uuid.UUID) -> QuizSession:
-    quiz_session = QuizSession(quiz_id=quiz_id, user_id=user_id)
-    session.add(quiz_session)
+def join_quiz_session(
+    *, session: Session, quiz_id: uuid.UUID, user_id: uuid.UUID, round: int = 1
+) -> tuple[QuizSession, bool]:
+    """
+    The session of a player in a round of a quiz, created on the first join.
+
+    Joining again returns the existing session, so retried joins never
+    create duplicates. The flag tells whether the session was created.
+    """
+    statement = (
+        insert(QuizSession)
+        .values(
+            id=uuid.uuid4(),
+            quiz_id=quiz_id,
+            user_id=user_id,
+            round=round,
+            score=0,
+            achieved_at=achieved_now(),
+        )
+        .on_conflict_do_nothing(index_elements=["quiz_id", "user_id", "round"])
+        .returning(*QuizSession.__table__.columns)  # type: ignore[attr-defined]
+    )
+    created = session.exec(statement).first()  # type: ignore[call-overload]
+    session.commit()
+    if created is not None:
+        return QuizSession.model_validate(created._mapping), True
+    quiz_session = session.exec(
+        select(QuizSession).where(
+            QuizSession.quiz_id == quiz_id,
+            QuizSession.user_id == user_id,
+            QuizSession.round == round,
+        )
+    ).one()
+    return quiz_session, False
+
+
+def create_group(*, session: Session, owner_id: uuid.UUID, group_in: GroupCreate) -> Group:
+    db_group = Group.model_validate(group_in, update={"owner_id": owner_id})
+    session.add(db_group)
+    session.commit()
+    session.refresh(db_group)
+    return db_group
+
+
+def get_group_member_ids(*, session: Session, group_id: uuid.UUID) -> list[uuid.UUID]:
+    statement = select(GroupMember.user_id).where(GroupMember.group_id == group_id)
+    return list(session.exec(statement).all())
+
+
+def is_group_member(*, session: Session, group_id: uuid.UUID, user_id: uuid.UUID) -> bool:
+    return session.get(GroupMember, (group_id, user_id)) is not None
+
+
+def get_group_public(*, session: Session, group: Group) -> GroupPublic:
+    member_ids = get_group_member_ids(session=session, group_id=group.id)
+    return GroupPublic.model_validate(group, update={"member_ids": member_ids})
+
+
+def add_group_members(*, session: Session, group: Group, user_ids: list[uuid.UUID]) -> Group:
+    """Add the existing users among `user_ids`; current members are skipped"""
+    statement = (
+        insert(GroupMember)
+        .from_select(
+            ["group_id", "user_id"],
+            select(literal(group.id), User.id).where(col(User.id).in_(user_ids)),
+        )
+        .on_conflict_do_nothing()
+    )
+    added = session.exec(statement).rowcount  # type: ignore[call-overload]
+    if added:
+        group.version += 1
+        session.add(group)
     session.commit()
-    session.refresh(quiz_session)
-    return quiz_session
+    session.refresh(group)
+    return group
+
+
+def remove_group_member(*, session: Session, group: Group, user_id: uuid.UUID) -> Group:
+    member = session.get(GroupMember, (group.id, user_id))
+    if member:
+        session.delete(member)
+        group.version += 1
+        session.add(group)
+        session.commit()
+        session.refresh(group)
+    return group
+
+
+SearchKind = Literal["quiz", "question", "answer"]
+
+SEARCH_HEADLINE_OPTIONS = "StartSel=<mark>, StopSel=</mark>, HighlightAll=true"
+
+# Enough for element content; & goes first so the other entities stay intact
+HTML_ESCAPES = (("&", "&amp;"), ("<", "&lt;"), (">", "&gt;"))
+
+
+def _html_escape(column: Any) -> Any:
+    for char, entity in HTML_ESCAPES:
+        column = func.replace(column, char, entity)
+    return column
+
+
+def _search_candidates(
+    kind: SearchKind,
+    source: FromClause,
+    id_column: ColumnElement[Any],
+    quiz_id_column: ColumnElement[Any],
+    text_column: ColumnElement[Any],
+    tsquery: ColumnElement[Any],
+    query: str,
+) -> list[Select[Any]]:
+    """
+    Full-text and trigram matches of one table.
+
+    Word matches rank above every fuzzy match. Each list keeps its best
+    SEARCH_CANDIDATE_LIMIT rows, so grouping and headlines stay bounded
+    however common the searched word is.
+    """
+    vector = literal_column(f'"{text_column.table.name}".search_vector', TSVECTOR)  # type: ignore[attr-defined]
+    columns = (
+        literal(kind).label("kind"),
+        id_column.label("id"),
+        quiz_id_column.label("quiz_id"),
+        text_column.label("text"),
+    )
+    word_rank = 1 + func.ts_rank(vector, tsquery)
+    words = (
+        select(*columns, word_rank.label("rank"))
+        .select_from(source)
+        .where(vector.op("@@")(tsquery))
+        .order_by(word_rank.desc(), id_column)
+        .limit(settings.SEARCH_CANDIDATE_LIMIT)
+    )
+    similarity = func.similarity(text_column, query)
+    fuzzy = (
+        select(*columns, similarity.label("rank"))
+        .select_from(source)
+        .where(text_column.op("%")(query))
+        .order_by(similarity.desc(), id_column)
+        .limit(settings.SEARCH_CANDIDATE_LIMIT)
+    )
+    return [words, fuzzy]  # type: ignore[list-item]
+
+
+def search(
+    *, session: Session, query: str, kind: SearchKind | None = None, skip: int = 0, limit: int = 20
+) -> list[SearchHit]:
+    """
+    Quiz names, questions and answers matching `query`, best first.
+
+    Only the best SEARCH_CANDIDATE_LIMIT hits are served, so pages past them
+    are empty rather than ranked from a partial sample.
+    """
+    limit = min(limit, settings.SEARCH_CANDIDATE_LIMIT - skip)
+    if limit <= 0:
+        return []
+    tsquery = func.websearch_to_tsquery("simple", query)
+    sources: dict[SearchKind, tuple[Any, ...]] = {
+        "quiz": (Quiz.__table__, Quiz.id, Quiz.id, Quiz.name),
+        "question": (Question.__table__, Question.id, Question.quiz_id, Question.text),
+        "answer": (
+            Answer.__table__.join(Question.__table__),  # type: ignore[attr-defined]
+            Answer.id,
+            Question.quiz_id,
+            Answer.text,
+        ),
+    }
+    candidates = [
+        candidate
+        for source_kind, source in sources.items()
+        if kind is None or kind == source_kind
+        for candidate in _search_candidates(source_kind, *source, tsquery, query)
+    ]
+    hits = union_all(*candidates).subquery("hits")
+    ranked = (
+        select(hits.c.kind, hits.c.id, hits.c.quiz_id, hits.c.text, func.max(hits.c.rank).label("rank"))
+        .group_by(hits.c.kind, hits.c.id, hits.c.quiz_id, hits.c.text)
+        .order_by(literal_column("rank").desc(), hits.c.id)
+        .offset(skip)
+        .limit(limit)
+        .subquery("ranked")
+    )
+    # Headlines are costly, so only the rows of the page get one. The text is
+    # escaped first, the parser leaves entities alone, so only the <mark>
+    # tags are markup.
+    statement = select(
+        ranked,
+        func.ts_headline("simple", _html_escape(ranked.c.text), tsquery, SEARCH_HEADLINE_OPTIONS).label(
+            "headline"
+        ),
+    ).order_by(ranked.c.rank.desc(), ranked.c.id)
+    return [SearchHit.model_construct(**row._mapping) for row in session.exec(statement).all()]  # type: ignore[call-overload]
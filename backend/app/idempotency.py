@@ -0,0 +1,99 @@
+"""
+Idempotency-Key handling for requests that clients retry.
+
+The first request carrying a key claims it with a single `SET NX GET`; once
+it completes, its response is stored under the key. A retry within
+IDEMPOTENCY_TTL_SECONDS gets that response back from the same round trip,
+without running the endpoint or any of its side effects again.
+"""
+
+import hashlib
+import json
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from fastapi import HTTPException, Response
+from fastapi.encoders import jsonable_encoder
+
+from app.core.config import settings
+from app.core.redis import redis_client
+from app.core.serialization import RawJSONResponse, dumps
+
+# How long a claimed key stays locked if its request never completes
+PENDING_TTL_SECONDS = 60
+
+
+def idempotency_key(scope: str, key: str) -> str:
+    return f"idempotency:{scope}:{key}"
+
+
+def fingerprint(payload: Any) -> str:
+    return hashlib.sha256(dumps(jsonable_encoder(payload)).encode()).hexdigest()
+
+
+async def run_idempotent(
+    key: str | None,
+    *,
+    scope: str,
+    payload: Any,
+    call: Callable[[], Awaitable[Any]],
+    status_code: int = 200,
+) -> Any:
+    """
+    Run `call` once per `key` and `scope`, answering retries from Redis.
+
+    `scope` should name the endpoint and the caller, so that keys of
+    different users never collide. Reusing a key with a different `payload`
+    is rejected, and a failed call releases the key so it can be retried.
+    """
+    if key is None:
+        return await call()
+
+    redis_key = idempotency_key(scope, key)
+    request_fingerprint = fingerprint(payload)
+    stored = await redis_client.set(
+        redis_key,
+        dumps({"fingerprint": request_fingerprint}),
+        nx=True,
+        get=True,
+        ex=PENDING_TTL_SECONDS,
+    )
+    if stored is not None:
+        return _replay(json.loads(stored), request_fingerprint)
+
+    try:
+        result = await call()
+    except BaseException:
+        await redis_client.delete(redis_key)
+        raise
+    body = dumps(jsonable_encoder(result))
+    await redis_client.set(
+        redis_key,
+        dumps(
+            {
+                "fingerprint": request_fingerprint,
+                "status_code": status_code,
+                "body": body,
+            }
+        ),
+        ex=settings.IDEMPOTENCY_TTL_SECONDS,
+    )
+    return RawJSONResponse(body, status_code=status_code)
+
+
+def _replay(record: dict[str, Any], request_fingerprint: str) -> Response:
+    if record["fingerprint"] != request_fingerprint:
+        raise HTTPException(
+            status_code=422,
+            detail="Idempotency-Key was already used for a different request",
+        )
+    if "body" not in record:
+        raise HTTPException(
+            status_code=409,
+            detail="A request with this Idempotency-Key is still in progress",
+        )
+    return RawJSONResponse(
+        record["body"],
+        status_code=record["status_code"],
+        headers={"Idempotent-Replayed": "true"},
+    )
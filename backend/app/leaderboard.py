@@ -0,0 +1,614 @@
+"""
+Redis keys of the per-quiz leaderboards.
+
+Besides the sorted set of best scores, every leaderboard has a modification
+sequence that is bumped after each change and serves as its ETag.
+
+Boards rank players by one number that packs the score above the seconds
+left until `2**TIME_BITS` seconds after `TIE_BREAK_EPOCH`: equal scores rank
+whoever reached them first higher, in Redis as in SQL, and ZADD GT keeps the
+time a best score was first reached. Values are decoded when read.
+
+Players are board members by their UUID, or with
+`LEADERBOARD_MEMBER_ENCODING=id` by a dense integer ID handed out from a
+counter, which takes a fraction of the memory on every board. Members are
+mapped back to UUIDs when read; `python -m app.migrate_leaderboards`
+converts existing boards after the setting changes.
+
+Scores are also kept per UTC day, in sets that expire once no week view can
+read them. The weekly board is the union of the days of the ISO week so far,
+built on demand and cached for `LEADERBOARD_WEEK_CACHE_SECONDS`; it carries
+the sequence it was built at, so its ETag always matches its content.
+
+The global leaderboard holds the sum of each player's best scores over all
+quizzes. It is kept up to date by adding every improvement of a best score
+in the same script that records it, and can be rebuilt from the quiz
+boards with `python -m app.rebuild_global_leaderboard`.
+
+A group's ranking on a quiz looks up the scores of its members only, so a
+class of 30 never reads the rest of the board. Member sets and rankings are
+keyed by the group's version, which membership changes bump, so neither
+needs invalidating.
+
+Each quiz also keeps a histogram of its best scores, a hash of player counts
+per bucket of `LEADERBOARD_HISTOGRAM_BUCKET_WIDTH` points, so distributions
+and percentiles never read the board itself.
+"""
+
+import datetime
+import time
+import uuid
+from collections.abc import Awaitable, Callable, Iterable
+from typing import Literal, NamedTuple
+
+from app.core.config import settings
+from app.core.redis import redis_client
+from app.models import achieved_now
+
+LEADERBOARD_STREAM = "quiz_leaderboard_events"
+# Daily boards outlive the longest week that reads them
+DAY_TTL_SECONDS = 8 * 24 * 60 * 60
+
+Window = Literal["all", "day", "week"]
+
+TIME_BITS = 32
+TIE_BREAK_EPOCH = 1_577_836_800  # 2020-01-01 UTC
+
+GLOBAL_LEADERBOARD = "global_leaderboard"
+GLOBAL_SEQ = "global_leaderboard:seq"
+
+# Integer member IDs of players, both ways, and the last one handed out
+MEMBER_IDS = "leaderboard_members:ids"
+MEMBER_UUIDS = "leaderboard_members:uuids"
+MEMBER_ID_SEQ = "leaderboard_members:seq"
+
+# The IDs of the players in ARGV, handing out new ones as needed
+_assign_member_ids = redis_client.register_script(
+    """
+    local ids = {}
+    for i = 1, #ARGV do
+        ids[i] = redis.call('HGET', KEYS[1], ARGV[i])
+        if not ids[i] then
+            ids[i] = tostring(redis.call('INCR', KEYS[3]))
+            redis.call('HSET', KEYS[1], ARGV[i], ids[i])
+            redis.call('HSET', KEYS[2], ids[i], ARGV[i])
+        end
+    end
+    return ids
+    """
+)
+
+# Keep the best score of each player of all time and of the day, adding
+# any improvement of the all-time best to the player's global score and
+# moving the player between the buckets of the score histogram. The
+# histogram is only kept from the board's first score on; a board that
+# predates it gets one built on first read. When either set changes, bump
+# the sequence and publish an event, trimming events older than the
+# retention window. Returns how many all-time bests changed.
+_record_scores = redis_client.register_script(
+    """
+    local width = tonumber(ARGV[6])
+    local shift = 2 ^ 32
+    local histogram = redis.call('EXISTS', KEYS[7]) == 1
+        or redis.call('EXISTS', KEYS[1]) == 0
+    local changed, day_changed = 0, 0
+    for i = 8, #ARGV, 2 do
+        local user, value = ARGV[i], tonumber(ARGV[i + 1])
+        local score = math.floor(value / shift)
+        local old = redis.call('ZSCORE', KEYS[1], user)
+        if not old or value > tonumber(old) then
+            local old_score = old and math.floor(tonumber(old) / shift) or 0
+            redis.call('ZADD', KEYS[1], ARGV[i + 1], user)
+            redis.call('ZINCRBY', KEYS[5], score - old_score, user)
+            if histogram then
+                if old then
+                    local bucket = math.floor(old_score / width) * width
+                    if redis.call('HINCRBY', KEYS[7], bucket, -1) <= 0 then
+                        redis.call('HDEL', KEYS[7], bucket)
+                    end
+                end
+                redis.call('HINCRBY', KEYS[7], math.floor(score / width) * width, 1)
+            end
+            changed = changed + 1
+        end
+        day_changed = day_changed + redis.call('ZADD', KEYS[4], 'GT', 'CH', ARGV[i + 1], user)
+    end
+    redis.call('EXPIRE', KEYS[4], ARGV[5])
+    if changed > 0 then
+        redis.call('SET', KEYS[6], ARGV[2], 'NX')
+        redis.call('INCR', KEYS[6])
+    end
+    if changed > 0 or day_changed > 0 or ARGV[3] == '1' then
+        redis.call('SET', KEYS[2], ARGV[2], 'NX')
+        redis.call('INCR', KEYS[2])
+    end
+    if changed > 0 or day_changed > 0 then
+        if #ARGV == 9 then
+            redis.call(
+                'XADD', KEYS[3], 'MINID', '~', ARGV[4], '*',
+                'quiz_id', ARGV[1], 'user_id', ARGV[7],
+                'score', math.floor(tonumber(ARGV[9]) / shift)
+            )
+        else
+            redis.call(
+                'XADD', KEYS[3], 'MINID', '~', ARGV[4], '*',
+                'quiz_id', ARGV[1], 'scores', (#ARGV - 7) / 2
+            )
+        end
+    end
+    return changed
+    """
+)
+
+# Count the board's scores per bucket into the histogram, unless it exists
+# or the board is empty, then return the histogram. Each bucket is one
+# ZCOUNT, so this takes O(buckets * log(players)) and cannot miss a score
+# recorded meanwhile.
+_read_histogram = redis_client.register_script(
+    """
+    if redis.call('EXISTS', KEYS[2]) == 0 and redis.call('EXISTS', KEYS[1]) == 1 then
+        local width = tonumber(ARGV[1])
+        local shift = 2 ^ 32
+        local low = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')[2]
+        local high = redis.call('ZRANGE', KEYS[1], -1, -1, 'WITHSCORES')[2]
+        local bucket = math.floor(math.floor(tonumber(low) / shift) / width) * width
+        while bucket <= math.floor(tonumber(high) / shift) do
+            local count = redis.call(
+                'ZCOUNT', KEYS[1],
+                string.format('%.0f', bucket * shift),
+                string.format('(%.0f', (bucket + width) * shift)
+            )
+            if count > 0 then
+                redis.call('HSET', KEYS[2], bucket, count)
+            end
+            bucket = bucket + width
+        end
+    end
+    return redis.call('HGETALL', KEYS[2])
+    """
+)
+
+# Groups up to this size look up each member's score; larger ones intersect
+# the board with the member set, which costs about the same per member but
+# needs no argument list
+GROUP_LOOKUP_MAX_MEMBERS = 256
+GROUP_MEMBERS_TTL_SECONDS = 60 * 60
+
+# Store the board scores of a group's members in KEYS[3] for ARGV[1] seconds
+_rank_group = redis_client.register_script(
+    """
+    redis.call('DEL', KEYS[3])
+    if redis.call('SCARD', KEYS[2]) <= tonumber(ARGV[2]) then
+        local members = redis.call('SMEMBERS', KEYS[2])
+        if #members > 0 then
+            local scores = redis.call('ZMSCORE', KEYS[1], unpack(members))
+            local entries = {}
+            for i = 1, #members do
+                if scores[i] then
+                    entries[#entries + 1] = scores[i]
+                    entries[#entries + 1] = members[i]
+                end
+            end
+            if #entries > 0 then
+                redis.call('ZADD', KEYS[3], unpack(entries))
+            end
+        end
+    else
+        redis.call('ZINTERSTORE', KEYS[3], 2, KEYS[1], KEYS[2], 'WEIGHTS', 1, 0)
+    end
+    redis.call('EXPIRE', KEYS[3], ARGV[1])
+    """
+)
+
+# Add the decoded scores of a slice of a quiz board to a global board
+_add_scores = redis_client.register_script(
+    """
+    local entries = redis.call('ZRANGE', KEYS[1], ARGV[1], ARGV[2], 'WITHSCORES')
+    for i = 1, #entries, 2 do
+        local score = math.floor(tonumber(entries[i + 1]) / 2 ^ 32)
+        redis.call('ZINCRBY', KEYS[2], score, entries[i])
+    end
+    return #entries / 2
+    """
+)
+
+
+def encode_score(score: int, achieved_at: datetime.datetime | None = None) -> int:
+    """The board value of a score first reached at `achieved_at`, now by default"""
+    elapsed = int((achieved_at or achieved_now()).timestamp()) - TIE_BREAK_EPOCH
+    return (score << TIME_BITS) + (1 << TIME_BITS) - 1 - elapsed
+
+
+def decode_score(value: float) -> int:
+    return int(value) >> TIME_BITS
+
+
+async def encode_members(
+    user_ids: Iterable[uuid.UUID | str], *, assign: bool = True
+) -> dict[str, str]:
+    """
+    The board members of players by their UUID. Without `assign`, players
+    who have no ID yet, and so are on no board, are left out.
+    """
+    user_ids = list(dict.fromkeys(str(user_id) for user_id in user_ids))
+    if settings.LEADERBOARD_MEMBER_ENCODING == "uuid":
+        return {user_id: user_id for user_id in user_ids}
+    if not user_ids:
+        return {}
+    if assign:
+        ids = await _assign_member_ids(
+            keys=[MEMBER_IDS, MEMBER_UUIDS, MEMBER_ID_SEQ], args=user_ids
+        )
+    else:
+        ids = await redis_client.hmget(MEMBER_IDS, user_ids)
+    return {
+        user_id: member
+        for user_id, member in zip(user_ids, ids, strict=True)
+        if member is not None
+    }
+
+
+async def _member_uuids(members: Iterable[str]) -> dict[str, str]:
+    if settings.LEADERBOARD_MEMBER_ENCODING == "uuid":
+        return {}
+    members = list(set(members))
+    if not members:
+        return {}
+    uuids = await redis_client.hmget(MEMBER_UUIDS, members)
+    # Members left by another encoding are shown as they are
+    return {
+        member: user_id
+        for member, user_id in zip(members, uuids, strict=True)
+        if user_id is not None
+    }
+
+
+async def decode_boards(
+    boards: list[list[tuple[str, float]]],
+) -> list[list[tuple[str, int]]]:
+    """Boards as read from Redis with UUIDs and scores, in one round trip"""
+    lookup = await _member_uuids(member for board in boards for member, _ in board)
+    return [
+        [(lookup.get(member, member), decode_score(value)) for member, value in board]
+        for board in boards
+    ]
+
+
+async def decode_board(board: list[tuple[str, float]]) -> list[tuple[str, int]]:
+    return (await decode_boards([board]))[0]
+
+
+def leaderboard_key(quiz_id: uuid.UUID | str) -> str:
+    return f"leaderboard:{quiz_id}"
+
+
+def seq_key(quiz_id: uuid.UUID | str) -> str:
+    return f"leaderboard:{quiz_id}:seq"
+
+
+def day_key(quiz_id: uuid.UUID | str, day: datetime.date) -> str:
+    return f"leaderboard:{quiz_id}:day:{day:%Y%m%d}"
+
+
+def week_key(quiz_id: uuid.UUID | str, day: datetime.date) -> str:
+    year, week, _ = day.isocalendar()
+    return f"leaderboard:{quiz_id}:week:{year}W{week:02d}"
+
+
+def histogram_key(quiz_id: uuid.UUID | str) -> str:
+    # The bucket width is part of the key, so changing it starts new histograms
+    width = settings.LEADERBOARD_HISTOGRAM_BUCKET_WIDTH
+    return f"leaderboard:{quiz_id}:histogram:{width}"
+
+
+def group_members_key(group_id: uuid.UUID | str, version: int) -> str:
+    return f"group:{group_id}:{version}:members"
+
+
+def group_board_key(
+    quiz_id: uuid.UUID | str, group_id: uuid.UUID | str, version: int
+) -> str:
+    return f"leaderboard:{quiz_id}:group:{group_id}:{version}"
+
+
+def today() -> datetime.date:
+    return datetime.datetime.now(datetime.timezone.utc).date()
+
+
+class WindowBoard(NamedTuple):
+    seq: int
+    # The day or week shown, empty for the all-time board
+    period: str
+    scores: list[tuple[str, int]]
+
+
+def stream_min_id() -> str:
+    """Oldest stream entry ID to keep; trimming is approximate, so cheap"""
+    retention_ms = settings.LEADERBOARD_STREAM_RETENTION_SECONDS * 1000
+    return f"{max(time.time_ns() // 1_000_000 - retention_ms, 0)}-0"
+
+
+async def get_seq(quiz_id: uuid.UUID | str) -> int:
+    """
+    Current modification sequence of a leaderboard.
+
+    A missing counter starts from the current time instead of zero, so an
+    ETag handed out before Redis lost the key can never match again.
+    """
+    async with redis_client.pipeline() as pipe:
+        pipe.set(seq_key(quiz_id), time.time_ns(), nx=True)
+        pipe.get(seq_key(quiz_id))
+        _, seq = await pipe.execute()
+    return int(seq)
+
+
+async def read_window(
+    quiz_id: uuid.UUID | str, window: Window = "all", count: int | None = None
+) -> WindowBoard:
+    """The top `count` scores of a window, all of them by default"""
+    stop = -1 if count is None else count - 1
+    day = today()
+    if window == "week":
+        return await _read_week(quiz_id, day, stop)
+    key, period = leaderboard_key(quiz_id), ""
+    if window == "day":
+        key, period = day_key(quiz_id, day), f"{day:%Y%m%d}"
+    async with redis_client.pipeline() as pipe:
+        pipe.set(seq_key(quiz_id), time.time_ns(), nx=True)
+        pipe.get(seq_key(quiz_id))
+        pipe.zrevrange(key, 0, stop, withscores=True)
+        _, seq, scores = await pipe.execute()
+    return WindowBoard(int(seq), period, await decode_board(scores))
+
+
+async def _read_week(
+    quiz_id: uuid.UUID | str, day: datetime.date, stop: int
+) -> WindowBoard:
+    key = week_key(quiz_id, day)
+    period = key.rsplit(":", 1)[1]
+    async with redis_client.pipeline() as pipe:
+        pipe.get(f"{key}:seq")
+        pipe.zrevrange(key, 0, stop, withscores=True)
+        seq, scores = await pipe.execute()
+    if seq is not None:
+        return WindowBoard(int(seq), period, await decode_board(scores))
+
+    # Read the sequence first: a score recorded meanwhile is then in the
+    # union under an older sequence, never missing under a newer one
+    seq = await get_seq(quiz_id)
+    monday = day - datetime.timedelta(days=day.weekday())
+    days = [monday + datetime.timedelta(days=i) for i in range(day.weekday() + 1)]
+    ttl = settings.LEADERBOARD_WEEK_CACHE_SECONDS
+    async with redis_client.pipeline() as pipe:
+        pipe.zunionstore(key, [day_key(quiz_id, d) for d in days], aggregate="MAX")
+        pipe.expire(key, ttl)
+        pipe.set(f"{key}:seq", seq, ex=ttl)
+        pipe.zrevrange(key, 0, stop, withscores=True)
+        *_, scores = await pipe.execute()
+    return WindowBoard(seq, period, await decode_board(scores))
+
+
+class ScoreHistogram(NamedTuple):
+    seq: int
+    # Players per bucket by the lowest score of the bucket, in score order
+    buckets: dict[int, int]
+
+
+async def read_histogram(quiz_id: uuid.UUID | str) -> ScoreHistogram:
+    """The distribution of a quiz's best scores, read in O(buckets)"""
+    seq = await get_seq(quiz_id)
+    flat = await _read_histogram(
+        keys=[leaderboard_key(quiz_id), histogram_key(quiz_id)],
+        args=[settings.LEADERBOARD_HISTOGRAM_BUCKET_WIDTH],
+    )
+    buckets = {int(flat[i]): int(flat[i + 1]) for i in range(0, len(flat), 2)}
+    return ScoreHistogram(seq, dict(sorted(buckets.items())))
+
+
+def players_below(buckets: dict[int, int], score: float) -> float:
+    """
+    How many players scored less than `score`, spreading the players of its
+    bucket evenly over the bucket; exact when buckets are one point wide.
+    """
+    width = settings.LEADERBOARD_HISTOGRAM_BUCKET_WIDTH
+    below = 0.0
+    for bucket, count in buckets.items():
+        if bucket + width <= score:
+            below += count
+        elif bucket <= score:
+            below += count * (score - bucket) / width
+    return below
+
+
+async def read_group(
+    quiz_id: uuid.UUID | str,
+    group_id: uuid.UUID | str,
+    version: int,
+    member_ids: Callable[[], Awaitable[list[uuid.UUID]]],
+    count: int | None = None,
+) -> WindowBoard:
+    """
+    The top `count` scores of a group's members on a quiz.
+
+    `member_ids` loads the members when their set is not in Redis yet. The
+    ranking is cached for `LEADERBOARD_GROUP_CACHE_SECONDS` with the
+    sequence it was built at, like the weekly board.
+    """
+    stop = -1 if count is None else count - 1
+    key = group_board_key(quiz_id, group_id, version)
+    async with redis_client.pipeline() as pipe:
+        pipe.get(f"{key}:seq")
+        pipe.zrevrange(key, 0, stop, withscores=True)
+        seq, scores = await pipe.execute()
+    if seq is not None:
+        return WindowBoard(int(seq), "", await decode_board(scores))
+
+    members = group_members_key(group_id, version)
+    if not await redis_client.exists(members):
+        # Members without an ID yet get one now, as the set outlives the
+        # first score they record
+        encoded = await encode_members(await member_ids())
+        if encoded:
+            async with redis_client.pipeline() as pipe:
+                pipe.sadd(members, *encoded.values())
+                pipe.expire(members, GROUP_MEMBERS_TTL_SECONDS)
+                await pipe.execute()
+
+    seq = await get_seq(quiz_id)
+    ttl = settings.LEADERBOARD_GROUP_CACHE_SECONDS
+    await _rank_group(
+        keys=[leaderboard_key(quiz_id), members, key],
+        args=[ttl, GROUP_LOOKUP_MAX_MEMBERS],
+    )
+    async with redis_client.pipeline() as pipe:
+        pipe.set(f"{key}:seq", seq, ex=ttl)
+        pipe.zrevrange(key, 0, stop, withscores=True)
+        _, scores = await pipe.execute()
+    return WindowBoard(seq, "", await decode_board(scores))
+
+
+async def bump_seq(quiz_id: uuid.UUID | str) -> None:
+    """Record a change; call it after the change is committed"""
+    async with redis_client.pipeline() as pipe:
+        pipe.set(seq_key(quiz_id), time.time_ns(), nx=True)
+        pipe.incr(seq_key(quiz_id))
+        await pipe.execute()
+
+
+def _record_args(
+    quiz_id: uuid.UUID | str,
+    scores: dict[uuid.UUID, int],
+    members: dict[str, str],
+    *,
+    always_bump: bool,
+    achieved_at: datetime.datetime | None,
+) -> dict[str, list]:
+    args: list = [
+        str(quiz_id),
+        time.time_ns(),
+        int(always_bump),
+        stream_min_id(),
+        DAY_TTL_SECONDS,
+        settings.LEADERBOARD_HISTOGRAM_BUCKET_WIDTH,
+        # The player of a single score, by UUID for the stream event
+        str(next(iter(scores))) if len(scores) == 1 else "",
+    ]
+    for user_id, score in scores.items():
+        args += [members[str(user_id)], encode_score(score, achieved_at)]
+    return {
+        "keys": [
+            leaderboard_key(quiz_id),
+            seq_key(quiz_id),
+            LEADERBOARD_STREAM,
+            day_key(quiz_id, today()),
+            GLOBAL_LEADERBOARD,
+            GLOBAL_SEQ,
+            histogram_key(quiz_id),
+        ],
+        "args": args,
+    }
+
+
+async def record_score(
+    quiz_id: uuid.UUID | str,
+    user_id: uuid.UUID | str,
+    score: int,
+    *,
+    always_bump: bool = False,
+    achieved_at: datetime.datetime | None = None,
+) -> bool:
+    """
+    Record a score in one round trip, returning whether it is a new best.
+
+    `always_bump` bumps the sequence even when the best score is unchanged,
+    for callers that changed the database leaderboard themselves; they pass
+    the `achieved_at` they stored so both rank ties alike.
+    """
+    members = await encode_members([user_id])
+    changed = await _record_scores(
+        **_record_args(
+            quiz_id,
+            {user_id: score},
+            members,
+            always_bump=always_bump,
+            achieved_at=achieved_at,
+        )
+    )
+    return bool(changed)
+
+
+async def record_scores(
+    best: dict[uuid.UUID, dict[uuid.UUID, int]],
+    achieved_at: datetime.datetime | None = None,
+) -> None:
+    """
+    Record the best score of each player of a batch in one pipeline.
+
+    Every affected quiz gets one sequence bump and at most one stream event,
+    however many of its scores the batch changed.
+    """
+    members = await encode_members(
+        user_id for scores in best.values() for user_id in scores
+    )
+    async with redis_client.pipeline() as pipe:
+        for quiz_id, scores in best.items():
+            await _record_scores(
+                **_record_args(
+                    quiz_id,
+                    scores,
+                    members,
+                    always_bump=True,
+                    achieved_at=achieved_at,
+                ),
+                client=pipe,
+            )
+        await pipe.execute()
+
+
+async def read_global(
+    skip: int = 0, limit: int = 100
+) -> tuple[int, list[tuple[str, int]]]:
+    """The sequence of the global leaderboard and a page of its scores"""
+    async with redis_client.pipeline() as pipe:
+        pipe.set(GLOBAL_SEQ, time.time_ns(), nx=True)
+        pipe.get(GLOBAL_SEQ)
+        pipe.zrevrange(GLOBAL_LEADERBOARD, skip, skip + limit - 1, withscores=True)
+        _, seq, scores = await pipe.execute()
+    lookup = await _member_uuids(member for member, _ in scores)
+    return int(seq), [
+        (lookup.get(member, member), int(score)) for member, score in scores
+    ]
+
+
+async def rebuild_global(batch: int = 500) -> int:
+    """
+    Rebuild the global leaderboard from the per-quiz ones.
+
+    The decoded scores of the quiz boards are summed into a scratch key,
+    `batch` players at a time, which then replaces the global board in one
+    step. Scores recorded while the rebuild runs may be counted twice or not
+    at all, so run it when the boards are quiet. Returns how many players
+    the board holds.
+    """
+    scratch = f"{GLOBAL_LEADERBOARD}:rebuild"
+    await redis_client.delete(scratch)
+    async for key in redis_client.scan_iter("leaderboard:*", count=batch):
+        # Skip the sequences, daily and weekly keys of each quiz
+        if key.count(":") != 1:
+            continue
+        start = 0
+        while (
+            await _add_scores(keys=[key, scratch], args=[start, start + batch - 1])
+            == batch
+        ):
+            start += batch
+    async with redis_client.pipeline() as pipe:
+        if await redis_client.exists(scratch):
+            pipe.rename(scratch, GLOBAL_LEADERBOARD)
+        else:
+            pipe.delete(GLOBAL_LEADERBOARD)
+        pipe.set(GLOBAL_SEQ, time.time_ns(), nx=True)
+        pipe.incr(GLOBAL_SEQ)
+        pipe.zcard(GLOBAL_LEADERBOARD)
+        *_, count = await pipe.execute()
+    return count
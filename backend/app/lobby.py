@@ -0,0 +1,29 @@
+"""
+Admission control for quiz lobbies.
+
+When thousands of players join a quiz in the same second, only
+LOBBY_ADMISSIONS_PER_SECOND of them are let in per second; the others are
+told to retry, which spreads the join storm over the following seconds.
+"""
+
+import time
+import uuid
+
+from app.core.config import settings
+from app.core.redis import redis_client
+
+
+def lobby_key(quiz_id: uuid.UUID, second: int) -> str:
+    return f"lobby:{quiz_id}:{second}"
+
+
+async def admit(quiz_id: uuid.UUID) -> bool:
+    """Whether a player may join `quiz_id` in the current second"""
+    if settings.LOBBY_ADMISSIONS_PER_SECOND <= 0:
+        return True
+    key = lobby_key(quiz_id, int(time.time()))
+    async with redis_client.pipeline() as pipe:
+        pipe.incr(key)
+        pipe.expire(key, 2)
+        admitted, _ = await pipe.execute()
+    return admitted <= settings.LOBBY_ADMISSIONS_PER_SECOND
@@ -1,10 +1,15 @@
 import sentry_sdk
 from fastapi import FastAPI
 from fastapi.routing import APIRoute
+from fastapi_socketio import SocketManager
 from starlette.middleware.cors import CORSMiddleware
 
+from app import realtime
 from app.api.main import api_router
+from app.api.profiling import ProfilerMiddleware
+from app.core.compression import CompressionMiddleware
 from app.core.config import settings
+from app.core.serialization import default_response_class
 
 
 def custom_generate_unique_id(route: APIRoute) -> str:
@@ -18,6 +23,7 @@ app = FastAPI(
     title=settings.PROJECT_NAME,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     generate_unique_id_function=custom_generate_unique_id,
+    default_response_class=default_response_class,
 )
 
 # Set all CORS enabled origins
@@ -31,4 +37,20 @@ if settings.all_cors_origins:
         expose_headers=["*"],
     )
 
+app.add_middleware(CompressionMiddleware)
+
+if settings.PROFILING_ENABLED:
+    app.add_middleware(ProfilerMiddleware)
+
 app.include_router(api_router, prefix=settings.API_V1_STR)
+
+# Socket.IO at /ws/socket.io, with rooms shared by all replicas through Redis.
+# Mounted apps see the full request path, hence the prefix in socketio_path.
+socket_manager = SocketManager(
+    app,
+    mount_location="/ws",
+    socketio_path="ws/socket.io",
+    cors_allowed_origins=settings.all_cors_origins,
+    client_manager=realtime.client_manager(),
+)
+app.sio.register_namespace(realtime.namespace)
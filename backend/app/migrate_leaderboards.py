@@ -0,0 +1,151 @@
+"""
+Migrate the leaderboards in Redis to the current encoding.
+
+Board values used to be plain scores; they now pack the score with the time
+it was reached. Plain scores are re-encoded as reached at migration time,
+like the database backfills them. Players are renamed to the members of
+`LEADERBOARD_MEMBER_ENCODING`, UUIDs or integer IDs. The caches and
+histograms built from the boards are dropped and the global leaderboard is
+rebuilt:
+
+    python -m app.migrate_leaderboards
+
+Run it right after deploying. It only touches values that still need it, so
+it is safe to run again.
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+
+from app.core.config import settings
+from app.core.redis import redis_client
+from app.leaderboard import (
+    MEMBER_UUIDS,
+    TIME_BITS,
+    bump_seq,
+    encode_members,
+    encode_score,
+    rebuild_global,
+)
+from app.models import achieved_now
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Encoded scores of zero or more stay above this until 2088, plain scores
+# below it
+PLAIN_SCORE_LIMIT = 2**31
+
+# Re-encode up to ARGV[2] plain scores of a board with the time part ARGV[3]
+_encode_plain_scores = redis_client.register_script(
+    """
+    local plain = redis.call(
+        'ZRANGEBYSCORE', KEYS[1], '-inf', '(' .. ARGV[1],
+        'WITHSCORES', 'LIMIT', 0, ARGV[2]
+    )
+    for i = 1, #plain, 2 do
+        local value = tonumber(plain[i + 1]) * 2 ^ tonumber(ARGV[4]) + tonumber(ARGV[3])
+        redis.call('ZADD', KEYS[1], string.format('%.0f', value), plain[i])
+    end
+    return #plain / 2
+    """
+)
+
+
+# Rename the members of a board, ARGV holding old and new names in turn. A
+# player under both names keeps the better score.
+_rename_members = redis_client.register_script(
+    """
+    for i = 1, #ARGV, 2 do
+        local value = redis.call('ZSCORE', KEYS[1], ARGV[i])
+        if value then
+            redis.call('ZREM', KEYS[1], ARGV[i])
+            redis.call('ZADD', KEYS[1], 'GT', value, ARGV[i + 1])
+        end
+    end
+    return #ARGV / 2
+    """
+)
+
+
+def _needs_rename(member: str) -> bool:
+    if settings.LEADERBOARD_MEMBER_ENCODING == "id":
+        return not member.isdigit()
+    return member.isdigit()
+
+
+async def _renames(members: list[str]) -> dict[str, str]:
+    if settings.LEADERBOARD_MEMBER_ENCODING == "id":
+        return await encode_members(members)
+    uuids = await redis_client.hmget(MEMBER_UUIDS, members)
+    return {
+        member: user_id
+        for member, user_id in zip(members, uuids, strict=True)
+        if user_id is not None
+    }
+
+
+async def _rename_board(key: str, batch: int) -> int:
+    count = 0
+    cursor = None
+    while cursor != 0:
+        cursor, page = await redis_client.zscan(key, cursor or 0, count=batch)
+        members = [member for member, _ in page if _needs_rename(member)]
+        if members and (renames := await _renames(members)):
+            args = [name for pair in renames.items() for name in pair]
+            count += await _rename_members(keys=[key], args=args)
+    return count
+
+
+async def _encode_board(key: str, batch: int) -> int:
+    time_part = encode_score(0, achieved_now())
+    count = 0
+    while added := await _encode_plain_scores(
+        keys=[key], args=[PLAIN_SCORE_LIMIT, batch, time_part, TIME_BITS]
+    ):
+        count += added
+    return count
+
+
+async def migrate(batch: int) -> None:
+    boards = scores = renamed = dropped = 0
+    async for key in redis_client.scan_iter("leaderboard:*", count=batch):
+        parts = key.split(":")
+        if len(parts) == 2 or (len(parts) == 4 and parts[2] == "day"):
+            encoded = await _encode_board(key, batch)
+            members = await _rename_board(key, batch)
+            if encoded or members:
+                boards += 1
+                scores += encoded
+                renamed += members
+                await bump_seq(parts[1])
+        elif parts[2] in ("week", "group", "histogram"):
+            dropped += await redis_client.delete(key)
+    # Group members are cached under the encoding they were read with
+    async for key in redis_client.scan_iter("group:*:members", count=batch):
+        dropped += await redis_client.delete(key)
+    logger.info(
+        f"Re-encoded {scores} scores and renamed {renamed} players on {boards} boards"
+    )
+    logger.info(f"Dropped {dropped} cached boards, histograms and groups")
+    players = await rebuild_global(batch)
+    logger.info(f"Rebuilt the global leaderboard with {players} players")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--batch", type=int, default=1000, help="keys or scores per step"
+    )
+    args = parser.parse_args()
+
+    logger.info("Migrating leaderboards")
+    started = time.perf_counter()
+    asyncio.run(migrate(args.batch))
+    logger.info(f"Leaderboards migrated in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,9 @@
 import uuid
+from datetime import datetime, timezone
+from typing import Literal
 
-from pydantic import EmailStr
+from pydantic import EmailStr, model_validator
+from sqlalchemy import DateTime, Index, UniqueConstraint
 from sqlmodel import Field, Relationship, SQLModel
 
 
@@ -49,12 +52,14 @@ class User(UserBase, table=True):
 class Quiz(SQLModel, table=True):
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     name: str = Field(max_length=255)
+    # Bumped on every change to the quiz, its questions or answers
+    version: int = Field(default=1)
     questions: list["Question"] = Relationship(back_populates="quiz", cascade_delete=True)
 
 
 class Question(SQLModel, table=True):
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
-    quiz_id: uuid.UUID = Field(foreign_key="quiz.id")
+    quiz_id: uuid.UUID = Field(foreign_key="quiz.id", index=True)
     text: str = Field(max_length=255)
     answers: list["Answer"] = Relationship(back_populates="question", cascade_delete=True)
     quiz: Quiz = Relationship(back_populates="questions")
@@ -68,11 +73,72 @@ class Answer(SQLModel, table=True):
     question: Question = Relationship(back_populates="answers")
 
 
+# Leaderboards pack the score and the time it was reached into one number,
+# which stays exact for scores up to this
+MAX_SCORE = 2**20 - 1
+
+
+def achieved_now() -> datetime:
+    """The current time in whole seconds, the precision ties are broken at"""
+    return datetime.now(timezone.utc).replace(microsecond=0)
+
+
 class QuizSession(SQLModel, table=True):
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     quiz_id: uuid.UUID = Field(foreign_key="quiz.id")
     user_id: uuid.UUID = Field(foreign_key="user.id")
+    # A player has one session per round of a quiz
+    round: int = Field(default=1)
     score: int = Field(default=0)
+    # When the score was first reached; equal scores rank the earliest first
+    achieved_at: datetime = Field(
+        default_factory=achieved_now, sa_type=DateTime(timezone=True)
+    )
+
+    __table_args__ = (
+        UniqueConstraint(
+            "quiz_id", "user_id", "round", name="uq_quizsession_quiz_id_user_id_round"
+        ),
+    )
+
+
+class GroupBase(SQLModel):
+    name: str = Field(min_length=1, max_length=255)
+
+
+class GroupCreate(GroupBase):
+    pass
+
+
+# A class or circle of friends, ranked together on quiz leaderboards
+class Group(GroupBase, table=True):
+    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    owner_id: uuid.UUID = Field(
+        foreign_key="user.id", nullable=False, ondelete="CASCADE", index=True
+    )
+    # Bumped on every membership change, it keys the cached group rankings
+    version: int = Field(default=1)
+    members: list["GroupMember"] = Relationship(cascade_delete=True)
+
+
+class GroupMember(SQLModel, table=True):
+    group_id: uuid.UUID = Field(
+        foreign_key="group.id", primary_key=True, ondelete="CASCADE"
+    )
+    user_id: uuid.UUID = Field(
+        foreign_key="user.id", primary_key=True, ondelete="CASCADE", index=True
+    )
+
+
+class GroupMembersUpdate(SQLModel):
+    user_ids: list[uuid.UUID] = Field(min_length=1, max_length=1000)
+
+
+class GroupPublic(GroupBase):
+    id: uuid.UUID
+    owner_id: uuid.UUID
+    version: int
+    member_ids: list[uuid.UUID]
 
 
 class Leaderboard(SQLModel):
@@ -81,13 +147,48 @@ class Leaderboard(SQLModel):
     score: int
 
 
+class ScoreBatchEntry(SQLModel):
+    """One offline result: a score, or the answers picked to compute it"""
+
+    quiz_id: uuid.UUID
+    session_id: uuid.UUID
+    score: int | None = Field(default=None, ge=0, le=MAX_SCORE)
+    answers: list[uuid.UUID] | None = None
+
+    @model_validator(mode="after")
+    def check_score_or_answers(self) -> "ScoreBatchEntry":
+        if (self.score is None) == (self.answers is None):
+            raise ValueError("Provide either a score or answers")
+        return self
+
+
+class ScoreBatch(SQLModel):
+    entries: list[ScoreBatchEntry] = Field(min_length=1, max_length=500)
+
+
+class ScoreBatchResult(SQLModel):
+    session_id: uuid.UUID
+    status: Literal["updated", "not_found", "invalid"]
+    quiz_id: uuid.UUID | None = None
+    user_id: uuid.UUID | None = None
+    score: int | None = None
+    achieved_at: datetime | None = None
+    detail: str | None = None
+
+
+class ScoreBatchResults(SQLModel):
+    results: list[ScoreBatchResult]
+
+
 class UserPublic(UserBase):
     id: uuid.UUID
 
 
 class UsersPublic(SQLModel):
     data: list[UserPublic]
-    count: int
+    # Only set on the first page, and may be an estimate for large tables
+    count: int | None = None
+    next_cursor: str | None = None
 
 
 # Shared properties
@@ -115,6 +216,9 @@ class Item(ItemBase, table=True):
     )
     owner: User | None = Relationship(back_populates="items")
 
+    # Keyset pagination of a user's items
+    __table_args__ = (Index("ix_item_owner_id_id", "owner_id", "id"),)
+
 
 # Properties to return via API, id is always required
 class ItemPublic(ItemBase):
@@ -124,7 +228,9 @@ class ItemPublic(ItemBase):
 
 class ItemsPublic(SQLModel):
     data: list[ItemPublic]
-    count: int
+    # Only set on the first page, and may be an estimate for large tables
+    count: int | None = None
+    next_cursor: str | None = None
 
 
 class AnswerPublic(SQLModel):
@@ -144,12 +250,42 @@ class QuestionPublic(SQLModel):
 class QuizPublic(SQLModel):
     id: uuid.UUID
     name: str
+    version: int
     questions: list[QuestionPublic]
 
 
 class QuizzesPublic(SQLModel):
     data: list[QuizPublic] = []
-    count: int = 0
+    count: int | None = None
+    next_cursor: str | None = None
+
+
+class QuizSummary(SQLModel):
+    id: uuid.UUID
+    name: str
+    version: int
+    question_count: int
+
+
+class QuizSummariesPublic(SQLModel):
+    data: list[QuizSummary]
+    count: int | None = None
+    next_cursor: str | None = None
+
+
+class SearchHit(SQLModel):
+    kind: str
+    id: uuid.UUID
+    quiz_id: uuid.UUID
+    text: str
+    # The HTML escaped text with matched words wrapped in <mark> tags
+    headline: str
+    rank: float
+
+
+class SearchResults(SQLModel):
+    data: list[SearchHit]
+    has_more: bool
 
 
 # Generic message
@@ -0,0 +1,111 @@
+"""
+Serialized quiz bodies cached in Redis, precompressed once per version.
+
+Each quiz has one hash holding its current `version` and the JSON body in
+every encoding. Writers record a newer version, which drops the old bodies;
+readers only store bodies for the version they loaded, and never over a
+newer one, so a slow reader cannot bring back a stale quiz. A deleted quiz
+keeps a tombstone version above any real one until the cache would have
+expired, so a reader that loaded it before the delete cannot store it again.
+"""
+
+import uuid
+
+from app.core.compression import Encoding, available_encodings, compress
+from app.core.config import settings
+from app.core.redis import binary_redis_client
+
+# The version of deleted quizzes; exact in Lua's doubles
+DELETED_VERSION = 2**53
+
+_bump = binary_redis_client.register_script(
+    """
+    local current = tonumber(redis.call('HGET', KEYS[1], 'version'))
+    if current and current >= tonumber(ARGV[1]) then
+        return 0
+    end
+    redis.call('DEL', KEYS[1])
+    redis.call('HSET', KEYS[1], 'version', ARGV[1])
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+    return 1
+    """
+)
+
+_store = binary_redis_client.register_script(
+    """
+    local current = tonumber(redis.call('HGET', KEYS[1], 'version'))
+    local version = tonumber(ARGV[1])
+    if current and current > version then
+        return 0
+    end
+    if current ~= version then
+        redis.call('DEL', KEYS[1])
+    end
+    redis.call('HSET', KEYS[1], 'version', ARGV[1], unpack(ARGV, 3))
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+    return 1
+    """
+)
+
+
+def quiz_key(quiz_id: uuid.UUID) -> str:
+    return f"quiz:{quiz_id}"
+
+
+def encode(body: bytes) -> dict[Encoding, bytes]:
+    """All encodings of a JSON body; CPU bound, run it off the event loop"""
+    bodies: dict[Encoding, bytes] = {"identity": body}
+    if len(body) >= settings.COMPRESSION_MIN_SIZE:
+        for encoding in available_encodings():
+            bodies[encoding] = compress(body, encoding, cached=True)
+    return bodies
+
+
+async def get(
+    quiz_id: uuid.UUID, encoding: Encoding
+) -> tuple[int | None, Encoding, bytes | None]:
+    """
+    Current version of a quiz and its cached body.
+
+    Falls back to the identity body when the requested encoding is not
+    stored, which is the case for bodies too small to compress.
+    """
+    version, body, identity = await binary_redis_client.hmget(
+        quiz_key(quiz_id), ["version", encoding, "identity"]
+    )
+    if body is None:
+        encoding, body = "identity", identity
+    return (int(version) if version is not None else None), encoding, body
+
+
+def deleted(version: int | None) -> bool:
+    return version == DELETED_VERSION
+
+
+async def version(quiz_id: uuid.UUID) -> int | None:
+    version = await binary_redis_client.hget(quiz_key(quiz_id), "version")
+    if version is None or deleted(int(version)):
+        return None
+    return int(version)
+
+
+async def store(
+    quiz_id: uuid.UUID, version: int, bodies: dict[Encoding, bytes]
+) -> None:
+    fields = [value for item in bodies.items() for value in item]
+    await _store(
+        keys=[quiz_key(quiz_id)],
+        args=[version, settings.QUIZ_CACHE_TTL_SECONDS, *fields],
+    )
+
+
+async def bump(quiz_id: uuid.UUID, version: int) -> None:
+    """Record that a quiz changed, dropping bodies of older versions"""
+    await _bump(
+        keys=[quiz_key(quiz_id)], args=[version, settings.QUIZ_CACHE_TTL_SECONDS]
+    )
+
+
+async def drop(quiz_id: uuid.UUID) -> None:
+    """Record that a quiz was deleted"""
+    await bump(quiz_id, DELETED_VERSION)
@@ -0,0 +1,163 @@
+"""
+Socket.IO channel for live quiz play.
+
+Clients connect with their access token, join one room per quiz and then
+submit answers and receive leaderboard and round updates over the same
+connection. Rooms are shared by all replicas through the Redis client
+manager: an event emitted to a room on one replica reaches its members on
+every other replica.
+
+Leaderboard updates are the exception. Every replica already reads the
+leaderboard stream, so each one emits the boards to its own members only;
+going through Redis as well would deliver every board once per replica.
+"""
+
+import uuid
+from typing import Any
+
+import socketio
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, ValidationError
+from sqlmodel import Session
+
+from app import crud
+from app.api.deps import get_current_user
+from app.broadcast import LEADERBOARD_TOP_N, Board, broadcaster, ranked
+from app.core.config import settings
+from app.core.db import engine
+from app.core.redis import redis_client
+from app.leaderboard import decode_board, leaderboard_key, record_scores
+from app.models import ScoreBatchEntry, ScoreBatchResult, User
+
+
+class RoomRequest(BaseModel):
+    quiz_id: uuid.UUID
+
+
+def room_name(quiz_id: uuid.UUID | str) -> str:
+    return f"quiz:{quiz_id}"
+
+
+def client_manager() -> socketio.AsyncRedisManager:
+    return socketio.AsyncRedisManager(
+        settings.REDIS_URL,
+        channel="quiz-rooms",
+        redis_options={"db": settings.REDIS_DB},
+    )
+
+
+def _authenticate(token: str) -> uuid.UUID:
+    with Session(engine) as session:
+        return get_current_user(session, token).id
+
+
+def _submit(user_id: uuid.UUID, entry: ScoreBatchEntry) -> ScoreBatchResult | None:
+    """The result of one answer, or None once the user is gone or inactive"""
+    with Session(engine) as session:
+        user = session.get(User, user_id)
+        if user is None or not user.is_active:
+            return None
+        return crud.apply_score_batch(session=session, user=user, entries=[entry])[0]
+
+
+class QuizNamespace(socketio.AsyncNamespace):
+    """
+    Client events: `join` and `leave` a quiz room, `answer` with a score or
+    the picked answers of a session. Each returns its result as the ack.
+
+    Server events: `leaderboard` with the top-N of a quiz, and `round` when
+    a player joins or answers in a quiz room.
+    """
+
+    async def on_connect(
+        self, sid: str, environ: dict[str, Any], auth: dict[str, Any] | None
+    ) -> None:
+        token = (auth or {}).get("token")
+        if not isinstance(token, str):
+            raise socketio.exceptions.ConnectionRefusedError("Not authenticated")
+        try:
+            user_id = await run_in_threadpool(_authenticate, token)
+        except HTTPException as e:
+            raise socketio.exceptions.ConnectionRefusedError(e.detail)
+        await self.save_session(sid, {"user_id": user_id})
+
+    async def on_join(self, sid: str, data: Any) -> dict[str, Any]:
+        try:
+            request = RoomRequest.model_validate(data)
+        except ValidationError as e:
+            return {"error": e.errors(include_url=False, include_context=False)}
+        session = await self.get_session(sid)
+        await self.enter_room(sid, room_name(request.quiz_id))
+        await self.emit(
+            "round",
+            {
+                "quiz_id": str(request.quiz_id),
+                "user_id": str(session["user_id"]),
+                "event": "joined",
+            },
+            room=room_name(request.quiz_id),
+            skip_sid=sid,
+        )
+        board = await redis_client.zrevrange(
+            leaderboard_key(request.quiz_id), 0, LEADERBOARD_TOP_N - 1, withscores=True
+        )
+        return {
+            "quiz_id": str(request.quiz_id),
+            "leaderboard": ranked(await decode_board(board)),
+        }
+
+    async def on_leave(self, sid: str, data: Any) -> dict[str, Any]:
+        try:
+            request = RoomRequest.model_validate(data)
+        except ValidationError as e:
+            return {"error": e.errors(include_url=False, include_context=False)}
+        await self.leave_room(sid, room_name(request.quiz_id))
+        return {"quiz_id": str(request.quiz_id)}
+
+    async def on_answer(self, sid: str, data: Any) -> dict[str, Any]:
+        try:
+            entry = ScoreBatchEntry.model_validate(data)
+        except ValidationError as e:
+            return {"error": e.errors(include_url=False, include_context=False)}
+        session = await self.get_session(sid)
+        result = await run_in_threadpool(_submit, session["user_id"], entry)
+        if result is None:
+            return {"error": "User not found or inactive"}
+        if result.status == "updated":
+            await record_scores(
+                {result.quiz_id: {result.user_id: result.score}}, result.achieved_at
+            )
+            await self.emit(
+                "round",
+                {
+                    "quiz_id": str(result.quiz_id),
+                    "user_id": str(result.user_id),
+                    "event": "answered",
+                    "score": result.score,
+                },
+                room=room_name(result.quiz_id),
+            )
+        return result.model_dump(mode="json")
+
+    def has_members(self, room: str) -> bool:
+        """Whether any client of this replica is in `room`"""
+        return bool(self.server.manager.rooms.get(self.namespace, {}).get(room))
+
+    async def send_leaderboard(self, quiz_id: str, board: Board) -> None:
+        room = room_name(quiz_id)
+        if not self.has_members(room):
+            return
+        try:
+            await self.emit(
+                "leaderboard",
+                {"quiz_id": quiz_id, "leaderboard": ranked(board)},
+                room=room,
+                ignore_queue=True,
+            )
+        except Exception as e:
+            print(f"Error sending leaderboard to {room}: {e}")
+
+
+namespace = QuizNamespace("/")
+broadcaster.add_listener(namespace.send_leaderboard)
@@ -0,0 +1,40 @@
+"""
+Rebuild the global leaderboard from the per-quiz leaderboards.
+
+Scores keep the global board up to date as they are recorded; this repairs
+it after it drifted, for example when per-quiz boards were written or
+restored by other means:
+
+    python -m app.rebuild_global_leaderboard
+
+Scores recorded while it runs may be miscounted, so run it when the
+boards are quiet.
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+
+from app.leaderboard import rebuild_global
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--batch", type=int, default=500, help="quizzes per union")
+    args = parser.parse_args()
+
+    logger.info("Rebuilding the global leaderboard")
+    started = time.perf_counter()
+    count = asyncio.run(rebuild_global(args.batch))
+    logger.info(
+        f"Global leaderboard rebuilt with {count} players "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
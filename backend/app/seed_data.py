@@ -0,0 +1,247 @@
+"""
+Seed a production-sized synthetic dataset for benchmarking.
+
+Users, quizzes, questions, answers and quiz sessions are streamed into
+Postgres with COPY, and the best score of every player is written to the
+leaderboard ZSETs with pipelined ZADD, after which the global leaderboard
+is rebuilt from them, so both stores agree afterwards:
+
+    python -m app.seed_data --users 100000 --quizzes 1000 --sessions 1000000
+
+Run it against a dedicated database, the rows are not cleaned up. Every run
+gets fresh IDs and e-mails, so runs can be repeated on the same database;
+`--seed` only makes the words, scores and sessions repeatable.
+"""
+
+import argparse
+import asyncio
+import logging
+import math
+import random
+import time
+import uuid
+from collections import defaultdict
+from collections.abc import Iterator
+from datetime import datetime, timezone
+
+from app.core.db import engine
+from app.core.redis import redis_client
+from app.core.security import get_password_hash
+from app.leaderboard import encode_members, encode_score, rebuild_global
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SEED_DOMAIN = "seed.example.com"
+SEED_PASSWORD = "seed-password"
+WORDS = (
+    "abandon ability absorb abstract abundant accurate achieve acquire adapt "
+    "adequate adjacent advocate aesthetic affluent allocate ambiguous amend "
+    "analogy anticipate apparent arbitrary assert assess attain authentic "
+    "benevolent brevity candid coherent collapse compel concise contemplate "
+    "crucial deficit diligent discreet dominant elaborate eloquent empirical "
+    "endure evaluate evident explicit fluent frugal generate hypothesis "
+    "implicit inevitable infer integral intricate lucid meticulous novel "
+    "obsolete paradox plausible pragmatic prevalent profound prudent "
+    "reluctant resilient rigorous scrutiny subtle tangible tedious versatile"
+).split()
+
+
+def _copy(table: str, columns: tuple[str, ...], rows: Iterator[str], batch: int) -> int:
+    """Stream tab separated `rows` into `table` with COPY, `batch` rows per write"""
+    count = 0
+    raw = engine.raw_connection()
+    try:
+        with raw.cursor() as cursor:
+            with cursor.copy(  # type: ignore[attr-defined]
+                f'COPY "{table}" ({", ".join(columns)}) FROM STDIN'
+            ) as copy:
+                chunk: list[str] = []
+                for row in rows:
+                    chunk.append(row)
+                    if len(chunk) == batch:
+                        copy.write("".join(chunk))
+                        count += len(chunk)
+                        chunk.clear()
+                if chunk:
+                    copy.write("".join(chunk))
+                    count += len(chunk)
+        raw.commit()
+    finally:
+        raw.close()
+    return count
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choices(WORDS, k=words))
+
+
+def seed(
+    *,
+    users: int,
+    quizzes: int,
+    questions: int,
+    answers: int,
+    sessions: int,
+    batch: int,
+    random_seed: int | None,
+    skip_redis: bool,
+) -> None:
+    rng = random.Random(random_seed)
+    # IDs and e-mails are unique whatever the seed, so a repeated run does not
+    # collide with the rows of an earlier one
+    run = uuid.uuid4().hex[:8]
+
+    started = time.perf_counter()
+    hashed_password = get_password_hash(SEED_PASSWORD)
+    user_ids = [uuid.uuid4() for _ in range(users)]
+    count = _copy(
+        "user",
+        ("id", "email", "hashed_password", "is_active", "is_superuser", "full_name"),
+        (
+            f"{user_id}\t{run}-{i}@{SEED_DOMAIN}\t{hashed_password}\tt\tf\tPlayer {i}\n"
+            for i, user_id in enumerate(user_ids)
+        ),
+        batch,
+    )
+    logger.info(f"Copied {count} users in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    quiz_ids = [uuid.uuid4() for _ in range(quizzes)]
+    _copy(
+        "quiz",
+        ("id", "name"),
+        (
+            f"{quiz_id}\tDeck {i}: {_sentence(rng, 3)}\n"
+            for i, quiz_id in enumerate(quiz_ids)
+        ),
+        batch,
+    )
+    question_ids = [
+        (quiz_id, uuid.uuid4()) for quiz_id in quiz_ids for _ in range(questions)
+    ]
+    _copy(
+        "question",
+        ("id", "quiz_id", "text"),
+        (
+            f"{question_id}\t{quiz_id}\tWhat does '{rng.choice(WORDS)}' mean?\n"
+            for quiz_id, question_id in question_ids
+        ),
+        batch,
+    )
+    count = _copy(
+        "answer",
+        ("id", "question_id", "text", "is_correct"),
+        (
+            f"{uuid.uuid4()}\t{question_id}\t{_sentence(rng, 4)}\t{'t' if a == 0 else 'f'}\n"
+            for _, question_id in question_ids
+            for a in range(answers)
+        ),
+        batch,
+    )
+    logger.info(
+        f"Copied {quizzes} quizzes, {len(question_ids)} questions and {count} "
+        f"answers in {time.perf_counter() - started:.1f}s"
+    )
+
+    # A few hot quizzes get most of the traffic (Zipf), player skill follows
+    # a Beta distribution and each session scores around skill * questions.
+    # Sessions are spread over the past year, a second apart at most.
+    started = time.perf_counter()
+    first_played = int(time.time()) - 365 * 24 * 60 * 60
+    popularity = [1 / (rank + 1) for rank in range(quizzes)]
+    skill = [rng.betavariate(5, 3) for _ in range(users)]
+    # Board values, which rank ties by the time the score was reached
+    best: dict[uuid.UUID, dict[uuid.UUID, int]] = defaultdict(dict)
+    rounds: dict[tuple[uuid.UUID, uuid.UUID], int] = defaultdict(int)
+
+    def session_rows() -> Iterator[str]:
+        picked = rng.choices(range(quizzes), weights=popularity, k=sessions)
+        step = min(1.0, 365 * 24 * 60 * 60 / max(sessions, 1))
+        for i, quiz_index in enumerate(picked):
+            quiz_id = quiz_ids[quiz_index]
+            user_index = rng.randrange(users)
+            user_id = user_ids[user_index]
+            p = skill[user_index]
+            correct = rng.gauss(questions * p, math.sqrt(questions * p * (1 - p)))
+            score = max(0, min(questions, round(correct))) * 10
+            achieved_at = datetime.fromtimestamp(
+                first_played + int(i * step), timezone.utc
+            )
+            value = encode_score(score, achieved_at)
+            if value > best[quiz_id].get(user_id, -1):
+                best[quiz_id][user_id] = value
+            rounds[quiz_id, user_id] += 1
+            yield (
+                f"{uuid.uuid4()}\t{quiz_id}\t{user_id}\t{rounds[quiz_id, user_id]}\t"
+                f"{score}\t{achieved_at.isoformat()}\n"
+            )
+
+    count = _copy(
+        "quizsession",
+        ("id", "quiz_id", "user_id", "round", "score", "achieved_at"),
+        session_rows(),
+        batch,
+    )
+    logger.info(f"Copied {count} sessions in {time.perf_counter() - started:.1f}s")
+
+    with engine.connect() as connection:
+        connection.exec_driver_sql(
+            'ANALYZE "user", quiz, question, answer, quizsession'
+        )
+        connection.commit()
+
+    if not skip_redis:
+        started = time.perf_counter()
+        count = asyncio.run(_fill_leaderboards(best, batch))
+        logger.info(
+            f"Added {count} leaderboard entries in {time.perf_counter() - started:.1f}s"
+        )
+
+
+async def _fill_leaderboards(
+    best: dict[uuid.UUID, dict[uuid.UUID, int]], batch: int
+) -> int:
+    count = 0
+    user_ids = list({user_id for scores in best.values() for user_id in scores})
+    encoded: dict[str, str] = {}
+    for start in range(0, len(user_ids), batch):
+        encoded |= await encode_members(user_ids[start : start + batch])
+    pipe = redis_client.pipeline(transaction=False)
+    for quiz_id, scores in best.items():
+        members = [(encoded[str(user_id)], score) for user_id, score in scores.items()]
+        for start in range(0, len(members), batch):
+            # GT keeps a better score that is already on the board
+            pipe.zadd(
+                f"leaderboard:{quiz_id}", dict(members[start : start + batch]), gt=True
+            )
+            count += len(members[start : start + batch])
+            if len(pipe) >= 100:
+                await pipe.execute()
+    await pipe.execute()
+    # The global board sums the quiz boards written above
+    await rebuild_global()
+    return count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--quizzes", type=int, default=100)
+    parser.add_argument("--questions", type=int, default=20, help="per quiz")
+    parser.add_argument("--answers", type=int, default=4, help="per question")
+    parser.add_argument("--sessions", type=int, default=100_000)
+    parser.add_argument("--batch", type=int, default=10_000, help="rows per write")
+    parser.add_argument(
+        "--seed", dest="random_seed", type=int, help="for repeatable content"
+    )
+    parser.add_argument("--skip-redis", action="store_true")
+    args = parser.parse_args()
+
+    logger.info("Seeding synthetic data")
+    seed(**vars(args))
+    logger.info("Synthetic data seeded")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+
+
+def test_read_memory(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/diagnostics/memory",
+        headers=superuser_token_headers,
+    )
+    assert r.status_code == 200
+    content = r.json()
+    assert content["rss_bytes"] > 0
+    assert len(content["gc_counts"]) == 3
+
+
+def test_read_memory_normal_user(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/diagnostics/memory",
+        headers=normal_user_token_headers,
+    )
+    assert r.status_code == 403
+
+
+def test_tracemalloc_snapshot_diff(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    base = f"{settings.API_V1_STR}/diagnostics/memory"
+    r = client.post(f"{base}/tracemalloc/start", headers=superuser_token_headers)
+    assert r.status_code == 200
+    workers = [reply["worker"] for reply in r.json()]
+    try:
+        r = client.post(f"{base}/snapshots", headers=superuser_token_headers)
+        assert r.status_code == 200
+        snapshot_id = r.json()["id"]
+        # Every worker takes its own snapshot under the shared ID
+        assert [reply["worker"] for reply in r.json()["workers"]] == workers
+
+        r = client.get(
+            f"{base}/diff",
+            headers=superuser_token_headers,
+            params={"from_id": snapshot_id, "limit": 5},
+        )
+        assert r.status_code == 200
+        assert all(len(reply["sites"]) <= 5 for reply in r.json())
+
+        r = client.get(
+            f"{base}/top", headers=superuser_token_headers, params={"limit": 3}
+        )
+        assert r.status_code == 200
+        assert all(len(reply["sites"]) <= 3 for reply in r.json())
+    finally:
+        client.post(f"{base}/tracemalloc/stop", headers=superuser_token_headers)
+
+    r = client.get(
+        f"{base}/diff",
+        headers=superuser_token_headers,
+        params={"from_id": snapshot_id},
+    )
+    assert r.status_code == 404
+
+
+def test_read_broadcast_stats(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/diagnostics/broadcast",
+        headers=superuser_token_headers,
+    )
+    assert r.status_code == 200
+    content = r.json()
+    assert content["frames_dropped"] >= 0
+    assert content["clients_evicted"] >= 0
@@ -0,0 +1,56 @@
+import uuid
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.tests.utils.user import create_random_user
+
+
+def test_group_members(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    r = client.post(
+        f"{settings.API_V1_STR}/groups/",
+        headers=normal_user_token_headers,
+        json={"name": "Class 1A"},
+    )
+    assert r.status_code == 200
+    group = r.json()
+    assert group["member_ids"] == []
+    url = f"{settings.API_V1_STR}/groups/{group['id']}"
+
+    student = create_random_user(db)
+    # Unknown users are skipped
+    r = client.post(
+        f"{url}/members",
+        headers=normal_user_token_headers,
+        json={"user_ids": [str(student.id), str(uuid.uuid4())]},
+    )
+    assert r.json()["member_ids"] == [str(student.id)]
+    assert r.json()["version"] == group["version"] + 1
+
+    r = client.delete(f"{url}/members/{student.id}", headers=normal_user_token_headers)
+    assert r.json()["member_ids"] == []
+
+    r = client.delete(url, headers=normal_user_token_headers)
+    assert r.status_code == 200
+    r = client.get(url, headers=normal_user_token_headers)
+    assert r.status_code == 404
+
+
+def test_group_owner_only(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    normal_user_token_headers: dict[str, str],
+) -> None:
+    r = client.post(
+        f"{settings.API_V1_STR}/groups/",
+        headers=superuser_token_headers,
+        json={"name": "Staff"},
+    )
+    url = f"{settings.API_V1_STR}/groups/{r.json()['id']}"
+    r = client.get(url, headers=normal_user_token_headers)
+    assert r.status_code == 403
+    r = client.delete(url, headers=normal_user_token_headers)
+    assert r.status_code == 403
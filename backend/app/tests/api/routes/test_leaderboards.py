@@ -0,0 +1,328 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.redis import redis_client
+from app.leaderboard import LEADERBOARD_STREAM
+from app.tests.utils.quiz import create_random_quiz
+from app.tests.utils.user import authentication_token_from_email
+from app.tests.utils.utils import random_email
+
+
+def test_leaderboard_not_modified(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    quiz = create_random_quiz(db)
+    r = client.post(
+        f"{settings.API_V1_STR}/quizzes/join",
+        headers=normal_user_token_headers,
+        json={"quiz_id": str(quiz.id)},
+    )
+    quiz_session = r.json()
+    url = f"{settings.API_V1_STR}/leaderboards/{quiz.id}"
+    r = client.get(url)
+    assert r.status_code == 200
+    assert [entry["score"] for entry in r.json()] == [0]
+    etag = r.headers["etag"]
+
+    r = client.get(url, headers={"If-None-Match": etag})
+    assert r.status_code == 304
+    assert r.headers["etag"] == etag
+
+    client.patch(
+        f"{settings.API_V1_STR}/quiz-sessions/{quiz_session['id']}/score",
+        json={"score": 30},
+    )
+    r = client.get(url, headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["etag"] != etag
+    assert [entry["score"] for entry in r.json()] == [30]
+
+
+def test_score_idempotency_key(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    quiz = create_random_quiz(db)
+    url = f"{settings.API_V1_STR}/leaderboards/{quiz.id}/score"
+    headers = {**normal_user_token_headers, "Idempotency-Key": str(quiz.id)}
+    first = client.post(url, headers=headers, json={"score": 10})
+    retry = client.post(url, headers=headers, json={"score": 10})
+    assert first.status_code == retry.status_code == 200
+    assert "idempotent-replayed" not in first.headers
+    assert retry.headers["idempotent-replayed"] == "true"
+
+    reused = client.post(url, headers=headers, json={"score": 20})
+    assert reused.status_code == 422
+
+
+def test_session_score_idempotency_key(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    quiz = create_random_quiz(db)
+    r = client.post(
+        f"{settings.API_V1_STR}/quizzes/join",
+        headers=normal_user_token_headers,
+        json={"quiz_id": str(quiz.id)},
+    )
+    url = f"{settings.API_V1_STR}/quiz-sessions/{r.json()['id']}/score"
+    headers = {"Idempotency-Key": str(quiz.id)}
+    first = client.patch(url, headers=headers, json={"score": 40})
+    retry = client.patch(url, headers=headers, json={"score": 40})
+    assert first.status_code == retry.status_code == 200
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert retry.json() == first.json()
+    assert retry.json()["score"] == 40
+
+
+def test_submit_score_batch(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    quiz = create_random_quiz(db)
+    other_quiz = create_random_quiz(db)
+    r = client.post(
+        f"{settings.API_V1_STR}/quizzes/join",
+        headers=normal_user_token_headers,
+        json={"quiz_id": str(quiz.id)},
+    )
+    session_id = r.json()["id"]
+    correct = [
+        str(answer.id)
+        for question in quiz.questions
+        for answer in question.answers
+        if answer.is_correct
+    ]
+    wrong = next(
+        str(answer.id) for answer in quiz.questions[0].answers if not answer.is_correct
+    )
+    entries = [
+        {"quiz_id": str(quiz.id), "session_id": session_id, "score": 1},
+        {
+            "quiz_id": str(quiz.id),
+            "session_id": session_id,
+            "answers": [*correct[:2], wrong],
+        },
+        {"quiz_id": str(other_quiz.id), "session_id": session_id, "score": 5},
+        {"quiz_id": str(quiz.id), "session_id": str(other_quiz.id), "score": 5},
+    ]
+    r = client.post(
+        f"{settings.API_V1_STR}/quiz-sessions/batch",
+        headers=normal_user_token_headers,
+        json={"entries": entries},
+    )
+    assert r.status_code == 200
+    results = r.json()["results"]
+    assert [result["status"] for result in results] == [
+        "updated",
+        "updated",
+        "invalid",
+        "not_found",
+    ]
+    assert results[1]["score"] == 2
+
+    r = client.get(f"{settings.API_V1_STR}/leaderboards/{quiz.id}")
+    assert [entry["score"] for entry in r.json()] == [2]
+
+
+def test_leaderboard_changes_long_poll(client: TestClient, db: Session) -> None:
+    quiz = create_random_quiz(db)
+    url = f"{settings.API_V1_STR}/leaderboards/{quiz.id}/changes"
+    r = client.get(url)
+    assert r.status_code == 200
+    seq = r.json()["seq"]
+
+    r = client.get(url, params={"since": seq, "timeout": 0.2})
+    assert r.status_code == 204
+
+    r = client.get(url, params={"since": seq - 1})
+    assert r.status_code == 200
+    assert r.json()["seq"] == seq
+
+
+def test_leaderboard_windows(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    quiz = create_random_quiz(db)
+    client.post(
+        f"{settings.API_V1_STR}/leaderboards/{quiz.id}/score",
+        headers=normal_user_token_headers,
+        json={"score": 15},
+    )
+    url = f"{settings.API_V1_STR}/leaderboards/{quiz.id}"
+    for window in ("day", "week"):
+        r = client.get(url, params={"window": window})
+        assert r.status_code == 200
+        assert [(row["rank"], row["score"]) for row in r.json()] == [(1, 15)]
+        r = client.get(
+            url,
+            params={"window": window},
+            headers={"If-None-Match": r.headers["etag"]},
+        )
+        assert r.status_code == 304
+
+    r = client.get(f"{url}/changes", params={"window": "day"})
+    assert r.json()["leaderboard"][0]["score"] == 15
+
+
+def test_global_leaderboard(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=normal_user_token_headers)
+    user_id = r.json()["id"]
+    url = f"{settings.API_V1_STR}/leaderboards/global"
+
+    def global_score() -> int:
+        rows = client.get(url, params={"limit": 1000}).json()
+        return next((row["score"] for row in rows if row["user_id"] == user_id), 0)
+
+    before = global_score()
+    quizzes = [create_random_quiz(db), create_random_quiz(db)]
+    # Only improvements of a quiz's best score add to the global score
+    for quiz, score in [
+        (quizzes[0], 10),
+        (quizzes[0], 4),
+        (quizzes[0], 25),
+        (quizzes[1], 8),
+    ]:
+        client.post(
+            f"{settings.API_V1_STR}/leaderboards/{quiz.id}/score",
+            headers=normal_user_token_headers,
+            json={"score": score},
+        )
+    assert global_score() == before + 33
+
+    r = client.get(url, params={"limit": 1})
+    assert r.status_code == 200
+    assert r.json()[0]["rank"] == 1
+    r = client.get(
+        url, params={"limit": 1}, headers={"If-None-Match": r.headers["etag"]}
+    )
+    assert r.status_code == 304
+
+
+def test_group_leaderboard(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=normal_user_token_headers)
+    user_id = r.json()["id"]
+    r = client.post(
+        f"{settings.API_V1_STR}/groups/",
+        headers=normal_user_token_headers,
+        json={"name": "Class 1A"},
+    )
+    group_id = r.json()["id"]
+    client.post(
+        f"{settings.API_V1_STR}/groups/{group_id}/members",
+        headers=normal_user_token_headers,
+        json={"user_ids": [user_id]},
+    )
+    quiz = create_random_quiz(db)
+    client.post(
+        f"{settings.API_V1_STR}/leaderboards/{quiz.id}/score",
+        headers=normal_user_token_headers,
+        json={"score": 12},
+    )
+
+    url = f"{settings.API_V1_STR}/leaderboards/{quiz.id}/groups/{group_id}"
+    r = client.get(url, headers=normal_user_token_headers)
+    assert r.status_code == 200
+    assert [(row["user_id"], row["score"]) for row in r.json()] == [(user_id, 12)]
+    r = client.get(
+        url,
+        headers={**normal_user_token_headers, "If-None-Match": r.headers["etag"]},
+    )
+    assert r.status_code == 304
+
+
+def test_score_distribution(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    quiz = create_random_quiz(db)
+    url = f"{settings.API_V1_STR}/leaderboards/{quiz.id}"
+    r = client.get(f"{url}/distribution", params={"score": 5})
+    assert r.json()["players"] == 0
+
+    for score in (4, 9, 6):
+        client.post(
+            f"{url}/score", headers=normal_user_token_headers, json={"score": score}
+        )
+    r = client.get(f"{url}/distribution", params={"score": 9})
+    assert r.status_code == 200
+    distribution = r.json()
+    # Only the best score of the player is counted
+    assert distribution["players"] == 1
+    assert [bucket["count"] for bucket in distribution["buckets"]] == [1]
+    assert distribution["percentile"] == 0.0
+    r = client.get(f"{url}/distribution", params={"score": 10})
+    assert r.json()["percentile"] == 100.0
+
+
+def test_ties_rank_alike_in_sql_and_redis(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    quiz = create_random_quiz(db)
+    players = [
+        normal_user_token_headers,
+        authentication_token_from_email(client=client, email=random_email(), db=db),
+        authentication_token_from_email(client=client, email=random_email(), db=db),
+    ]
+    for headers, score in zip(players, (20, 20, 30), strict=True):
+        r = client.post(
+            f"{settings.API_V1_STR}/quizzes/join",
+            headers=headers,
+            json={"quiz_id": str(quiz.id)},
+        )
+        client.patch(
+            f"{settings.API_V1_STR}/quiz-sessions/{r.json()['id']}/score",
+            json={"score": score},
+        )
+
+    url = f"{settings.API_V1_STR}/leaderboards/{quiz.id}"
+    from_sql = client.get(url).json()
+    from_redis = client.get(url, params={"window": "day"}).json()
+    assert [row["rank"] for row in from_sql] == [1, 2, 3]
+    assert [row["score"] for row in from_sql] == [30, 20, 20]
+    assert from_redis == from_sql
+
+
+def test_compact_member_ids(
+    client: TestClient,
+    normal_user_token_headers: dict[str, str],
+    db: Session,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "LEADERBOARD_MEMBER_ENCODING", "id")
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=normal_user_token_headers)
+    user_id = r.json()["id"]
+    quiz = create_random_quiz(db)
+    url = f"{settings.API_V1_STR}/leaderboards/{quiz.id}"
+    client.post(f"{url}/score", headers=normal_user_token_headers, json={"score": 7})
+
+    # Players are stored by integer ID but still shown by UUID
+    r = client.get(url, params={"window": "day"})
+    assert [(row["user_id"], row["score"]) for row in r.json()] == [(user_id, 7)]
+    [(_, event)] = client.portal.call(
+        redis_client.xrevrange, LEADERBOARD_STREAM, "+", "-", 1
+    )
+    assert event == {"quiz_id": str(quiz.id), "user_id": user_id, "score": "7"}
+
+
+def test_players_rank_once_over_rounds(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    quiz = create_random_quiz(db)
+    for round_number, score in ((1, 8), (2, 14), (3, 11)):
+        r = client.post(
+            f"{settings.API_V1_STR}/quizzes/join",
+            headers=normal_user_token_headers,
+            json={"quiz_id": str(quiz.id), "round": round_number},
+        )
+        client.patch(
+            f"{settings.API_V1_STR}/quiz-sessions/{r.json()['id']}/score",
+            json={"score": score},
+        )
+
+    url = f"{settings.API_V1_STR}/leaderboards/{quiz.id}"
+    from_sql = client.get(url).json()
+    assert [(row["rank"], row["score"]) for row in from_sql] == [(1, 14)]
+    assert client.get(url, params={"window": "day"}).json() == from_sql
@@ -0,0 +1,211 @@
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app import quiz_cache
+from app.core.config import settings
+from app.tests.utils.quiz import create_random_quiz
+
+
+def test_read_quiz(client: TestClient, db: Session) -> None:
+    quiz = create_random_quiz(db)
+    r = client.get(
+        f"{settings.API_V1_STR}/quizzes/{quiz.id}",
+        headers={"Accept-Encoding": "identity"},
+    )
+    assert r.status_code == 200
+    content = r.json()
+    assert content["id"] == str(quiz.id)
+    assert content["version"] == quiz.version
+    assert len(content["questions"]) == 3
+    assert "content-encoding" not in r.headers
+
+
+def test_read_quiz_not_found(client: TestClient) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/quizzes/00000000-0000-0000-0000-000000000000"
+    )
+    assert r.status_code == 404
+
+
+def test_read_quiz_gzip_cached(client: TestClient, db: Session) -> None:
+    quiz = create_random_quiz(db, questions=20)
+    url = f"{settings.API_V1_STR}/quizzes/{quiz.id}"
+    first = client.get(url, headers={"Accept-Encoding": "gzip"})
+    second = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert first.status_code == second.status_code == 200
+    assert second.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in second.headers["vary"]
+    assert first.content == second.content
+    identity = client.get(url, headers={"Accept-Encoding": "identity"})
+    assert identity.json() == second.json()
+
+
+def test_update_quiz_invalidates_cache(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    quiz = create_random_quiz(db)
+    url = f"{settings.API_V1_STR}/quizzes/{quiz.id}"
+    assert client.get(url).json()["version"] == 1
+    r = client.patch(
+        url,
+        headers=superuser_token_headers,
+        json={
+            "name": "Renamed",
+            "questions": [
+                {"text": "word", "answers": [{"text": "meaning", "is_correct": True}]}
+            ],
+        },
+    )
+    assert r.status_code == 200
+    content = client.get(url).json()
+    assert content["name"] == "Renamed"
+    assert content["version"] == 2
+    assert len(content["questions"]) == 1
+
+
+def test_delete_quiz_not_served_from_cache(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    quiz = create_random_quiz(db)
+    url = f"{settings.API_V1_STR}/quizzes/{quiz.id}"
+    assert client.get(url).status_code == 200
+    r = client.delete(url, headers=superuser_token_headers)
+    assert r.status_code == 200
+    # A reader that loaded the quiz before the delete cannot cache it again
+    client.portal.call(quiz_cache.store, quiz.id, 1, {"identity": b"{}"})
+    assert client.get(url).status_code == 404
+
+
+def test_create_question_invalidates_cache(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    quiz = create_random_quiz(db)
+    url = f"{settings.API_V1_STR}/quizzes/{quiz.id}"
+    assert len(client.get(url).json()["questions"]) == 3
+    r = client.post(
+        f"{url}/questions",
+        headers=superuser_token_headers,
+        json={"text": "word", "answers": [{"text": "meaning", "is_correct": True}]},
+    )
+    assert r.status_code == 200
+    content = client.get(url).json()
+    assert len(content["questions"]) == 4
+    assert content["version"] == 2
+
+
+def test_read_quiz_not_modified(client: TestClient, db: Session) -> None:
+    quiz = create_random_quiz(db)
+    url = f"{settings.API_V1_STR}/quizzes/{quiz.id}"
+    etag = client.get(url).headers["etag"]
+    r = client.get(url, headers={"If-None-Match": etag})
+    assert r.status_code == 304
+    assert r.headers["etag"] == etag
+    assert not r.content
+
+
+def test_read_quiz_modified_after_update(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    quiz = create_random_quiz(db)
+    url = f"{settings.API_V1_STR}/quizzes/{quiz.id}"
+    etag = client.get(url).headers["etag"]
+    client.post(
+        f"{url}/questions",
+        headers=superuser_token_headers,
+        json={"text": "word", "answers": []},
+    )
+    r = client.get(url, headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["etag"] != etag
+
+
+def test_read_quiz_summaries(client: TestClient, db: Session) -> None:
+    quiz = create_random_quiz(db, questions=5)
+    summaries = []
+    cursor = None
+    while True:
+        params = {"limit": 50, "with_count": False}
+        if cursor:
+            params["cursor"] = cursor
+        r = client.get(f"{settings.API_V1_STR}/quizzes/summary", params=params)
+        assert r.status_code == 200
+        summaries += r.json()["data"]
+        cursor = r.json()["next_cursor"]
+        if not cursor:
+            break
+    summary = next(s for s in summaries if s["id"] == str(quiz.id))
+    assert summary == {
+        "id": str(quiz.id),
+        "name": quiz.name,
+        "version": quiz.version,
+        "question_count": 5,
+    }
+
+
+def test_read_quiz_sparse_fields(client: TestClient, db: Session) -> None:
+    quiz = create_random_quiz(db)
+    r = client.get(
+        f"{settings.API_V1_STR}/quizzes/{quiz.id}", params={"fields": "name,version"}
+    )
+    assert r.status_code == 200
+    assert r.json() == {"id": str(quiz.id), "name": quiz.name, "version": 1}
+
+
+def test_read_quizzes_sparse_fields(client: TestClient, db: Session) -> None:
+    create_random_quiz(db)
+    r = client.get(
+        f"{settings.API_V1_STR}/quizzes/", params={"fields": "name", "limit": 5}
+    )
+    assert r.status_code == 200
+    for quiz in r.json()["data"]:
+        assert set(quiz) == {"id", "name"}
+
+
+def test_read_quiz_unknown_field(client: TestClient, db: Session) -> None:
+    quiz = create_random_quiz(db)
+    r = client.get(
+        f"{settings.API_V1_STR}/quizzes/{quiz.id}", params={"fields": "name,owner"}
+    )
+    assert r.status_code == 400
+    assert r.json() == {"detail": "Unknown fields: owner"}
+
+
+def test_join_quiz_twice_returns_same_session(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    quiz = create_random_quiz(db)
+    url = f"{settings.API_V1_STR}/quizzes/join"
+    first = client.post(
+        url, headers=normal_user_token_headers, json={"quiz_id": str(quiz.id)}
+    )
+    second = client.post(
+        url, headers=normal_user_token_headers, json={"quiz_id": str(quiz.id)}
+    )
+    assert first.status_code == second.status_code == 200
+    assert first.json()["id"] == second.json()["id"]
+    assert first.json()["round"] == 1
+
+    next_round = client.post(
+        url,
+        headers=normal_user_token_headers,
+        json={"quiz_id": str(quiz.id), "round": 2},
+    )
+    assert next_round.json()["id"] != first.json()["id"]
+
+
+def test_join_quiz_idempotency_key(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    quiz = create_random_quiz(db)
+    url = f"{settings.API_V1_STR}/quizzes/join"
+    headers = {**normal_user_token_headers, "Idempotency-Key": str(quiz.id)}
+    first = client.post(url, headers=headers, json={"quiz_id": str(quiz.id)})
+    retry = client.post(url, headers=headers, json={"quiz_id": str(quiz.id)})
+    assert first.status_code == retry.status_code == 200
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert retry.json() == first.json()
+
+    reused = client.post(
+        url, headers=headers, json={"quiz_id": str(quiz.id), "round": 2}
+    )
+    assert reused.status_code == 422
@@ -0,0 +1,83 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app import crud
+from app.core.config import settings
+from app.tests.utils.utils import random_lower_string
+
+
+def test_search_word(client: TestClient, db: Session) -> None:
+    word = random_lower_string()
+    quiz = crud.create_quiz(
+        session=db,
+        name=f"Deck {word}",
+        questions=[
+            {
+                "text": f"{word} flower",
+                "answers": [{"text": f"a {word} plant", "is_correct": True}],
+            }
+        ],
+    )
+    r = client.get(f"{settings.API_V1_STR}/search/", params={"q": word})
+    assert r.status_code == 200
+    hits = r.json()["data"]
+    assert {hit["kind"] for hit in hits} == {"quiz", "question", "answer"}
+    assert all(hit["quiz_id"] == str(quiz.id) for hit in hits)
+    assert all(f"<mark>{word}</mark>" in hit["headline"] for hit in hits)
+    assert r.json()["has_more"] is False
+
+
+def test_search_headline_is_escaped(client: TestClient, db: Session) -> None:
+    word = random_lower_string()
+    crud.create_quiz(
+        session=db,
+        name=random_lower_string(),
+        questions=[{"text": f"<b>{word}</b> & more", "answers": []}],
+    )
+    r = client.get(
+        f"{settings.API_V1_STR}/search/", params={"q": word, "kind": "question"}
+    )
+    assert r.status_code == 200
+    [hit] = r.json()["data"]
+    assert hit["text"] == f"<b>{word}</b> & more"
+    assert hit["headline"] == f"&lt;b&gt;<mark>{word}</mark>&lt;/b&gt; &amp; more"
+
+
+def test_search_typo(client: TestClient, db: Session) -> None:
+    word = random_lower_string()
+    crud.create_quiz(
+        session=db,
+        name=random_lower_string(),
+        questions=[{"text": word, "answers": []}],
+    )
+    # A single changed letter still shares most trigrams
+    typo = word[:-1] + ("a" if word[-1] != "a" else "b")
+    r = client.get(
+        f"{settings.API_V1_STR}/search/", params={"q": typo, "kind": "question"}
+    )
+    assert r.status_code == 200
+    assert [hit["text"] for hit in r.json()["data"]] == [word]
+
+
+def test_search_query_too_short(client: TestClient) -> None:
+    r = client.get(f"{settings.API_V1_STR}/search/", params={"q": "a"})
+    assert r.status_code == 422
+
+
+def test_search_stops_at_candidate_limit(
+    client: TestClient, db: Session, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    word = random_lower_string()
+    crud.create_quiz(
+        session=db,
+        name=random_lower_string(),
+        questions=[{"text": f"{word} {i}", "answers": []} for i in range(3)],
+    )
+    monkeypatch.setattr(settings, "SEARCH_CANDIDATE_LIMIT", 2)
+    url = f"{settings.API_V1_STR}/search/"
+    r = client.get(url, params={"q": word, "kind": "question", "limit": 5})
+    assert len(r.json()["data"]) == 2
+    assert r.json()["has_more"] is False
+    r = client.get(url, params={"q": word, "kind": "question", "skip": 2})
+    assert r.json() == {"data": [], "has_more": False}
@@ -168,6 +168,49 @@ def test_retrieve_users(
         assert "email" in item
 
 
+def test_retrieve_users_cursor(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    for _ in range(3):
+        user_in = UserCreate(email=random_email(), password=random_lower_string())
+        crud.create_user(session=db, user_create=user_in)
+
+    r = client.get(
+        f"{settings.API_V1_STR}/users/",
+        headers=superuser_token_headers,
+        params={"limit": 2},
+    )
+    first_page = r.json()
+    assert len(first_page["data"]) == 2
+    assert first_page["count"] >= 4
+    assert first_page["next_cursor"]
+
+    r = client.get(
+        f"{settings.API_V1_STR}/users/",
+        headers=superuser_token_headers,
+        params={"limit": 2, "cursor": first_page["next_cursor"]},
+    )
+    second_page = r.json()
+    assert second_page["data"]
+    assert second_page["count"] is None
+    first_ids = [user["id"] for user in first_page["data"]]
+    second_ids = [user["id"] for user in second_page["data"]]
+    assert not set(first_ids) & set(second_ids)
+    assert max(first_ids) < min(second_ids)
+
+
+def test_retrieve_users_invalid_cursor(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/users/",
+        headers=superuser_token_headers,
+        params={"cursor": "not a cursor"},
+    )
+    assert r.status_code == 400
+    assert r.json() == {"detail": "Invalid cursor"}
+
+
 def test_update_user_me(
     client: TestClient, normal_user_token_headers: dict[str, str], db: Session
 ) -> None:
@@ -0,0 +1,64 @@
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+
+
+def test_profile_inline_superuser(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/users/me",
+        headers=superuser_token_headers,
+        params={"profile": "text"},
+    )
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+    assert r.headers["x-profile-status"] == "200"
+
+
+def test_profile_ignored_for_normal_user(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/users/me",
+        headers={**normal_user_token_headers, "X-Profile": "text"},
+    )
+    assert r.status_code == 200
+    assert r.json()["email"] == settings.EMAIL_TEST_USER
+    assert "x-profile-status" not in r.headers
+
+
+def test_profile_stored_for_download(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/users/me",
+        headers={
+            **superuser_token_headers,
+            "X-Profile": "html",
+            "X-Profile-Store": "1",
+        },
+    )
+    assert r.status_code == 200
+    assert r.json()["email"] == settings.FIRST_SUPERUSER
+    profile_id = r.headers["x-profile-id"]
+
+    r = client.get(
+        f"{settings.API_V1_STR}/utils/profiles/{profile_id}",
+        headers=superuser_token_headers,
+    )
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/html")
+
+
+def test_profile_flag_is_an_exact_query_key(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/users/me",
+        headers=superuser_token_headers,
+        params={"user_profile": "text"},
+    )
+    assert r.status_code == 200
+    assert r.json()["email"] == settings.FIRST_SUPERUSER
+    assert "x-profile-status" not in r.headers
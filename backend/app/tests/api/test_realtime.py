@@ -0,0 +1,81 @@
+import json
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app import crud
+from app.core.config import settings
+from app.models import UserCreate
+from app.tests.utils.quiz import create_random_quiz
+from app.tests.utils.user import user_authentication_headers
+from app.tests.utils.utils import random_email, random_lower_string
+
+SOCKET_URL = "/ws/socket.io/?EIO=4&transport=websocket"
+UPGRADE_HEADERS = {"upgrade": "websocket", "connection": "Upgrade"}
+
+
+def test_connect_requires_token(client: TestClient) -> None:
+    with client.websocket_connect(SOCKET_URL, headers=UPGRADE_HEADERS) as ws:
+        assert ws.receive_text().startswith("0")
+        ws.send_text("40" + json.dumps({"token": "invalid"}))
+        assert ws.receive_text().startswith("44")
+
+
+def test_join_and_answer(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    quiz = create_random_quiz(db)
+    r = client.post(
+        f"{settings.API_V1_STR}/quizzes/join",
+        headers=normal_user_token_headers,
+        json={"quiz_id": str(quiz.id)},
+    )
+    session_id = r.json()["id"]
+    token = normal_user_token_headers["Authorization"].split()[1]
+
+    with client.websocket_connect(SOCKET_URL, headers=UPGRADE_HEADERS) as ws:
+        ws.receive_text()
+        ws.send_text("40" + json.dumps({"token": token}))
+        assert ws.receive_text().startswith("40")
+
+        ws.send_text("421" + json.dumps(["join", {"quiz_id": str(quiz.id)}]))
+        joined = json.loads(ws.receive_text().removeprefix("431"))
+        assert joined[0]["quiz_id"] == str(quiz.id)
+
+        entry = {"quiz_id": str(quiz.id), "session_id": session_id, "score": 12}
+        ws.send_text("422" + json.dumps(["answer", entry]))
+        # The room event goes through Redis, so it may arrive after the ack
+        ack, events = None, {}
+        while ack is None or "round" not in events:
+            packet = ws.receive_text()
+            if packet.startswith("432"):
+                ack = json.loads(packet.removeprefix("432"))[0]
+            elif packet.startswith("42["):
+                name, data = json.loads(packet.removeprefix("42"))
+                events[name] = data
+        assert ack["status"] == "updated"
+        assert events["round"]["event"] == "answered"
+        assert events["round"]["score"] == 12
+
+
+def test_answer_after_user_deactivated(client: TestClient, db: Session) -> None:
+    quiz = create_random_quiz(db)
+    email, password = random_email(), random_lower_string()
+    user = crud.create_user(
+        session=db, user_create=UserCreate(email=email, password=password)
+    )
+    headers = user_authentication_headers(client=client, email=email, password=password)
+    token = headers["Authorization"].split()[1]
+
+    with client.websocket_connect(SOCKET_URL, headers=UPGRADE_HEADERS) as ws:
+        ws.receive_text()
+        ws.send_text("40" + json.dumps({"token": token}))
+        assert ws.receive_text().startswith("40")
+
+        user.is_active = False
+        db.add(user)
+        db.commit()
+        entry = {"quiz_id": str(quiz.id), "session_id": str(quiz.id), "score": 1}
+        ws.send_text("421" + json.dumps(["answer", entry]))
+        ack = json.loads(ws.receive_text().removeprefix("431"))[0]
+        assert ack == {"error": "User not found or inactive"}
@@ -7,7 +7,16 @@ from sqlmodel import Session, delete
 from app.core.config import settings
 from app.core.db import engine, init_db
 from app.main import app
-from app.models import Item, User
+from app.models import (
+    Answer,
+    Group,
+    GroupMember,
+    Item,
+    Question,
+    Quiz,
+    QuizSession,
+    User,
+)
 from app.tests.utils.user import authentication_token_from_email
 from app.tests.utils.utils import get_superuser_token_headers
 
@@ -19,6 +28,8 @@ def db() -> Generator[Session, None, None]:
         yield session
         statement = delete(Item)
         session.execute(statement)
+        for model in (GroupMember, Group, QuizSession, Answer, Question, Quiz):
+            session.execute(delete(model))
         statement = delete(User)
         session.execute(statement)
         session.commit()
@@ -0,0 +1,116 @@
+import asyncio
+import json
+import time
+
+from app.broadcast import STREAM_BLOCK_MS, LeaderboardBroadcaster, leaderboard_delta
+from app.core.config import settings
+
+
+def test_broadcasts_are_coalesced_per_quiz() -> None:
+    broadcaster = LeaderboardBroadcaster()
+    interval = settings.LEADERBOARD_BROADCAST_INTERVAL_MS / 1000
+    assert broadcaster._block_ms(100.0) == STREAM_BLOCK_MS
+
+    # A quiz that was not broadcast recently goes out right away
+    broadcaster._schedule("a", 100.0)
+    assert broadcaster._due_at == {"a": 100.0}
+    broadcaster._sent_at["a"] = 100.0
+    del broadcaster._due_at["a"]
+
+    # Later updates within the interval wait for it and collapse into one
+    for _ in range(1000):
+        broadcaster._schedule("a", 100.0 + interval / 2)
+    broadcaster._schedule("b", 100.0 + interval / 2)
+    assert broadcaster._due_at == {"a": 100.0 + interval, "b": 100.0 + interval / 2}
+    assert broadcaster._block_ms(100.0 + interval / 2) == 1
+
+    broadcaster._prune(100.0 + interval)
+    assert broadcaster._sent_at == {}
+
+
+def test_leaderboard_delta() -> None:
+    old = [("a", 30.0), ("b", 20.0), ("c", 10.0)]
+    new = [("d", 40.0), ("a", 30.0), ("c", 25.0)]
+    assert leaderboard_delta(old, new) == [
+        {"op": "remove", "user_id": "b"},
+        {"op": "insert", "user_id": "d", "rank": 1, "score": 40.0},
+        {"op": "move", "user_id": "c", "rank": 3, "score": 25.0},
+    ]
+    assert leaderboard_delta(new, new) == []
+
+
+def test_delta_subscribers_start_from_a_snapshot() -> None:
+    broadcaster = LeaderboardBroadcaster()
+    broadcaster._loaded_at = (0, 0)
+    broadcaster._publish_board("q", [("a", 10.0)], always=True)
+    full = broadcaster.subscribe()
+    delta = broadcaster.subscribe("delta")
+    assert json.loads(delta.pop().split("data: ")[1]) == {
+        "type": "snapshot",
+        "quiz_id": "q",
+        "seq": 1,
+        "leaderboard": [{"rank": 1, "user_id": "a", "score": 10.0}],
+    }
+
+    broadcaster._publish_board("q", [("b", 20.0), ("a", 10.0)], always=True)
+    broadcaster._publish_board("q", [("b", 20.0), ("a", 10.0)], always=True)
+    # Full clients only keep the latest board they have not read yet
+    assert len(full) == 1
+    assert broadcaster.frames_dropped == 2
+    assert json.loads(delta.pop().split("data: ")[1]) == {
+        "type": "delta",
+        "quiz_id": "q",
+        "seq": 2,
+        "changes": [{"op": "insert", "user_id": "b", "rank": 1, "score": 20.0}],
+    }
+    # An unchanged board is not sent to delta clients
+    assert len(delta) == 0
+
+
+def test_resume_from_last_event_id() -> None:
+    broadcaster = LeaderboardBroadcaster()
+    broadcaster._loaded_at = broadcaster._position = (100, 0)
+    broadcaster._publish_board("a", [("x", 1.0)], always=False)
+    broadcaster._position = (200, 0)
+    broadcaster._publish_board("b", [("y", 2.0)], always=False)
+
+    frame = broadcaster.subscribe(last_event_id="150-0").pop()
+    assert frame.startswith("id: 200-0\ndata: ")
+    assert json.loads(frame.split("data: ")[1])["quiz_id"] == "b"
+    assert len(broadcaster.subscribe(last_event_id="200-0")) == 0
+    # Unknown or too old positions get every board
+    assert len(broadcaster.subscribe(last_event_id="50-0")) == 2
+    assert len(broadcaster.subscribe(last_event_id="bogus")) == 2
+
+
+def test_slow_clients_skip_frames_and_get_evicted() -> None:
+    broadcaster = LeaderboardBroadcaster()
+    broadcaster._loaded_at = (0, 0)
+    broadcaster._publish_board("q", [("a", 10.0)], always=True)
+    delta = broadcaster.subscribe("delta")
+    broadcaster._publish_board("q", [("a", 20.0)], always=True)
+    # The unread snapshot is replaced by a newer one, not followed by a delta
+    frame = json.loads(delta.pop().split("data: ")[1])
+    assert frame["type"] == "snapshot"
+    assert frame["seq"] == 2
+
+    broadcaster._publish_board("q", [("a", 30.0)], always=True)
+    delta._behind_since = time.monotonic() - settings.SSE_CLIENT_MAX_LAG_SECONDS - 1
+    broadcaster._publish_board("q", [("a", 40.0)], always=True)
+    assert delta.closed
+    assert broadcaster.stats()["delta_subscribers"] == 0
+    assert broadcaster.clients_evicted == 1
+
+
+def test_waiters_are_woken_by_a_broadcast() -> None:
+    async def wait() -> None:
+        broadcaster = LeaderboardBroadcaster()
+        waiter = broadcaster.waiter("q")
+        other = broadcaster.waiter("other")
+        broadcaster._publish_board("q", [("a", 1.0)], always=True)
+        await asyncio.wait_for(waiter, 1)
+        assert not other.done()
+        broadcaster.discard_waiter("other", other)
+        assert broadcaster.stats()["waiters"] == 0
+
+    asyncio.run(wait())
@@ -0,0 +1,22 @@
+from sqlmodel import Session
+
+from app import crud
+from app.models import Quiz
+from app.tests.utils.utils import random_lower_string
+
+
+def create_random_quiz(db: Session, questions: int = 3, answers: int = 4) -> Quiz:
+    return crud.create_quiz(
+        session=db,
+        name=random_lower_string(),
+        questions=[
+            {
+                "text": random_lower_string(),
+                "answers": [
+                    {"text": random_lower_string(), "is_correct": a == 0}
+                    for a in range(answers)
+                ],
+            }
+            for _ in range(questions)
+        ],
+    )
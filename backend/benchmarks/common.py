@@ -0,0 +1,119 @@
+import json
+import math
+import socket
+import subprocess
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+import uvicorn
+from fastapi import FastAPI
+
+
+@dataclass
+class Result:
+    name: str
+    requests: int = 0
+    errors: int = 0
+    duration_s: float = 0.0
+    latencies_ms: list[float] = field(default_factory=list)
+    extra: dict[str, Any] = field(default_factory=dict)
+
+    def summary(self) -> dict[str, Any]:
+        latencies = sorted(self.latencies_ms)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "duration_s": round(self.duration_s, 3),
+            "throughput_rps": round(self.requests / self.duration_s, 1)
+            if self.duration_s
+            else 0.0,
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99),
+            **self.extra,
+        }
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(sorted_values)), 1)
+    return round(sorted_values[rank - 1], 3)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def write_report(
+    path: Path, results: list[Result], params: dict[str, Any]
+) -> dict[str, Any]:
+    report = {
+        "revision": git_revision(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "params": params,
+        "results": {r.name: r.summary() for r in results},
+    }
+    path.write_text(json.dumps(report, indent=2))
+    return report
+
+
+def compare_reports(baseline: dict[str, Any], current: dict[str, Any]) -> str:
+    """Render the relative change of every shared metric between two reports"""
+    lines = [f"{baseline['revision']} -> {current['revision']}"]
+    for name, metrics in current["results"].items():
+        old = baseline["results"].get(name)
+        if not old:
+            continue
+        lines.append(f"  {name}")
+        for metric, value in metrics.items():
+            before = old.get(metric)
+            if not isinstance(value, int | float) or not before:
+                continue
+            change = (value - before) / before * 100
+            lines.append(
+                f"    {metric:>16}: {before:>10} -> {value:>10} ({change:+.1f}%)"
+            )
+    return "\n".join(lines)
+
+
+class InProcessServer:
+    """Serve an ASGI app with uvicorn on a loopback port from a background thread"""
+
+    def __init__(self, app: FastAPI) -> None:
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            self.port = s.getsockname()[1]
+        self.server = uvicorn.Server(
+            uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning")
+        )
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self) -> "InProcessServer":
+        self.thread.start()
+        while not self.server.started:
+            if not self.thread.is_alive():
+                raise RuntimeError("Benchmark server failed to start")
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
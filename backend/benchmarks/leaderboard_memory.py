@@ -0,0 +1,117 @@
+"""
+Memory benchmark of the leaderboard member encodings.
+
+Fills the same boards with players as UUID strings, as raw 16-byte UUIDs and
+as the integer IDs of `LEADERBOARD_MEMBER_ENCODING=id`, and reports what Redis
+needs for each. The integer IDs also pay for the hashes mapping them back to
+UUIDs, which are shared by all boards. It uses the Redis configured in
+`.env` and removes its keys afterwards:
+
+    python -m benchmarks.leaderboard_memory --players 100000 --boards 100
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import time
+import uuid
+from collections.abc import Callable
+from pathlib import Path
+
+from app.core.redis import binary_redis_client
+from app.leaderboard import encode_score
+from app.models import MAX_SCORE
+from benchmarks.common import Result, write_report
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PREFIX = "bench:memory"
+
+LAYOUTS: dict[str, Callable[[uuid.UUID, int], str | bytes]] = {
+    "uuid": lambda user_id, _: str(user_id),
+    "bytes": lambda user_id, _: user_id.bytes,
+    "id": lambda _, member_id: str(member_id),
+}
+
+
+async def _memory_usage(keys: list[str]) -> int:
+    async with binary_redis_client.pipeline(transaction=False) as pipe:
+        for key in keys:
+            # Sample every element, the default estimate is too rough here
+            pipe.memory_usage(key, samples=0)
+        return sum(size or 0 for size in await pipe.execute())
+
+
+async def measure(
+    layout: str, boards: list[list[int]], players: list[uuid.UUID], batch: int
+) -> Result:
+    member = LAYOUTS[layout]
+    keys = [f"{PREFIX}:{layout}:{i}" for i in range(len(boards))]
+    started = time.perf_counter()
+    pipe = binary_redis_client.pipeline(transaction=False)
+    for key, board in zip(keys, boards, strict=True):
+        for start in range(0, len(board), batch):
+            pipe.zadd(
+                key,
+                {
+                    member(players[i], i + 1): encode_score(
+                        random.randint(0, MAX_SCORE)
+                    )
+                    for i in board[start : start + batch]
+                },
+            )
+            if len(pipe) >= 100:
+                await pipe.execute()
+    await pipe.execute()
+    mapping = []
+    if layout == "id":
+        mapping = [f"{PREFIX}:id:ids", f"{PREFIX}:id:uuids"]
+        for start in range(0, len(players), batch):
+            chunk = range(start, min(start + batch, len(players)))
+            pipe.hset(mapping[0], mapping={str(players[i]): i + 1 for i in chunk})
+            pipe.hset(mapping[1], mapping={i + 1: str(players[i]) for i in chunk})
+            await pipe.execute()
+    result = Result(layout, requests=sum(len(board) for board in boards))
+    result.duration_s = time.perf_counter() - started
+
+    board_bytes = await _memory_usage(keys)
+    mapping_bytes = await _memory_usage(mapping)
+    await binary_redis_client.delete(*keys, *mapping)
+    result.extra = {
+        "board_bytes": board_bytes,
+        "mapping_bytes": mapping_bytes,
+        "bytes_per_entry": round((board_bytes + mapping_bytes) / result.requests, 1),
+    }
+    return result
+
+
+async def run(args: argparse.Namespace) -> list[Result]:
+    players = [uuid.uuid4() for _ in range(args.players)]
+    size = min(args.board_size, args.players)
+    boards = [random.sample(range(args.players), size) for _ in range(args.boards)]
+    return [await measure(layout, boards, players, args.batch) for layout in LAYOUTS]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--players", type=int, default=100_000)
+    parser.add_argument("--boards", type=int, default=100)
+    parser.add_argument("--board-size", type=int, default=1000, help="players each")
+    parser.add_argument("--batch", type=int, default=1000, help="entries per ZADD")
+    parser.add_argument(
+        "--output", type=Path, default=Path("benchmark-leaderboard-memory.json")
+    )
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    for result in results:
+        logger.info(f"{result.name}: {result.summary()}")
+    params = {k: v for k, v in vars(args).items() if k != "output"}
+    write_report(args.output, results, params)
+    logger.info(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
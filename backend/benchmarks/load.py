@@ -0,0 +1,369 @@
+"""
+End-to-end load test of the quiz game hot paths.
+
+Boots the FastAPI app in-process on a loopback port and drives it against
+the Postgres and Redis configured in the environment, e.g. the local
+`docker compose up db redis` stand-ins. Latencies and throughput of every
+scenario are written to a JSON report that can be compared between commits:
+
+    python -m benchmarks.load --output after.json --baseline before.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from datetime import timedelta
+from pathlib import Path
+from typing import Any
+
+import httpx
+from sqlmodel import Session, col, delete
+
+from app import crud
+from app.core import security
+from app.core.config import settings
+from app.core.db import engine
+from app.core.redis import redis_client
+from app.leaderboard import (
+    GLOBAL_LEADERBOARD,
+    GLOBAL_SEQ,
+    MEMBER_IDS,
+    MEMBER_UUIDS,
+    encode_members,
+    leaderboard_key,
+)
+from app.main import app
+from app.models import MAX_SCORE, QuizSession, User
+from benchmarks.common import InProcessServer, Result, compare_reports, write_report
+
+logging.basicConfig(level=logging.INFO)
+logging.getLogger("httpx").setLevel(logging.WARNING)
+logger = logging.getLogger(__name__)
+
+SCENARIOS = ("login", "join", "score", "leaderboard", "sse")
+BENCH_DOMAIN = "bench.example.com"
+PASSWORD = "benchmark-password"
+API = settings.API_V1_STR
+
+
+class Fixtures:
+    def __init__(self, users: list[User], quiz_id: uuid.UUID) -> None:
+        self.users = users
+        self.quiz_id = quiz_id
+        expires = timedelta(hours=1)
+        self.headers = [
+            {"Authorization": f"Bearer {security.create_access_token(u.id, expires)}"}
+            for u in users
+        ]
+
+    def random_headers(self) -> dict[str, str]:
+        return random.choice(self.headers)
+
+
+def create_fixtures(n_users: int, n_questions: int) -> Fixtures:
+    run = uuid.uuid4().hex[:8]
+    # One hash for everybody, bcrypt would otherwise dominate the setup
+    hashed_password = security.get_password_hash(PASSWORD)
+    with Session(engine) as session:
+        users = [
+            User(email=f"{run}-{i}@{BENCH_DOMAIN}", hashed_password=hashed_password)
+            for i in range(n_users)
+        ]
+        session.add_all(users)
+        session.commit()
+        for user in users:
+            session.refresh(user)
+        quiz = crud.create_quiz(
+            session=session,
+            name=f"Benchmark {run}",
+            questions=[
+                {
+                    "text": f"Word {q}",
+                    "answers": [
+                        {"text": f"Meaning {q}.{a}", "is_correct": a == 0}
+                        for a in range(4)
+                    ],
+                }
+                for q in range(n_questions)
+            ],
+        )
+        return Fixtures(users, quiz.id)
+
+
+async def drop_fixtures(fixtures: Fixtures) -> None:
+    with Session(engine) as session:
+        session.exec(  # type: ignore
+            delete(QuizSession).where(col(QuizSession.quiz_id) == fixtures.quiz_id)
+        )
+        session.commit()
+        crud.delete_quiz(session=session, quiz_id=fixtures.quiz_id)
+        session.exec(  # type: ignore
+            delete(User).where(col(User.email).endswith(f"@{BENCH_DOMAIN}"))
+        )
+        session.commit()
+    # The benchmark users played no other quiz, so their global entries and
+    # member IDs go along with every board of the quiz
+    board = leaderboard_key(fixtures.quiz_id)
+    keys = [board, *[key async for key in redis_client.scan_iter(f"{board}:*")]]
+    members = await encode_members((u.id for u in fixtures.users), assign=False)
+    async with redis_client.pipeline() as pipe:
+        pipe.delete(*keys)
+        if members:
+            pipe.zrem(GLOBAL_LEADERBOARD, *members.values())
+            pipe.set(GLOBAL_SEQ, time.time_ns(), nx=True)
+            pipe.incr(GLOBAL_SEQ)
+        if settings.LEADERBOARD_MEMBER_ENCODING == "id" and members:
+            pipe.hdel(MEMBER_IDS, *members)
+            pipe.hdel(MEMBER_UUIDS, *members.values())
+        await pipe.execute()
+
+
+async def _timed(
+    result: Result, request: Awaitable[httpx.Response], started: float
+) -> None:
+    try:
+        response = await request
+        failed = response.status_code >= 400
+    except httpx.HTTPError:
+        failed = True
+    result.latencies_ms.append((time.perf_counter() - started) * 1000)
+    result.requests += 1
+    result.errors += failed
+
+
+async def run_closed(
+    name: str,
+    total: int,
+    concurrency: int,
+    make_request: Callable[[int], Awaitable[httpx.Response]],
+) -> Result:
+    """Send `total` requests with at most `concurrency` of them in flight"""
+    result = Result(name, extra={"concurrency": concurrency})
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int) -> None:
+        async with semaphore:
+            await _timed(result, make_request(i), time.perf_counter())
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    result.duration_s = time.perf_counter() - started
+    return result
+
+
+async def run_open(
+    name: str,
+    rate: int,
+    duration: float,
+    make_request: Callable[[int], Awaitable[httpx.Response]],
+) -> Result:
+    """
+    Send requests at a fixed arrival rate regardless of how fast they return.
+
+    Latency is measured from the scheduled send time, so a stalled server
+    shows up in the percentiles instead of silently lowering the rate.
+    """
+    result = Result(name, extra={"target_rps": rate})
+    tasks = []
+    started = time.perf_counter()
+    for i in range(int(rate * duration)):
+        scheduled = started + i / rate
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(_timed(result, make_request(i), scheduled)))
+    await asyncio.gather(*tasks)
+    result.duration_s = time.perf_counter() - started
+    return result
+
+
+async def login_storm(
+    client: httpx.AsyncClient, fixtures: Fixtures, args: argparse.Namespace
+) -> Result:
+    emails = [u.email for u in fixtures.users]
+    return await run_closed(
+        "login",
+        args.logins,
+        args.concurrency,
+        lambda i: client.post(
+            f"{API}/login/access-token",
+            data={"username": emails[i % len(emails)], "password": PASSWORD},
+        ),
+    )
+
+
+async def mass_join(
+    client: httpx.AsyncClient, fixtures: Fixtures, args: argparse.Namespace
+) -> Result:
+    return await run_closed(
+        "join",
+        args.joins,
+        args.concurrency,
+        lambda i: client.post(
+            f"{API}/quizzes/join",
+            json={"quiz_id": str(fixtures.quiz_id)},
+            headers=fixtures.headers[i % len(fixtures.headers)],
+        ),
+    )
+
+
+async def score_posting(
+    client: httpx.AsyncClient, fixtures: Fixtures, args: argparse.Namespace
+) -> Result:
+    return await run_open(
+        "score",
+        args.score_rate,
+        args.score_duration,
+        lambda i: client.post(
+            f"{API}/leaderboards/{fixtures.quiz_id}/score",
+            # Below the scores of the SSE scenario
+            json={"score": i % (MAX_SCORE // 2)},
+            headers=fixtures.random_headers(),
+        ),
+    )
+
+
+async def leaderboard_reads(
+    client: httpx.AsyncClient, fixtures: Fixtures, args: argparse.Namespace
+) -> Result:
+    return await run_closed(
+        "leaderboard",
+        args.reads,
+        args.concurrency,
+        lambda _: client.get(f"{API}/leaderboards/{fixtures.quiz_id}"),
+    )
+
+
+async def sse_fanout(
+    client: httpx.AsyncClient, fixtures: Fixtures, args: argparse.Namespace
+) -> Result:
+    """
+    Time from posting a score until each SSE subscriber sees it.
+
+    One player posts `--sse-events` increasing scores; every subscriber
+    records the delay to the first frame of the benchmark quiz whose top
+    score reaches each of them. Events a subscriber never sees count as
+    errors.
+    """
+    result = Result("sse", extra={"subscribers": args.subscribers})
+    quiz_id = str(fixtures.quiz_id)
+    # Above any score posted by the other scenarios, so it tops the board,
+    # and ending at the highest score a board accepts
+    base = MAX_SCORE - args.sse_events
+    last = base + args.sse_events
+    sent_at: dict[int, float] = {}
+    connected = 0
+    all_connected = asyncio.Event()
+
+    async def subscriber() -> None:
+        nonlocal connected
+        seen = base
+        async with client.stream("GET", f"{API}/leaderboards/all/stream") as r:
+            connected += 1
+            if connected == args.subscribers:
+                all_connected.set()
+            async for line in r.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                frame = json.loads(line.removeprefix("data: "))
+                if frame.get("quiz_id") != quiz_id or not frame.get("leaderboard"):
+                    continue
+                top = int(max(entry["score"] for entry in frame["leaderboard"]))
+                now = time.perf_counter()
+                for score in range(seen + 1, top + 1):
+                    if score in sent_at:
+                        result.latencies_ms.append((now - sent_at[score]) * 1000)
+                        result.requests += 1
+                seen = max(seen, top)
+                if seen >= last:
+                    return
+
+    headers = fixtures.headers[0]
+    subscribers = [asyncio.create_task(subscriber()) for _ in range(args.subscribers)]
+    await asyncio.wait_for(all_connected.wait(), timeout=args.sse_timeout)
+    started = time.perf_counter()
+    for score in range(base + 1, last + 1):
+        sent_at[score] = time.perf_counter()
+        r = await client.post(
+            f"{API}/leaderboards/{quiz_id}/score",
+            json={"score": score},
+            headers=headers,
+        )
+        assert r.status_code == 200, r.text
+        await asyncio.sleep(args.sse_interval)
+    _, pending = await asyncio.wait(subscribers, timeout=args.sse_timeout)
+    for task in pending:
+        task.cancel()
+    result.duration_s = time.perf_counter() - started
+    result.errors = args.subscribers * args.sse_events - result.requests
+    return result
+
+
+RUNNERS = {
+    "login": login_storm,
+    "join": mass_join,
+    "score": score_posting,
+    "leaderboard": leaderboard_reads,
+    "sse": sse_fanout,
+}
+
+
+async def run(args: argparse.Namespace) -> list[Result]:
+    fixtures = create_fixtures(args.users, args.questions)
+    results = []
+    try:
+        with InProcessServer(app) as server:
+            async with httpx.AsyncClient(
+                base_url=server.url,
+                timeout=args.timeout,
+                limits=httpx.Limits(max_connections=None),
+            ) as client:
+                for name in args.scenarios:
+                    logger.info(f"Running {name}")
+                    result = await RUNNERS[name](client, fixtures, args)
+                    logger.info(f"{name}: {result.summary()}")
+                    results.append(result)
+    finally:
+        if not args.keep_data:
+            await drop_fixtures(fixtures)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--joins", type=int, default=1000)
+    parser.add_argument("--score-rate", type=int, default=200, help="requests/s")
+    parser.add_argument("--score-duration", type=float, default=10, help="seconds")
+    parser.add_argument("--reads", type=int, default=1000)
+    parser.add_argument("--subscribers", type=int, default=100)
+    parser.add_argument("--sse-events", type=int, default=20)
+    parser.add_argument("--sse-interval", type=float, default=0.1, help="seconds")
+    parser.add_argument("--sse-timeout", type=float, default=30, help="seconds")
+    parser.add_argument("--timeout", type=float, default=30, help="seconds")
+    parser.add_argument("--output", type=Path, default=Path("benchmark.json"))
+    parser.add_argument("--baseline", type=Path, help="report to compare against")
+    parser.add_argument("--keep-data", action="store_true")
+    args = parser.parse_args()
+
+    params: dict[str, Any] = {
+        k: v for k, v in vars(args).items() if k not in ("output", "baseline")
+    }
+    results = asyncio.run(run(args))
+    report = write_report(args.output, results, params)
+    logger.info(f"Report written to {args.output}")
+    if args.baseline:
+        print(compare_reports(json.loads(args.baseline.read_text()), report))
+
+
+if __name__ == "__main__":
+    main()
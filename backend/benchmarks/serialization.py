@@ -0,0 +1,172 @@
+"""
+Micro-benchmark of response and SSE frame serialization.
+
+Compares the ways a quiz catalog page and a leaderboard frame can be turned
+into JSON, on in-memory rows so the database does not blur the numbers:
+
+    python -m benchmarks.serialization --quizzes 100 --questions 20
+"""
+
+import argparse
+import json
+import logging
+import time
+import uuid
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+
+from app.api.routes.quizzes import _quiz_public
+from app.core.serialization import dumps, orjson
+from app.models import (
+    Answer,
+    AnswerPublic,
+    Question,
+    QuestionPublic,
+    Quiz,
+    QuizPublic,
+    QuizzesPublic,
+)
+from benchmarks.common import Result, write_report
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def make_quizzes(quizzes: int, questions: int, answers: int) -> list[Quiz]:
+    result = []
+    for q in range(quizzes):
+        quiz = Quiz(id=uuid.uuid4(), name=f"Deck {q}")
+        for w in range(questions):
+            question = Question(id=uuid.uuid4(), quiz_id=quiz.id, text=f"Word {w}")
+            question.answers = [
+                Answer(
+                    id=uuid.uuid4(),
+                    question_id=question.id,
+                    text=f"Meaning {w}.{a}",
+                    is_correct=a == 0,
+                )
+                for a in range(answers)
+            ]
+            quiz.questions.append(question)
+        result.append(quiz)
+    return result
+
+
+def validated_quizzes(quizzes: list[Quiz]) -> bytes:
+    """The original path: validated models, jsonable_encoder and json.dumps"""
+    payload = QuizzesPublic(
+        data=[
+            QuizPublic(
+                id=quiz.id,
+                name=quiz.name,
+                version=quiz.version,
+                questions=[
+                    QuestionPublic(
+                        id=question.id,
+                        text=question.text,
+                        quiz_id=question.quiz_id,
+                        answers=[
+                            AnswerPublic(
+                                id=answer.id,
+                                text=answer.text,
+                                is_correct=answer.is_correct,
+                                question_id=answer.question_id,
+                            )
+                            for answer in question.answers
+                        ],
+                    )
+                    for question in quiz.questions
+                ],
+            )
+            for quiz in quizzes
+        ],
+        count=len(quizzes),
+    )
+    validated = QuizzesPublic.model_validate(payload)
+    return json.dumps(jsonable_encoder(validated)).encode()
+
+
+def constructed_quizzes(quizzes: list[Quiz]) -> bytes:
+    """The current path: constructed models dumped by pydantic-core"""
+    payload = QuizzesPublic.model_construct(
+        data=[_quiz_public(quiz) for quiz in quizzes], count=len(quizzes)
+    )
+    return payload.model_dump_json().encode()
+
+
+def leaderboard_frame(top_n: int) -> dict[str, Any]:
+    return {
+        "quiz_id": str(uuid.uuid4()),
+        "leaderboard": [
+            {"rank": i + 1, "user_id": str(uuid.uuid4()), "score": float(1000 - i)}
+            for i in range(top_n)
+        ],
+    }
+
+
+def frame_per_client(frame: dict[str, Any], clients: int) -> list[str]:
+    """The original SSE path: every client encodes the frame itself"""
+    return [f"data: {json.dumps(frame)}\n\n" for _ in range(clients)]
+
+
+def frame_once(frame: dict[str, Any], clients: int) -> list[str]:
+    """The current SSE path: one frame shared by all clients"""
+    encoded = f"data: {dumps(frame)}\n\n"
+    return [encoded for _ in range(clients)]
+
+
+def measure(name: str, fn: Callable[[], Any], iterations: int) -> Result:
+    result = Result(name, extra={"bytes": len(fn())})
+    started = time.perf_counter()
+    for _ in range(iterations):
+        call_started = time.perf_counter()
+        fn()
+        result.latencies_ms.append((time.perf_counter() - call_started) * 1000)
+    result.duration_s = time.perf_counter() - started
+    result.requests = iterations
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--quizzes", type=int, default=100)
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--answers", type=int, default=4)
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument(
+        "--output", type=Path, default=Path("benchmark-serialization.json")
+    )
+    args = parser.parse_args()
+
+    quizzes = make_quizzes(args.quizzes, args.questions, args.answers)
+    frame = leaderboard_frame(args.top_n)
+    results = [
+        measure(
+            "quizzes_validated", lambda: validated_quizzes(quizzes), args.iterations
+        ),
+        measure(
+            "quizzes_constructed", lambda: constructed_quizzes(quizzes), args.iterations
+        ),
+        measure(
+            "sse_frame_per_client",
+            lambda: frame_per_client(frame, args.clients),
+            args.iterations,
+        ),
+        measure(
+            "sse_frame_once", lambda: frame_once(frame, args.clients), args.iterations
+        ),
+    ]
+    for result in results:
+        logger.info(f"{result.name}: {result.summary()}")
+    params = {k: v for k, v in vars(args).items() if k != "output"}
+    write_report(args.output, results, {**params, "orjson": orjson is not None})
+    logger.info(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()